@@ -0,0 +1,343 @@
+"""
+Local stand-ins for the upstreams of the app, used by the benchmark harness.
+
+- FakeBigQueryClient: runs the app's BigQuery SQL on an embedded DuckDB database
+  (same `query(...).to_dataframe()` / `insert_rows_json` / `get_table` surface).
+- StubServer: threaded HTTP server answering like Pappers, Apollo and a
+  DDGS-style search endpoint, with configurable latency and error injection.
+"""
+import re
+import json
+import time
+import zlib
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import duckdb
+
+# BigQuery -> DuckDB rewrites applied to every query (order matters)
+SQL_REWRITES = [
+    (re.compile(r"\bARRAY<STRUCT<([^<>]+)>>"), r"STRUCT(\1)[]"),
+    (re.compile(r"\bUNNEST\(JSON_QUERY_ARRAY\(([^()]+)\)\)\s+AS\s+(\w+)"), r"UNNEST(json_extract(\1, '$[*]')) AS _unnest(\2)"),
+    (re.compile(r"\bUNNEST\(([^()]+)\)\s+AS\s+(\w+)"), r"UNNEST(\1) AS _unnest(\2)"),
+    (re.compile(r"\bSAFE_CAST\s*\("), "TRY_CAST("),
+    (re.compile(r"\bJSON_VALUE\s*\("), "json_extract_string("),
+    (re.compile(r"\bINT64\b"), "BIGINT"),
+    (re.compile(r"\bFLOAT64\b"), "DOUBLE"),
+    (re.compile(r"\bSTRING\b"), "VARCHAR"),
+    (re.compile(r"\bREGEXP_CONTAINS\s*\("), "regexp_matches("),
+    (re.compile(r"\bCOUNTIF\s*\("), "count_if("),
+    (re.compile(r"\bFARM_FINGERPRINT\s*\("), "hash("),
+    (re.compile(r"\*\s*EXCEPT\s*\("), "* EXCLUDE ("),
+    (re.compile(r"(?<![\w'])r'"), "'"),           # raw string literals r'...'
+    (re.compile(r"\\'"), "''"),                     # \' escapes inside literals
+]
+BACKTICK_NAME = re.compile(r"`([^`]+)`")
+
+
+def translate_sql(sql):
+    """Rewrites the BigQuery dialect used by core/ into DuckDB SQL."""
+    def name(match):
+        parts = match.group(1).split(".")
+        # project.dataset.table -> dataset.table (DuckDB schema.table)
+        if len(parts) >= 2:
+            return ".".join(f'"{p}"' for p in parts[-2:])
+        return f'"{parts[0]}"'
+
+    sql = BACKTICK_NAME.sub(name, sql)
+    for pattern, replacement in SQL_REWRITES:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+def split_table(table):
+    """'project.dataset.table' (or a Table-like object) -> (schema, table)."""
+    if hasattr(table, "table_id"):
+        table = f"{table.dataset_id}.{table.table_id}"
+    parts = str(table).replace("`", "").split(".")
+    return parts[-2], parts[-1]
+
+
+class _SchemaField:
+    def __init__(self, name, field_type):
+        self.name = name
+        self.field_type = field_type
+
+
+class _Table:
+    def __init__(self, schema):
+        self.schema = schema
+
+
+class _QueryJob:
+    """Result of a FakeBigQueryClient query (executed eagerly, like a finished BigQuery job)."""
+
+    def __init__(self, frame):
+        self._frame = frame
+
+    def result(self):
+        return self._frame.itertuples(index=False) if self._frame is not None else iter(())
+
+    def to_dataframe(self):
+        return self._frame.copy()
+
+
+class FakeBigQueryClient:
+    """
+    BigQuery client stand-in on DuckDB. `latency_ms` adds a fixed round-trip per
+    query so warm/cold comparisons keep the shape of a remote warehouse.
+    """
+
+    def __init__(self, path=":memory:", latency_ms=0.0):
+        self.conn = duckdb.connect(path)
+        self.latency_ms = latency_ms
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def _run(self, sql, params=None):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        with self._lock:
+            self.queries += 1
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute(sql, params or [])
+                return cursor.fetchdf() if cursor.description else None
+            finally:
+                cursor.close()
+
+    def query(self, sql, job_config=None):
+        return _QueryJob(self._run(translate_sql(sql)))
+
+    def ensure_schema(self, schema):
+        self._run(f'CREATE SCHEMA IF NOT EXISTS "{schema}"')
+
+    def get_table(self, table):
+        schema, name = split_table(table)
+        df = self._run(
+            "SELECT column_name, data_type FROM information_schema.columns "
+            "WHERE table_schema = ? AND table_name = ? ORDER BY ordinal_position",
+            [schema, name],
+        )
+        if df is None or df.empty:
+            raise LookupError(f"Table {schema}.{name} not found")
+        return _Table([_SchemaField(r.column_name, r.data_type) for r in df.itertuples()])
+
+    def insert_rows_json(self, table, rows):
+        """Inserts dict rows by column name (unknown keys are ignored). Returns: [] (no errors)."""
+        if not rows:
+            return []
+        schema, name = split_table(table)
+        types = {f.name: f.field_type for f in self.get_table(table).schema}
+        keys = [c for c in types if any(c in row for row in rows)]
+        placeholders = ", ".join("?" for _ in keys)
+        sql = f'INSERT INTO "{schema}"."{name}" ({", ".join(keys)}) VALUES ({placeholders})'
+        with self._lock:
+            self.queries += 1
+            cursor = self.conn.cursor()
+            try:
+                cursor.executemany(sql, [[_to_param(row.get(k), types[k]) for k in keys] for row in rows])
+            finally:
+                cursor.close()
+        return []
+
+    def load_frame(self, table, df):
+        """Creates (or replaces) `table` from a DataFrame."""
+        schema, name = split_table(table)
+        self.ensure_schema(schema)
+        with self._lock:
+            self.conn.register("_frame", df)
+            try:
+                self.conn.execute(f'CREATE OR REPLACE TABLE "{schema}"."{name}" AS SELECT * FROM _frame')
+            finally:
+                self.conn.unregister("_frame")
+
+    def load_parquet(self, table, path):
+        """Creates (or replaces) `table` from a Parquet file without going through pandas."""
+        schema, name = split_table(table)
+        self.ensure_schema(schema)
+        self._run(f'CREATE OR REPLACE TABLE "{schema}"."{name}" AS SELECT * FROM read_parquet(?)', [path])
+
+    def truncate(self, table):
+        schema, name = split_table(table)
+        self._run(f'DELETE FROM "{schema}"."{name}"')
+
+
+def _to_param(value, data_type=""):
+    # Lists/dicts go as-is into STRUCT / list columns, JSON-encoded into text columns
+    if isinstance(value, (list, dict)) and not (data_type.endswith("[]") or data_type.startswith("STRUCT")):
+        return json.dumps(value)
+    return value
+
+
+# --- HTTP stubs -------------------------------------------------------------
+
+def fake_pappers_payload(siret):
+    """Deterministic Pappers v2 /entreprise answer for a SIRET."""
+    rng = random.Random(siret)
+    name = f"CABINET {siret[-4:]}"
+    return {
+        "siren": siret[:9],
+        "denomination": name,
+        "code_naf": "68.32A",
+        "categorie_entreprise": rng.choice(["PME", "ETI"]),
+        "sites_internet": [f"www.cabinet{siret[-4:]}.fr"] if rng.random() < 0.6 else [],
+        "telephone": f"01{rng.randrange(10**8):08d}",
+        "email": f"contact@cabinet{siret[-4:]}.fr",
+        "representants": [{"nom": "MARTIN", "prenom": "Claire"}],
+        "finances": [{"annee": 2024, "chiffre_affaires": rng.randrange(200_000, 20_000_000)}],
+        "siege": {"site_internet": "", "telephone": "", "email": ""},
+    }
+
+
+def fake_people(org_key, count=3):
+    rng = random.Random(org_key)
+    titles = ["Gestionnaire de copropriété", "Directeur copropriété", "Principal"]
+    return [{
+        "first_name": rng.choice(["Julie", "Marc", "Sophie", "Paul"]),
+        "last_name": rng.choice(["Durand", "Bernard", "Petit"]),
+        "title": titles[i % len(titles)],
+        "email": f"contact{i}@{org_key}",
+        "linkedin_url": f"https://linkedin.com/in/{org_key}-{i}",
+        "photo_url": "",
+    } for i in range(count)]
+
+
+class StubConfig:
+    """
+    Latency and error injection of the stub server.
+    latency_ms/jitter_ms: added to every answer; error_rate: share of 500s;
+    throttle_rate: share of 429s (with Retry-After); not_found_rate: Pappers 404s.
+    """
+
+    def __init__(self, latency_ms=80.0, jitter_ms=20.0, error_rate=0.0, throttle_rate=0.0, not_found_rate=0.0, seed=7):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.not_found_rate = not_found_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def draw(self):
+        """Returns: (delay_s, injected_status or None)"""
+        with self.lock:
+            delay = max(0.0, self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            roll = self.rng.random()
+        if roll < self.error_rate:
+            return delay, 500
+        if roll < self.error_rate + self.throttle_rate:
+            return delay, 429
+        return delay, None
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    server_version = "CEEStub/1.0"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _reply(self, status, payload=None, headers=None):
+        body = json.dumps(payload or {}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, body=None):
+        stub = self.server.stub
+        url = urlparse(self.path)
+        route = url.path.rstrip("/")
+        stub.count(route)
+        delay, injected = stub.config.draw()
+        time.sleep(delay)
+        if injected == 500:
+            return self._reply(500, {"error": "injected failure"})
+        if injected == 429:
+            return self._reply(429, {"error": "too many requests"}, {"Retry-After": "1"})
+
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if route.endswith("/v2/entreprise"):
+            siret = params.get("siret", "")
+            if stub.config.rng.random() < stub.config.not_found_rate:
+                return self._reply(404, {"error": "not found"})
+            return self._reply(200, fake_pappers_payload(siret))
+        if route.endswith("/v1/mixed_companies/search"):
+            key = (body.get("q_organization_domains_list") or [body.get("q_organization_name") or "org"])[0]
+            return self._reply(200, {"organizations": [{"id": f"org-{zlib.crc32(str(key).encode())}", "name": key}]})
+        if route.endswith("/v1/mixed_people/api_search"):
+            key = (body.get("q_organization_domains_list") or body.get("organization_ids") or ["org"])[0]
+            return self._reply(200, {"people": fake_people(str(key))})
+        if route.endswith("/search"):
+            query = params.get("q", "")
+            slug = re.sub(r"[^a-z0-9]", "", query.lower().split(" ")[0] if query else "syndic")
+            return self._reply(200, [
+                {"title": query, "href": f"https://www.{slug}.fr/", "body": f"{query} - site officiel"},
+                {"title": "Annuaire", "href": "https://www.pagesjaunes.fr/x", "body": ""},
+            ])
+        return self._reply(404, {"error": f"unknown route {route}"})
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b"{}"
+        try:
+            body = json.loads(raw or b"{}")
+        except ValueError:
+            body = {}
+        self._handle(body)
+
+
+class StubServer:
+    """
+    Serves the Pappers (/v2/entreprise/), Apollo (/v1/...) and search (/search)
+    stubs on localhost in a background thread.
+
+    Usage:
+        with StubServer(StubConfig(latency_ms=120, error_rate=0.02)) as stub:
+            os.environ["PAPPERS_API_URL"] = stub.url + "/v2/entreprise/"
+    """
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or StubConfig()
+        self._server = ThreadingHTTPServer((host, port), _StubHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+        self.requests = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, route):
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def reset_counts(self):
+        with self._lock:
+            self.requests = {}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
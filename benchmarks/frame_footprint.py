@@ -0,0 +1,88 @@
+"""
+Memory footprint of the step-3 detail frames.
+
+Builds a synthetic detail frame shaped like `fetch_data_by_syndic` output (every
+column as object, as BigQuery returns STRING columns), compacts it with
+`compact_copro_frame` and checks the per-row footprint against
+DETAIL_ROW_BUDGET_BYTES. Exits 1 when the budget is exceeded, so a schema change
+that brings back wide object columns is caught.
+
+Usage:
+    python benchmarks/frame_footprint.py [--rows 5000] [--seed 7]
+"""
+import os
+import sys
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from core.data_manager import (
+    compact_copro_frame, frame_bytes_per_row, DETAIL_ROW_BUDGET_BYTES,
+    PERIOD_MAPPING, H1_DEPARTMENTS, H3_DEPARTMENTS,
+)
+from core.result_store import SESSION_MEMORY_BUDGET_MB
+
+# Largest portfolio a single syndic detail frame is expected to hold (after filters)
+LARGEST_SYNDIC_ROWS = 20000
+
+
+def synthetic_detail_frame(rows, seed=7):
+    """Detail rows of one syndic spread over a few departments and communes."""
+    rng = random.Random(seed)
+    depts = rng.sample(H1_DEPARTMENTS + H3_DEPARTMENTS, 4)
+    communes = [f"COMMUNE {i}" for i in range(40)]
+    periods = [p for values in PERIOD_MAPPING.values() for p in values]
+    records = []
+    for i in range(rows):
+        qpv = rng.random() < 0.1
+        records.append({
+            "numero_d_immatriculation": f"A{rng.randrange(10**8):08d}",
+            "nom_d_usage_de_la_copropriete": f"RESIDENCE {rng.choice(['LES TILLEULS', 'LE PARC', 'VICTOR HUGO', 'DES LILAS'])} {i}",
+            "adresse_de_reference": f"{rng.randrange(1, 200)} RUE {rng.choice(['DE LA PAIX', 'JEAN JAURES', 'PASTEUR'])}",
+            "commune": rng.choice(communes),
+            "code_officiel_departement": rng.choice(depts),
+            "periode_de_construction": rng.choice(periods),
+            "nombre_de_lots_a_usage_d_habitation": str(rng.randrange(2, 400)),
+            "nombre_total_de_lots": str(rng.randrange(2, 600)),
+            "lat": f"{rng.uniform(43, 50):.6f}",
+            "long": f"{rng.uniform(-1, 7):.6f}",
+            "code_qp_2024": f"QN0{rng.randrange(10000, 99999)}" if qpv else None,
+            "nom_qp_2024": f"QUARTIER {rng.randrange(50)}" if qpv else None,
+            "raison_sociale_du_representant_legal": "SYNDIC EXEMPLE",
+            "siret_du_representant_legal": "12345678900011",
+            "climate_zone": "H1",
+            "in_qpv": "Oui" if qpv else "Non",
+        })
+    return pd.DataFrame.from_records(records)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-row memory footprint of compacted detail frames.")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    raw = synthetic_detail_frame(args.rows, args.seed)
+    compact = compact_copro_frame(raw)
+    before, after = frame_bytes_per_row(raw), frame_bytes_per_row(compact)
+    session_mb = after * LARGEST_SYNDIC_ROWS / 1e6
+
+    print(f"rows: {len(raw)}")
+    print(f"raw frame:      {before:>6} bytes/row")
+    print(f"compact frame:  {after:>6} bytes/row (budget {DETAIL_ROW_BUDGET_BYTES}, {after / before:.0%} of raw)")
+    print(f"largest syndic: {session_mb:.1f} MB for {LARGEST_SYNDIC_ROWS} rows (session budget {SESSION_MEMORY_BUDGET_MB} MB)")
+    print(compact.dtypes.to_string())
+
+    if after > DETAIL_ROW_BUDGET_BYTES:
+        print(f"\nFAIL: {after} bytes/row exceeds DETAIL_ROW_BUDGET_BYTES={DETAIL_ROW_BUDGET_BYTES}")
+        return 1
+    if session_mb > SESSION_MEMORY_BUDGET_MB:
+        print(f"\nFAIL: largest detail frame exceeds SESSION_MEMORY_BUDGET_MB={SESSION_MEMORY_BUDGET_MB}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Cold-start import benchmark.
+
+Imports each module in a fresh interpreter with `python -X importtime` and
+reports the cumulative import time, so a heavy dependency pulled back into a
+module's top level shows up as a regression.
+
+Usage:
+    python benchmarks/import_time.py                       # report
+    python benchmarks/import_time.py --update-baseline     # record benchmarks/import_baseline.json
+    python benchmarks/import_time.py --max-regression 0.3  # exit 1 if a module is 30% slower than baseline
+"""
+import os
+import re
+import sys
+import glob
+import json
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "import_baseline.json")
+RUNS = 3
+
+# Every module of core/, so a new one is measured without editing this list
+CORE_MODULES = sorted(
+    "core." + os.path.splitext(os.path.basename(path))[0]
+    for path in glob.glob(os.path.join(ROOT, "core", "*.py"))
+    if not os.path.basename(path).startswith("_")
+)
+# Reference cost of the dependencies the core modules defer
+HEAVY_DEPENDENCIES = [
+    "pandas",
+    "numpy",
+    "pydeck",
+    "google.cloud.bigquery",
+    "duckduckgo_search",
+    "rapidfuzz",
+    "aiohttp",
+    "requests",
+]
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\| (.+)$")
+
+
+def measure(module):
+    """
+    Imports `module` in a fresh interpreter.
+    Returns: dict -> {cumulative_ms, wall_ms, modules_loaded} or {error}
+    """
+    code = f"import {module}"
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        last = proc.stderr.strip().splitlines()[-1:] or ["import failed"]
+        return {"error": last[0]}
+
+    cumulative_us = 0
+    loaded = 0
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        loaded += 1
+        # Top-level entries (no indentation) sum up to the whole import
+        if not match.group(3).startswith(" "):
+            cumulative_us += int(match.group(2))
+    return {"cumulative_ms": cumulative_us / 1000, "wall_ms": wall_ms, "modules_loaded": loaded}
+
+
+def best_of(module, runs=RUNS):
+    """Fastest of `runs` cold imports (less sensitive to disk cache and noise)."""
+    results = [measure(module) for _ in range(runs)]
+    ok = [r for r in results if "error" not in r]
+    if not ok:
+        return results[0]
+    return min(ok, key=lambda r: r["cumulative_ms"])
+
+
+def run(modules, runs=RUNS):
+    return {module: best_of(module, runs) for module in modules}
+
+
+def format_results(results, baseline=None):
+    baseline = baseline or {}
+    lines = [f"{'module':<28} {'import ms':>10} {'wall ms':>9} {'modules':>8} {'vs baseline':>12}"]
+    for module, r in results.items():
+        if "error" in r:
+            lines.append(f"{module:<28} {'-':>10} {'-':>9} {'-':>8}  {r['error']}")
+            continue
+        ref = baseline.get(module, {}).get("cumulative_ms")
+        delta = f"{(r['cumulative_ms'] / ref - 1) * 100:+.0f}%" if ref else "-"
+        lines.append(f"{module:<28} {r['cumulative_ms']:>10.1f} {r['wall_ms']:>9.1f} {r['modules_loaded']:>8} {delta:>12}")
+    return "\n".join(lines)
+
+
+def regressions(results, baseline, max_regression):
+    """Modules whose import time grew by more than `max_regression` (ratio) over the baseline."""
+    out = []
+    for module, r in results.items():
+        ref = baseline.get(module, {}).get("cumulative_ms")
+        if ref and "error" not in r and r["cumulative_ms"] > ref * (1 + max_regression):
+            out.append(module)
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold import time of the app modules.")
+    parser.add_argument("modules", nargs="*", help="Modules to measure (default: core modules + heavy dependencies)")
+    parser.add_argument("--runs", type=int, default=RUNS)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--max-regression", type=float, default=None, help="Fail if import time grows by more than this ratio")
+    args = parser.parse_args(argv)
+
+    modules = args.modules or CORE_MODULES + HEAVY_DEPENDENCIES
+    results = run(modules, args.runs)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print(format_results(results, baseline))
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if args.max_regression is not None and baseline:
+        slower = regressions(results, baseline, args.max_regression)
+        if slower:
+            print(f"\nImport time regression: {', '.join(slower)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+"""
+Concurrent-session load test of the core data paths.
+
+N virtual users (threads, like the sessions of one Streamlit server) replay the
+rep workflow against the offline stand-ins of run_benchmarks.Environment:
+
+    search  -> shared result store + fetch_aggregated_syndics (one of a few filter presets)
+    select  -> syndic detail rows + Pappers legal data (popular syndics picked more often)
+    enrich  -> background enrichment job submitted and polled like the step-3 fragment
+    pack    -> prospecting-pack rows of the selected syndic (core.export_pack)
+
+Each level (number of users) runs for --duration seconds from empty caches and
+reports throughput, per-step latency percentiles, errors and memory growth. The
+saturation point is the first level where adding users no longer adds throughput.
+
+Usage:
+    python benchmarks/load_test.py --users 1 2 4 8 16 32 --duration 20
+    python benchmarks/load_test.py --users 8 --latency-ms 200 --error-rate 0.02 --json load.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import StubConfig
+from run_benchmarks import Environment, percentile
+
+STEPS = ["search", "select", "enrich", "pack"]
+SATURATION_GAIN = 1.10      # A level saturates when throughput grows less than this over the previous one
+ENRICH_TIMEOUT_SECONDS = 60
+POPULAR_SYNDICS = 20        # Reps pick among the first rows of the result table
+
+# Filter presets reps start from (same shape as st.session_state['filters'] in the app)
+FILTER_PRESETS = [
+    dict(zones=["H1"], lots=(20, 500), periods=["Avant 1949", "1949-1974"], exclude_big=True, qpv=False),
+    dict(zones=["H1", "H2"], lots=(50, 1000), periods=None, exclude_big=True, qpv=False),
+    dict(zones=["H1"], lots=(10, 300), periods=None, exclude_big=False, qpv=True),
+    dict(zones=["H2", "H3"], lots=(20, 500), periods=["1949-1974", "1975-1993"], exclude_big=True, qpv=False),
+]
+
+
+def rss_mb():
+    """Resident memory of the process (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+class LoadRecorder:
+    """Thread-safe per-step latency samples and error counts of one level."""
+
+    def __init__(self):
+        self.samples = {step: [] for step in STEPS + ["session"]}
+        self.errors = {step: 0 for step in STEPS}
+        self.sessions = 0
+        self._lock = threading.Lock()
+
+    def record(self, step, ms):
+        with self._lock:
+            self.samples[step].append(ms)
+            if step == "session":
+                self.sessions += 1
+
+    def error(self, step):
+        with self._lock:
+            self.errors[step] += 1
+
+
+class VirtualUser:
+    """One rep session: holds its results in the shared store like streamlit_app.session_result."""
+
+    def __init__(self, env, store, enricher, recorder, seed, think_ms, poll_ms):
+        from core.result_store import SessionRef
+        self.env, self.store, self.enricher, self.recorder = env, store, enricher, recorder
+        self.rng = random.Random(seed)
+        self.ref = SessionRef(store)
+        self.think_ms = think_ms
+        self.poll_ms = poll_ms
+
+    def _think(self):
+        if self.think_ms:
+            time.sleep(self.rng.uniform(0.5, 1.5) * self.think_ms / 1000)
+
+    def _step(self, name, fn):
+        t0 = time.perf_counter()
+        try:
+            value = fn()
+        except Exception:
+            self.recorder.error(name)
+            raise
+        self.recorder.record(name, (time.perf_counter() - t0) * 1000)
+        return value
+
+    def search(self, filters):
+        from core.result_store import query_key
+        dm = self.env.dm
+        min_lots, max_lots = filters["lots"]
+        key = query_key("aggregated_syndics", filters["zones"], min_lots, max_lots, filters["periods"], filters["exclude_big"], filters["qpv"])
+        df = self.store.get_or_load(key, lambda: dm.fetch_aggregated_syndics(
+            filters["zones"], min_lots, max_lots, filters["periods"], filters["exclude_big"], filters["qpv"], raise_errors=True
+        ))
+        self.store.hold(self.ref.id, "syndic_list", key)
+        if df.empty:
+            raise LookupError("empty search result")
+        return df
+
+    def select(self, row, filters):
+        from core.result_store import query_key
+        dm, pappers = self.env.dm, self.env.pappers
+        min_lots, max_lots = filters["lots"]
+        key = query_key("syndic_details", row["Syndic"], filters["zones"], min_lots, max_lots, filters["periods"], filters["exclude_big"], filters["qpv"], None)
+        self.store.get_or_load(key, lambda: dm.fetch_data_by_syndic(
+            row["Syndic"], filters["zones"], min_lots, max_lots, filters["periods"], filters["exclude_big"], filters["qpv"], raise_errors=True
+        ))
+        self.store.hold(self.ref.id, "selected_syndic_data", key)
+        return pappers.get_syndic_info(row["Siret"]) if row["Siret"] else None
+
+    def enrich(self, row, legal):
+        from core.job_queue import submit_enrichment, get_job, ACTIVE_STATUSES
+        job_id = submit_enrichment(row["Siret"], row["Syndic"], "PARIS", pappers_data=legal)
+        deadline = time.time() + ENRICH_TIMEOUT_SECONDS
+        while time.time() < deadline:
+            job = get_job(job_id)
+            if job and job["status"] not in ACTIVE_STATUSES:
+                if job["status"] != "done":
+                    raise RuntimeError(job.get("error") or job["status"])
+                return job["result"]
+            time.sleep(self.poll_ms / 1000)
+        raise TimeoutError(f"enrichment job {job_id}")
+
+    def pack(self, df_agg, index):
+        from core.export_pack import iter_pack_chunks
+        rows = []
+        for chunk, _, _ in iter_pack_chunks(df_agg.iloc[[index]], enricher=self.enricher):
+            rows.extend(chunk)
+        return rows
+
+    def run_session(self):
+        t0 = time.perf_counter()
+        filters = self.rng.choice(FILTER_PRESETS)
+        try:
+            df_agg = self._step("search", lambda: self.search(filters))
+            self._think()
+            # Reps mostly open the first rows of the table
+            index = min(int(self.rng.expovariate(0.25)), len(df_agg) - 1, POPULAR_SYNDICS - 1)
+            row = df_agg.iloc[index].to_dict()
+            legal = self._step("select", lambda: self.select(row, filters))
+            self._think()
+            if row["Siret"]:
+                self._step("enrich", lambda: self.enrich(row, legal))
+            self._think()
+            self._step("pack", lambda: self.pack(df_agg, index))
+        except Exception:
+            return
+        self.recorder.record("session", (time.perf_counter() - t0) * 1000)
+
+    def close(self):
+        self.store.release_holder(self.ref.id)
+
+
+def run_level(env, users, duration, think_ms, poll_ms, seed):
+    """Runs `users` concurrent sessions loops for `duration` seconds from empty caches."""
+    from core.result_store import ResultStore
+    env.reset_caches()
+    store = ResultStore()
+    enricher = env.enrichment.EnrichmentManager()  # Shared like the app's get_enricher()
+    recorder = LoadRecorder()
+    stop = threading.Event()
+    rss_before = rss_mb()
+
+    def loop(i):
+        user = VirtualUser(env, store, enricher, recorder, seed * 1000 + i, think_ms, poll_ms)
+        while not stop.is_set():
+            user.run_session()
+        user.close()
+
+    threads = [threading.Thread(target=loop, args=(i,), name=f"vu-{i}", daemon=True) for i in range(users)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join(ENRICH_TIMEOUT_SECONDS)
+    elapsed = time.perf_counter() - t0
+
+    def pct(values):
+        return {p: round(percentile(values, p), 1) if values else None for p in (50, 95, 99)}
+
+    report = store.memory_report()
+    return {
+        "users": users,
+        "sessions": recorder.sessions,
+        "throughput": round(recorder.sessions / elapsed, 2),
+        "errors": dict(recorder.errors),
+        "latency_ms": {step: pct(samples) for step, samples in recorder.samples.items()},
+        "rss_mb": round(rss_mb(), 1),
+        "rss_growth_mb": round(rss_mb() - rss_before, 1),
+        "store_mb": report["mb"],
+        "bq_queries": env.client.queries,
+    }
+
+
+def find_saturation(levels):
+    """First level whose throughput gain over the previous level is below SATURATION_GAIN (None if it kept scaling)."""
+    for previous, level in zip(levels, levels[1:]):
+        if level["throughput"] < previous["throughput"] * SATURATION_GAIN:
+            return level["users"]
+    return None
+
+
+def format_levels(levels):
+    lines = [f"{'users':>5} {'sessions':>8} {'sess/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6} {'rss MB':>7} {'+rss':>6} {'store MB':>8}"]
+    for lv in levels:
+        s = lv["latency_ms"]["session"]
+        lines.append(
+            f"{lv['users']:>5} {lv['sessions']:>8} {lv['throughput']:>7.2f} {s[50] or 0:>8.0f} {s[95] or 0:>8.0f} {s[99] or 0:>8.0f} "
+            f"{sum(lv['errors'].values()):>6} {lv['rss_mb']:>7.0f} {lv['rss_growth_mb']:>+6.0f} {lv['store_mb']:>8.1f}"
+        )
+    lines.append("")
+    lines.append(f"{'users':>5} " + " ".join(f"{step + ' p50/p95/p99':>22}" for step in STEPS))
+    for lv in levels:
+        cells = []
+        for step in STEPS:
+            p = lv["latency_ms"][step]
+            cells.append(f"{p[50] or 0:.0f}/{p[95] or 0:.0f}/{p[99] or 0:.0f}".rjust(22))
+        lines.append(f"{lv['users']:>5} " + " ".join(cells))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent virtual-user load test against the offline stand-ins.")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Concurrency levels to run")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per level")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Mean pause between steps of a session")
+    parser.add_argument("--poll-ms", type=float, default=200.0, help="Enrichment job polling interval")
+    parser.add_argument("--rows", type=int, default=200000, help="Rows of the synthetic rnic.copro table")
+    parser.add_argument("--data", default=None, help="Parquet rnic.copro table to use instead of generating one")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="Stub HTTP latency")
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of injected HTTP 500s")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of injected HTTP 429s")
+    parser.add_argument("--bq-latency-ms", type=float, default=50.0, help="Round-trip added to each DuckDB query")
+    parser.add_argument("--real-rate-limits", action="store_true", help="Keep core.rate_limiter limits")
+    parser.add_argument("--cache-backend", choices=("bigquery", "local", "write_through"), default="bigquery", help="CACHE_BACKEND of the Pappers/enrichment caches")
+    parser.add_argument("--json", default=None, help="Write the level reports to this file")
+    args = parser.parse_args(argv)
+
+    stub_config = StubConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.throttle_rate, seed=args.seed)
+    env = Environment(args.rows, args.seed, stub_config, args.bq_latency_ms, args.real_rate_limits, args.data, args.cache_backend)
+    from core import job_queue
+    levels = []
+    try:
+        for users in args.users:
+            levels.append(run_level(env, users, args.duration, args.think_ms, args.poll_ms, args.seed))
+            print(f"{users} users: {levels[-1]['throughput']} sessions/s", flush=True)
+    finally:
+        job_queue.stop_workers(timeout=5)
+        env.close()
+
+    print()
+    print(format_levels(levels))
+    saturation = find_saturation(levels)
+    print()
+    print(f"Saturation: {saturation} users (throughput gain < {SATURATION_GAIN - 1:.0%})" if saturation else "Saturation: not reached")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "levels": levels, "saturation_users": saturation}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""
+Offline benchmark suite: times the main data paths against local stand-ins
+(DuckDB for BigQuery, HTTP stubs for Pappers, Apollo and web search), at cold
+and warm cache, and compares the result with a stored baseline.
+
+Usage:
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/run_benchmarks.py                       # run + compare with benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --update-baseline     # record the baseline
+    python benchmarks/run_benchmarks.py --latency-ms 150 --error-rate 0.05 --rows 200000
+    python benchmarks/run_benchmarks.py --scale 600000 2000000 10000000   # query scaling only
+
+Phases: 'cold' = first call with empty caches (cache tables truncated, upstream
+stubs hit), 'warm' = repeated calls served from the BigQuery-side caches.
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeBigQueryClient, StubServer, StubConfig
+from synth_rnic import write_parquet
+
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+DEFAULT_TOLERANCE = 0.25  # Allowed p50 slowdown over baseline before failing
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def timed(fn, iterations):
+    """Returns: list of wall times in ms."""
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+def summarize(samples, **extra):
+    return {
+        "n": len(samples),
+        "p50_ms": round(percentile(samples, 50), 2),
+        "p95_ms": round(percentile(samples, 95), 2),
+        "mean_ms": round(sum(samples) / len(samples), 2),
+        **extra,
+    }
+
+
+class Environment:
+    """Stub server + DuckDB client wired into core/ through env vars and use_bigquery_client."""
+
+    def __init__(self, rows, seed, stub_config, bq_latency_ms, real_rate_limits=False, data=None, cache_backend="bigquery"):
+        self.tmp = tempfile.mkdtemp(prefix="cee_bench_")
+        self.stub = StubServer(stub_config).start()
+        os.environ.update({
+            "PAPPERS_API_URL": f"{self.stub.url}/v2/entreprise/",
+            "APOLLO_API_URL": self.stub.url,
+            "SEARCH_API_URL": f"{self.stub.url}/search",
+            "PAPPERS_API_KEY": "bench",
+            "APOLLO_API_KEY": "bench",
+            "CEE_LIMITER_DB": os.path.join(self.tmp, "rate_limiter.sqlite"),
+            "CEE_JOBS_DB": os.path.join(self.tmp, "jobs.sqlite"),
+            "CEE_SNAPSHOT_PATH": os.path.join(self.tmp, "copro_snapshot.parquet"),
+            "CEE_LOCAL_CACHE_DB": os.path.join(self.tmp, "cache.sqlite"),
+            "CACHE_BACKEND": cache_backend,
+        })
+
+        # core/ is imported only now, so module-level configuration picks up the env above
+        from core import data_manager, pappers_connector, enrichment_manager, rate_limiter
+        self.dm, self.pappers, self.enrichment = data_manager, pappers_connector, enrichment_manager
+        if not real_rate_limits:
+            for limits in rate_limiter.RATE_LIMITS.values():
+                limits.update(rate_per_sec=1e6, burst=1e6, daily_credits=10**9)
+
+        self.client = FakeBigQueryClient(os.path.join(self.tmp, "warehouse.duckdb"), latency_ms=bq_latency_ms)
+        self.load_copro(rows, seed, data)
+        data_manager.use_bigquery_client(self.client)
+        pappers_connector.init_cache_table()
+        enrichment_manager.init_enrichment_cache()
+
+    def load_copro(self, rows, seed=7, data=None):
+        """Loads rnic.copro from `data` (Parquet) or from a generated table of `rows` rows."""
+        if data is None:
+            data = os.path.join(self.tmp, f"rnic_{rows}_{seed}.parquet")
+            if not os.path.exists(data):
+                write_parquet(data, rows, seed)
+        self.client.load_parquet(self.dm.DATASET_TABLE, data)
+
+    def reset_caches(self):
+        for cache, table in ((self.pappers.get_pappers_cache(), self.pappers.CACHE_TABLE),
+                             (self.enrichment.get_enrichment_cache(), self.enrichment.CACHE_TABLE)):
+            if cache.uses_bigquery:
+                self.client.truncate(table)
+            if hasattr(cache, "clear"):
+                cache.clear()
+
+    def close(self):
+        self.dm.use_bigquery_client(None)
+        self.stub.stop()
+
+
+QUERY_FILTERS = dict(climate_zones=["H1"], min_lots=20, max_lots=500, periods=["Avant 1949", "1949-1974"], exclude_big_syndics=True)
+
+
+def run_suite(env, iterations, sample_syndics):
+    dm, pappers, enrichment = env.dm, env.pappers, env.enrichment
+    filters = QUERY_FILTERS
+    results = {}
+
+    def case(name, phase, fn, runs):
+        env.stub.reset_counts()
+        queries_before = env.client.queries
+        samples = timed(fn, runs)
+        results[f"{name}:{phase}"] = summarize(
+            samples,
+            upstream_calls=sum(env.stub.requests.values()),
+            bq_queries=env.client.queries - queries_before,
+        )
+
+    syndics = dm.fetch_aggregated_syndics(**filters)
+    top = syndics.head(sample_syndics).to_dict("records")
+
+    case("fetch_aggregated_syndics", "cold", lambda: dm.fetch_aggregated_syndics(**filters), 1)
+    case("fetch_aggregated_syndics", "warm", lambda: dm.fetch_aggregated_syndics(**filters), iterations)
+
+    name = top[0]["Syndic"]
+    case("fetch_data_by_syndic", "cold", lambda: dm.fetch_data_by_syndic(name, **filters), 1)
+    case("fetch_data_by_syndic", "warm", lambda: dm.fetch_data_by_syndic(name, **filters), iterations)
+
+    env.reset_caches()
+    sirets = iter([row["Siret"] for row in top] * (iterations + 1))
+    case("get_syndic_info", "cold", lambda: pappers.get_syndic_info(next(sirets)), len(top))
+    case("get_syndic_info", "warm", lambda: pappers.get_syndic_info(next(sirets)), len(top))
+
+    manager = enrichment.EnrichmentManager()
+    env.reset_caches()
+    rows = iter(top * 2)
+
+    def enrich():
+        row = next(rows)
+        legal = pappers.get_syndic_info(row["Siret"])
+        try:
+            manager.enrich_syndic(row["Siret"], row["Syndic"], "PARIS", pappers_data=legal)
+        except enrichment.RateLimitExceeded:
+            pass  # Refused by the limiter or a stub 429: not cached, counted in upstream calls
+
+    case("enrich_syndic", "cold", enrich, len(top))
+    case("enrich_syndic", "warm", enrich, len(top))
+    return results
+
+
+def run_scale(env, row_counts, seed, iterations):
+    """
+    Aggregate and detail query latency for each table size (the detail query targets
+    the largest syndic, i.e. the worst case). Returns: dict -> {"<case>:<rows>": summary}
+    """
+    dm = env.dm
+    results = {}
+    for rows in row_counts:
+        env.load_copro(rows, seed)
+        top = dm.fetch_aggregated_syndics(**QUERY_FILTERS)
+        name = top.iloc[0]["Syndic"]
+        for case, fn in (
+            ("fetch_aggregated_syndics", lambda: dm.fetch_aggregated_syndics(**QUERY_FILTERS)),
+            ("fetch_data_by_syndic", lambda: dm.fetch_data_by_syndic(name, **QUERY_FILTERS)),
+        ):
+            before = env.client.queries
+            results[f"{case}:{rows}"] = summarize(timed(fn, iterations), upstream_calls=0, bq_queries=env.client.queries - before)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Returns: list of (case, baseline p50, current p50) slower than tolerance allows."""
+    slower = []
+    for key, current in results.items():
+        ref = baseline.get("results", {}).get(key)
+        if ref and current["p50_ms"] > ref["p50_ms"] * (1 + tolerance):
+            slower.append((key, ref["p50_ms"], current["p50_ms"]))
+    return slower
+
+
+def format_results(results, baseline=None):
+    baseline = (baseline or {}).get("results", {})
+    lines = [f"{'case':<32} {'n':>4} {'p50 ms':>9} {'p95 ms':>9} {'upstream':>9} {'bq':>5} {'vs baseline':>12}"]
+    for key, r in results.items():
+        ref = baseline.get(key, {}).get("p50_ms")
+        delta = f"{(r['p50_ms'] / ref - 1) * 100:+.0f}%" if ref else "-"
+        lines.append(f"{key:<32} {r['n']:>4} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['upstream_calls']:>9} {r['bq_queries']:>5} {delta:>12}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks against DuckDB and HTTP stubs.")
+    parser.add_argument("--rows", type=int, default=50000, help="Rows of the synthetic rnic.copro table")
+    parser.add_argument("--data", default=None, help="Parquet rnic.copro table to use instead of generating one")
+    parser.add_argument("--scale", type=int, nargs="*", default=None, help="Only time the queries at these table sizes")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--iterations", type=int, default=10, help="Warm runs per query case")
+    parser.add_argument("--syndics", type=int, default=10, help="Syndics used for the Pappers/enrichment cases")
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="Stub HTTP latency")
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of injected HTTP 500s")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of injected HTTP 429s")
+    parser.add_argument("--bq-latency-ms", type=float, default=50.0, help="Round-trip added to each DuckDB query")
+    parser.add_argument("--real-rate-limits", action="store_true", help="Keep core.rate_limiter limits (slow)")
+    parser.add_argument("--cache-backend", choices=("bigquery", "local", "write_through"), default="bigquery", help="CACHE_BACKEND of the Pappers/enrichment caches")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    if not args.update_baseline and not os.path.exists(args.baseline):
+        # Without a baseline nothing can regress: fail instead of passing silently
+        print(f"No baseline at {args.baseline}: record one with --update-baseline")
+        return 2
+
+    stub_config = StubConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.throttle_rate, seed=args.seed)
+    env = Environment(args.rows, args.seed, stub_config, args.bq_latency_ms, args.real_rate_limits, args.data, args.cache_backend)
+    try:
+        if args.scale:
+            results = run_scale(env, args.scale, args.seed, args.iterations)
+        else:
+            results = run_suite(env, args.iterations, args.syndics)
+    finally:
+        env.close()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print(format_results(results, baseline))
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            config = {k: v for k, v in vars(args).items() if k not in ("baseline", "update_baseline")}
+            json.dump({"config": config, "results": results}, f, indent=2, sort_keys=True, default=str)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    slower = compare(results, baseline, args.tolerance)
+    for key, ref, current in slower:
+        print(f"REGRESSION {key}: p50 {ref:.1f} ms -> {current:.1f} ms")
+    return 1 if slower else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""
+Seeded synthetic `rnic.copro` generator for scale tests (600k -> 10M rows).
+
+Produces the columns used by build_filter_clause, fetch_aggregated_syndics and
+fetch_data_by_syndic, all as STRING like the production table:
+- syndic names/SIRETs with a long tail (Zipf), majors and open-data placeholders
+- department codes weighted by housing stock, communes per department
+- construction periods, habitation/total lots (log-normal), QPV codes/names
+- coordinates scattered around department centroids
+
+Rows are generated in chunks (bounded memory) and written to Parquet or to a
+DuckDB table `rnic.copro` (the schema read by benchmarks/fakes.FakeBigQueryClient).
+
+Usage:
+    python benchmarks/synth_rnic.py --rows 600000 --out rnic_600k.parquet
+    python benchmarks/synth_rnic.py --rows 10000000 --duckdb warehouse.duckdb
+"""
+import os
+import sys
+import argparse
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_ROWS = 600_000
+CHUNK_ROWS = 500_000
+ROWS_PER_SYNDIC = 40            # ~15k syndics for 600k copros
+COMMUNES_PER_DEPT = 120
+QPV_SHARE = 0.08
+
+# Approximate department centroids (lat, lon) and relative weight in the copro stock
+DEPARTMENTS = {
+    "01": (46.10, 5.35, 1), "02": (49.55, 3.55, 1), "03": (46.40, 3.20, 1), "04": (44.10, 6.25, 1),
+    "05": (44.65, 6.25, 1), "06": (43.90, 7.15, 12), "07": (44.75, 4.40, 1), "08": (49.60, 4.65, 1),
+    "09": (42.95, 1.50, 1), "10": (48.30, 4.15, 1), "11": (43.10, 2.40, 2), "12": (44.30, 2.65, 1),
+    "13": (43.50, 5.10, 14), "14": (49.10, -0.35, 3), "15": (45.05, 2.65, 1), "16": (45.70, 0.20, 1),
+    "17": (45.75, -0.70, 3), "18": (47.05, 2.50, 1), "19": (45.35, 1.85, 1), "21": (47.40, 4.80, 2),
+    "22": (48.45, -2.85, 2), "23": (46.10, 2.00, 1), "24": (45.10, 0.75, 1), "25": (47.15, 6.35, 2),
+    "26": (44.70, 5.15, 2), "27": (49.10, 1.00, 1), "28": (48.30, 1.40, 1), "29": (48.25, -4.05, 3),
+    "2A": (41.85, 8.95, 1), "2B": (42.40, 9.20, 1), "30": (43.95, 4.20, 2), "31": (43.35, 1.20, 7),
+    "32": (43.70, 0.45, 1), "33": (44.85, -0.60, 7), "34": (43.60, 3.45, 7), "35": (48.15, -1.65, 4),
+    "36": (46.80, 1.55, 1), "37": (47.25, 0.70, 2), "38": (45.25, 5.60, 5), "39": (46.75, 5.70, 1),
+    "40": (43.95, -0.75, 1), "41": (47.60, 1.40, 1), "42": (45.70, 4.20, 3), "43": (45.10, 3.80, 1),
+    "44": (47.35, -1.70, 5), "45": (47.90, 2.20, 2), "46": (44.60, 1.60, 1), "47": (44.35, 0.45, 1),
+    "48": (44.50, 3.50, 1), "49": (47.40, -0.55, 2), "50": (49.10, -1.30, 1), "51": (48.95, 4.25, 2),
+    "52": (48.10, 5.20, 1), "53": (48.15, -0.65, 1), "54": (48.80, 6.15, 3), "55": (48.95, 5.40, 1),
+    "56": (47.85, -2.85, 2), "57": (49.05, 6.60, 3), "58": (47.10, 3.50, 1), "59": (50.45, 3.20, 8),
+    "60": (49.40, 2.40, 2), "61": (48.60, 0.10, 1), "62": (50.50, 2.30, 3), "63": (45.70, 3.15, 3),
+    "64": (43.25, -0.75, 3), "65": (43.05, 0.15, 1), "66": (42.60, 2.55, 2), "67": (48.65, 7.55, 5),
+    "68": (47.85, 7.25, 3), "69": (45.85, 4.65, 12), "70": (47.65, 6.10, 1), "71": (46.65, 4.55, 1),
+    "72": (48.00, 0.20, 2), "73": (45.50, 6.40, 3), "74": (46.05, 6.40, 4), "75": (48.86, 2.35, 40),
+    "76": (49.65, 1.00, 4), "77": (48.60, 2.95, 6), "78": (48.80, 1.85, 8), "79": (46.55, -0.30, 1),
+    "80": (49.95, 2.30, 2), "81": (43.80, 2.15, 1), "82": (44.10, 1.30, 1), "83": (43.45, 6.20, 8),
+    "84": (44.00, 5.15, 2), "85": (46.65, -1.30, 2), "86": (46.55, 0.45, 1), "87": (45.90, 1.25, 1),
+    "88": (48.20, 6.40, 1), "89": (47.85, 3.55, 1), "90": (47.65, 6.90, 1), "91": (48.50, 2.25, 7),
+    "92": (48.85, 2.25, 20), "93": (48.90, 2.45, 12), "94": (48.78, 2.47, 12), "95": (49.08, 2.15, 6),
+}
+# Spread of coordinates around the centroid (degrees): dense urban departments are tighter
+URBAN_SPREAD = {"75": 0.03, "92": 0.04, "93": 0.04, "94": 0.04}
+DEFAULT_SPREAD = 0.25
+
+PERIODS = {
+    "AVANT_1949": 0.20, "DE_1949_A_1960": 0.08, "DE_1961_A_1974": 0.19, "DE_1975_A_1993": 0.18,
+    "DE_1994_A_2000": 0.07, "DE_2001_A_2010": 0.10, "A_COMPTER_DE_2011": 0.10, "NON_CONNUE": 0.08,
+}
+
+# (name, share of all copros): majors and open-data placeholders found in the real registry
+HEAD_SYNDICS = [
+    ("FONCIA PARIS", 0.035), ("NEXITY LAMY", 0.025), ("CITYA IMMOBILIER", 0.015), ("LAMY GESTION", 0.008),
+    ("IDENTITE NON PARTAGEE EN OPEN DATA", 0.06), ("NON CONNU", 0.01), ("SYNDIC BENEVOLE", 0.05),
+]
+PLACEHOLDER_SYNDICS = {"IDENTITE NON PARTAGEE EN OPEN DATA", "NON CONNU", "SYNDIC BENEVOLE"}
+NULL_SYNDIC_SHARE = 0.01
+ZIPF_EXPONENT = 1.1
+ZIPF_OFFSET = 20  # Zipf-Mandelbrot offset: flattens the head so majors stay the largest syndics
+
+
+def _syndic_table(n_syndics, rng):
+    """Syndic names, SIRETs and Zipf weights of the long tail."""
+    names = np.array([f"CABINET {i:06d}" for i in range(n_syndics)], dtype=object)
+    sirets = np.array([f"{s:014d}" for s in rng.integers(10**12, 10**14, n_syndics)], dtype=object)
+    weights = 1.0 / (np.arange(1, n_syndics + 1) + ZIPF_OFFSET) ** ZIPF_EXPONENT
+    return names, sirets, weights / weights.sum()
+
+
+def generate_chunks(rows, seed=7, chunk_rows=CHUNK_ROWS):
+    """Yields DataFrames of at most `chunk_rows` rows; the same seed always gives the same table."""
+    rng = np.random.default_rng(seed)
+    names, sirets, tail_weights = _syndic_table(max(50, rows // ROWS_PER_SYNDIC), rng)
+    head_names = np.array([n for n, _ in HEAD_SYNDICS], dtype=object)
+    head_shares = np.array([s for _, s in HEAD_SYNDICS])
+    head_sirets = np.array([f"{s:014d}" for s in rng.integers(10**12, 10**14, len(HEAD_SYNDICS))], dtype=object)
+    # Placeholders carry no SIRET
+    head_sirets[[i for i, (n, _) in enumerate(HEAD_SYNDICS) if n in PLACEHOLDER_SYNDICS]] = None
+
+    dept_codes = np.array(list(DEPARTMENTS), dtype=object)
+    dept_lat = np.array([v[0] for v in DEPARTMENTS.values()])
+    dept_lon = np.array([v[1] for v in DEPARTMENTS.values()])
+    dept_weights = np.array([v[2] for v in DEPARTMENTS.values()], dtype="float64")
+    dept_weights /= dept_weights.sum()
+    dept_spread = np.array([URBAN_SPREAD.get(d, DEFAULT_SPREAD) for d in dept_codes])
+    commune_weights = 1.0 / np.arange(1, COMMUNES_PER_DEPT + 1)
+    commune_weights /= commune_weights.sum()
+    period_values = np.array(list(PERIODS), dtype=object)
+    period_weights = np.array(list(PERIODS.values()))
+    period_weights /= period_weights.sum()
+
+    done = 0
+    while done < rows:
+        n = min(chunk_rows, rows - done)
+        # Syndics: head (majors/placeholders) + NULLs + Zipf tail
+        roll = rng.random(n)
+        head_idx = np.searchsorted(np.cumsum(head_shares), roll)
+        in_head = head_idx < len(HEAD_SYNDICS)
+        is_null = ~in_head & (roll < head_shares.sum() + NULL_SYNDIC_SHARE)
+        tail_idx = rng.choice(len(names), size=n, p=tail_weights)
+        syndic = np.where(in_head, head_names[np.minimum(head_idx, len(HEAD_SYNDICS) - 1)], names[tail_idx])
+        siret = np.where(in_head, head_sirets[np.minimum(head_idx, len(HEAD_SYNDICS) - 1)], sirets[tail_idx])
+        syndic[is_null] = None
+        siret[is_null] = None
+
+        dept_idx = rng.choice(len(dept_codes), size=n, p=dept_weights)
+        commune_idx = rng.choice(COMMUNES_PER_DEPT, size=n, p=commune_weights)
+        lat = dept_lat[dept_idx] + rng.normal(0, dept_spread[dept_idx])
+        lon = dept_lon[dept_idx] + rng.normal(0, dept_spread[dept_idx] * 1.4)
+
+        hab = np.clip(np.rint(rng.lognormal(2.6, 0.9, n)), 1, 2000).astype("int64")
+        total = hab + np.rint(rng.exponential(hab * 0.6 + 2)).astype("int64")
+
+        qpv = rng.random(n) < QPV_SHARE
+        qpv_num = rng.integers(100, 999, n)
+        depts = dept_codes[dept_idx]
+
+        yield pd.DataFrame({
+            "numero_d_immatriculation": [f"A{(done + i) // 10**7 % 26 + 65:c}{(done + i) % 10**7:07d}" for i in range(n)],
+            "raison_sociale_du_representant_legal": syndic,
+            "siret_du_representant_legal": siret,
+            "nombre_de_lots_a_usage_d_habitation": hab.astype(str),
+            "nombre_total_de_lots": total.astype(str),
+            "periode_de_construction": rng.choice(period_values, size=n, p=period_weights),
+            "code_officiel_departement": depts,
+            "commune": [f"COMMUNE {d}-{c:03d}" for d, c in zip(depts, commune_idx)],
+            "code_qp_2024": np.where(qpv, [f"QN0{d}{q}" for d, q in zip(depts, qpv_num)], ""),
+            "nom_qp_2024": np.where(qpv, [f"QUARTIER {q}" for q in qpv_num], ""),
+            "lat": np.round(lat, 6).astype(str),
+            "long": np.round(lon, 6).astype(str),
+        })
+        done += n
+
+
+def write_parquet(path, rows, seed=7, chunk_rows=CHUNK_ROWS):
+    """Streams the generated table to a Parquet file (one row group per chunk)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    writer = None
+    try:
+        for chunk in generate_chunks(rows, seed, chunk_rows):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return path
+
+
+def write_duckdb(path, rows, seed=7, chunk_rows=CHUNK_ROWS, table="rnic.copro"):
+    """Writes the generated table into a DuckDB database (schema.table)."""
+    import duckdb
+    schema, name = table.split(".")
+    conn = duckdb.connect(path)
+    try:
+        conn.execute(f'CREATE SCHEMA IF NOT EXISTS "{schema}"')
+        conn.execute(f'DROP TABLE IF EXISTS "{schema}"."{name}"')
+        for chunk in generate_chunks(rows, seed, chunk_rows):
+            conn.register("_chunk", chunk)
+            if conn.execute(
+                "SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = ? AND table_name = ?", [schema, name]
+            ).fetchone()[0]:
+                conn.execute(f'INSERT INTO "{schema}"."{name}" SELECT * FROM _chunk')
+            else:
+                conn.execute(f'CREATE TABLE "{schema}"."{name}" AS SELECT * FROM _chunk')
+            conn.unregister("_chunk")
+    finally:
+        conn.close()
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic rnic.copro table.")
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--out", help="Parquet file")
+    target.add_argument("--duckdb", help="DuckDB database (table rnic.copro)")
+    args = parser.parse_args(argv)
+
+    if args.out:
+        write_parquet(args.out, args.rows, args.seed, args.chunk_rows)
+        path = args.out
+    else:
+        write_duckdb(args.duckdb, args.rows, args.seed, args.chunk_rows)
+        path = args.duckdb
+    print(f"{args.rows} rows written to {os.path.abspath(path)}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,337 @@
+import asyncio
+import threading
+from functools import partial
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from core.lazy import lazy_import
+from core.tracing import span, logger
+from core.rate_limiter import acquire_async, record_throttle, parse_retry_after, RateLimitExceeded, RATE_LIMITS
+from core.enrichment_manager import EnrichmentManager, APOLLO_ORG_SEARCH_URL, APOLLO_PEOPLE_SEARCH_URL
+from core.pappers_connector import (
+    PAPPERS_API_URL, get_pappers_cache, get_pappers_api_key, normalize_siret, read_cached_info,
+    extract_pappers_fields, cache_row,
+)
+
+aiohttp = lazy_import("aiohttp")
+
+# Configuration
+DEFAULT_CONCURRENCY = 100  # Max in-flight lookups per event loop
+HTTP_TIMEOUT_SECONDS = 10
+# Lookups inside an Apollo call at once. Apollo allows 1 call/s with a burst of 5: more
+# waiters than that would outlast the limiter timeout instead of queueing here.
+APOLLO_CONCURRENCY = int(RATE_LIMITS["apollo"]["burst"])
+# Same for Pappers (5 calls/s, burst 10)
+PAPPERS_CONCURRENCY = int(RATE_LIMITS["pappers"]["burst"])
+# Dedicated pool for the blocking parts (cache reads/writes, DuckDuckGo), so a batch is not
+# capped by the ~32 threads of the default asyncio executor nor competes with other users of it
+BLOCKING_WORKERS = DEFAULT_CONCURRENCY
+
+_blocking_executor = None
+_blocking_lock = threading.Lock()
+
+
+def get_blocking_executor():
+    """Process-wide pool running the blocking calls of the async engine."""
+    global _blocking_executor
+    with _blocking_lock:
+        if _blocking_executor is None:
+            _blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="async-blocking")
+        return _blocking_executor
+
+
+async def run_blocking(fn, *args):
+    """Runs `fn(*args)` on the blocking pool without blocking the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(get_blocking_executor(), partial(fn, *args))
+
+
+def create_http_session(max_concurrency=DEFAULT_CONCURRENCY):
+    """One pooled aiohttp session shared by every lookup of a batch."""
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=max_concurrency),
+        timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT_SECONDS)
+    )
+
+
+async def get_syndic_info_async(siret, session, cache=None, wait_for_quota=True, pappers_slots=None):
+    """
+    Async counterpart of pappers_connector.get_syndic_info, returning the same dicts.
+    Cache reads/writes (`cache`: backend) run on the blocking pool; the Pappers call uses `session`
+    and, with `pappers_slots` (semaphore shared by a batch), waits for a slot first.
+    Errors are logged rather than rendered, since there is no Streamlit page to draw on.
+    """
+    clean_siret = normalize_siret(siret)
+    if not clean_siret:
+        return None
+
+    cache = cache or get_pappers_cache()
+
+    # 1. Check Cache
+    try:
+        res = await run_blocking(read_cached_info, clean_siret, cache)
+        if res is not None:
+            return res
+    except Exception as e:
+        logger.warning(f"Pappers cache lookup error: {e}")
+
+    # 2. Call API (if Key exists)
+    api_key = get_pappers_api_key()
+    if not api_key:
+        return {"nom_dirigeant": "Clé Manquante", "ca_annuel": None}
+
+    # Only a burst of lookups waits for a Pappers token; the others queue on the semaphore
+    async with pappers_slots or nullcontext():
+        try:
+            await acquire_async("pappers", wait=wait_for_quota, executor=get_blocking_executor())
+        except RateLimitExceeded as e:
+            logger.warning(f"Pappers call skipped: {e}")
+            return None
+
+        try:
+            params = {"siret": clean_siret, "api_token": api_key}
+            async with session.get(PAPPERS_API_URL, params=params) as response:
+                if response.status == 200:
+                    data = await response.json(content_type=None)
+                    result = extract_pappers_fields(data, clean_siret)
+
+                    # 3. Update Cache
+                    try:
+                        await run_blocking(cache.put, cache_row(result, data))
+                    except Exception as e:
+                        logger.info(f"Pappers cache update failed ({e})")
+                    return result
+
+                elif response.status == 404:
+                    return {"nom_dirigeant": "Non trouvé", "ca_annuel": 0}
+                elif response.status == 429:
+                    await run_blocking(record_throttle, "pappers", parse_retry_after(response))
+                    logger.error("Pappers API error: 429 - too many requests")
+                else:
+                    logger.error(f"Pappers API error: {response.status} - {await response.text()}")
+
+        except Exception as e:
+            logger.error(f"Pappers connection error: {e}")
+
+        return None
+
+
+class AsyncEnrichmentManager(EnrichmentManager):
+    """
+    Asyncio-native EnrichmentManager. Apollo calls go through an aiohttp session,
+    blocking dependencies (BigQuery cache, DuckDuckGo) run on the blocking pool.
+    Parsing, domain validation and cache formats are inherited, so results are
+    identical to `EnrichmentManager.enrich_syndic`.
+
+    At most `apollo_concurrency` lookups wait for an Apollo token at once; the
+    others queue on a semaphore, which has no timeout.
+    """
+
+    def __init__(self, session, wait_for_quota=True, apollo_concurrency=APOLLO_CONCURRENCY):
+        super().__init__(wait_for_quota=wait_for_quota)
+        self.session = session
+        self._apollo_slots = asyncio.Semaphore(apollo_concurrency)
+
+    async def _apollo_post_async(self, url, headers, data, s):
+        """
+        Async `_apollo_post`. Returns: (status, payload) where payload is the parsed
+        JSON on 200 and the response text otherwise.
+        Raises RateLimitExceeded (QuotaExceeded) when the call is refused or answered 429.
+        """
+        async with self._apollo_slots:
+            waited = await acquire_async("apollo", wait=self.wait_for_quota, executor=get_blocking_executor())
+            s.set(rate_limit_wait_ms=round(waited * 1000, 1))
+            async with self.session.post(url, headers=headers, json=data) as response:
+                s.set(upstream_status=response.status)
+                if response.status == 429:
+                    retry_after = parse_retry_after(response)
+                    await run_blocking(record_throttle, "apollo", retry_after)
+                    raise RateLimitExceeded("apollo", float(retry_after or 1.0))
+                if response.status == 200:
+                    return response.status, await response.json(content_type=None)
+                return response.status, await response.text()
+
+    async def search_apollo_org_async(self, domain=None, name=None):
+        """Async `search_apollo_org`: domain search first, then name search."""
+        if not self.apollo_key:
+            logger.debug("Apollo search skipped - No API Key")
+            return None
+
+        headers = self._apollo_headers(no_cache=True)
+
+        # 1. Try Domain Search if domain exists
+        if domain:
+            with span("apollo_org", by="domain", domain=domain) as s:
+                try:
+                    status, res = await self._apollo_post_async(APOLLO_ORG_SEARCH_URL, headers, self._org_payload(domain=domain), s)
+                    if status == 200:
+                        org_id = self._org_id_from_response(res)
+                        if org_id:
+                            s.set(outcome="hit", org_id=org_id)
+                            return org_id
+                        s.set(outcome="empty")
+                    else:
+                        s.set(outcome="http_error")
+                except RateLimitExceeded:
+                    raise
+                except Exception as e:
+                    s.set(outcome="error", error=str(e)[:200])
+
+        # 2. Fallback: Try Name Search
+        search_name = name
+        if not search_name and domain:
+            search_name = domain.split('.')[0]
+
+        if search_name:
+            with span("apollo_org", by="name", name=search_name) as s:
+                try:
+                    status, res = await self._apollo_post_async(APOLLO_ORG_SEARCH_URL, headers, self._org_payload(name=search_name), s)
+                    if status == 200:
+                        org_id = self._org_id_from_response(res)
+                        if org_id:
+                            s.set(outcome="hit", org_id=org_id)
+                            return org_id
+                        s.set(outcome="empty")
+                    else:
+                        s.set(outcome="http_error")
+                except RateLimitExceeded:
+                    raise
+                except Exception as e:
+                    s.set(outcome="error", error=str(e)[:200])
+
+        return None
+
+    async def search_apollo_people_async(self, org_id=None, domain=None):
+        """Async `search_apollo_people`."""
+        if not self.apollo_key:
+            logger.debug("Apollo people search skipped - No Key")
+            return []
+
+        if not org_id and not domain:
+            logger.debug("Apollo people search skipped - No Org ID or Domain")
+            return []
+
+        contacts = []
+        with span("apollo_people", by="domain" if domain else "org_id", domain=domain, org_id=org_id) as s:
+            try:
+                status, res = await self._apollo_post_async(
+                    APOLLO_PEOPLE_SEARCH_URL, self._apollo_headers(), self._people_payload(org_id=org_id, domain=domain), s
+                )
+                if status == 200:
+                    contacts = self._contacts_from_response(res)
+                    s.set(outcome="hit" if contacts else "empty", people=len(contacts))
+                else:
+                    s.set(outcome="http_error", response=str(res)[:200])
+            except RateLimitExceeded:
+                raise
+            except Exception as e:
+                s.set(outcome="error", error=str(e)[:200])
+
+        return contacts
+
+    async def enrich_syndic_async(self, siret, name, city, pappers_data=None):
+        """
+        Async `enrich_syndic`: same flow, same stages, same cached result.
+        Raises RateLimitExceeded / QuotaExceeded (nothing cached) when an Apollo call is refused.
+        """
+
+        # A. Check Cache
+        cached = await run_blocking(self.get_cached_data, siret)
+        if cached:
+            return self._decode_cached(cached)
+
+        best_domain = None
+        best_score = 0
+        source = "web_search"
+
+        # B. Try Pappers Data (Website or Email Domain)
+        if pappers_data:
+            best_domain, best_score = self._best_pappers_domain(siret, name, pappers_data)
+            if best_domain:
+                source = "pappers_data"
+
+        # C. Web Search Fallback (Only if Pappers failed)
+        if not best_domain:
+            search_results = await run_blocking(self.web_search_syndic, name, city)
+            best_domain, best_score = self._best_search_domain(search_results, name, best_score)
+
+        if not best_domain:
+            source = "name_fallback"
+
+        # D. Apollo Enrichment
+        contacts = []
+        if best_domain:
+            contacts = await self.search_apollo_people_async(domain=best_domain)
+
+        org_id = ""
+        if not contacts:
+            org_id = await self.search_apollo_org_async(domain=best_domain, name=name)
+            if org_id:
+                contacts = await self.search_apollo_people_async(org_id=org_id)
+            else:
+                org_id = ""
+
+        # E. Save Result
+        result = self._build_result(siret, name, best_domain, source, org_id, contacts, best_score)
+        await run_blocking(self.save_to_cache, result)
+        return result
+
+
+async def get_syndic_infos_async(sirets, max_concurrency=DEFAULT_CONCURRENCY, wait_for_quota=True, pappers_concurrency=PAPPERS_CONCURRENCY):
+    """
+    Looks up many SIRETs with at most `max_concurrency` in flight (cache reads) and
+    `pappers_concurrency` waiting for or inside a Pappers call. Returns results in input order.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    pappers_slots = asyncio.Semaphore(pappers_concurrency)
+    cache = get_pappers_cache()
+
+    async with create_http_session(max_concurrency) as session:
+        async def one(siret):
+            async with semaphore:
+                try:
+                    return await get_syndic_info_async(siret, session, cache=cache, wait_for_quota=wait_for_quota, pappers_slots=pappers_slots)
+                except Exception as e:
+                    logger.error(f"Pappers lookup failed for {siret}: {e}")
+                    return None
+
+        return await asyncio.gather(*(one(s) for s in sirets))
+
+
+async def enrich_syndics_async(items, max_concurrency=DEFAULT_CONCURRENCY, wait_for_quota=True):
+    """
+    Enriches many syndics with at most `max_concurrency` in flight.
+
+    Args:
+        items (list): dicts with keys siret, name, city and optionally pappers_data.
+    Returns:
+        list: enrich_syndic results (None on failure), in input order. Syndics refused by
+        the Apollo limiter are None and not cached, so a later run enriches them.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async with create_http_session(max_concurrency) as session:
+        manager = AsyncEnrichmentManager(session, wait_for_quota=wait_for_quota)
+
+        async def one(item):
+            async with semaphore:
+                try:
+                    return await manager.enrich_syndic_async(
+                        item["siret"], item["name"], item.get("city", ""), pappers_data=item.get("pappers_data")
+                    )
+                except RateLimitExceeded as e:
+                    logger.warning(f"Enrichment postponed for {item['siret']}: {e}")
+                    return None
+                except Exception as e:
+                    logger.error(f"Enrichment failed for {item['siret']}: {e}")
+                    return None
+
+        return await asyncio.gather(*(one(item) for item in items))
+
+
+def get_syndic_infos(sirets, max_concurrency=DEFAULT_CONCURRENCY, wait_for_quota=True):
+    """Synchronous wrapper around `get_syndic_infos_async` (runs its own event loop)."""
+    return asyncio.run(get_syndic_infos_async(sirets, max_concurrency, wait_for_quota))
+
+
+def enrich_syndics(items, max_concurrency=DEFAULT_CONCURRENCY, wait_for_quota=True):
+    """Synchronous wrapper around `enrich_syndics_async` (runs its own event loop)."""
+    return asyncio.run(enrich_syndics_async(items, max_concurrency, wait_for_quota))
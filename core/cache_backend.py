@@ -0,0 +1,262 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from core.data_manager import get_bigquery_client
+from core.tracing import logger
+
+# Configuration
+# bigquery: BigQuery tables only | local: embedded SQLite only | write_through: BigQuery stays
+# the durable source, reads are served from SQLite and misses filled from BigQuery
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "bigquery")
+CACHE_BACKENDS = ("bigquery", "local", "write_through")
+LOCAL_CACHE_DB = os.environ.get("CEE_LOCAL_CACHE_DB", os.path.join(".cee_cache", "cache.sqlite"))
+SQLITE_MAX_PARAMS = 500  # Keys per IN (...) lookup
+# Age after which a write_through local copy is re-read from BigQuery, so rows refreshed
+# by another instance are picked up
+WRITE_THROUGH_TTL_SECONDS = float(os.environ.get("CEE_WRITE_THROUGH_TTL", 600))
+
+
+def _json_default(value):
+    """BigQuery/pandas values (timestamps, numpy scalars and arrays) as JSON."""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+class BigQueryCache:
+    """
+    Cache rows in a BigQuery table (append-only: the latest row per key wins).
+    `exclude`: columns written but not read back (e.g. archived raw payloads).
+    """
+
+    uses_bigquery = True
+
+    def __init__(self, table, key="siret", order_by=None, exclude=()):
+        self.table = table
+        self.key = key
+        self.order_by = order_by
+        self.exclude = tuple(exclude)
+
+    def _columns(self):
+        return f"* EXCEPT({', '.join(self.exclude)})" if self.exclude else "*"
+
+    def _latest(self):
+        if not self.order_by:
+            return ""
+        return f"QUALIFY ROW_NUMBER() OVER (PARTITION BY {self.key} ORDER BY {self.order_by} DESC) = 1"
+
+    def get(self, key):
+        key = str(key).replace("'", "")
+        query = f"SELECT {self._columns()} FROM `{self.table}` WHERE {self.key} = '{key}' {self._latest()} LIMIT 1"
+        df = get_bigquery_client().query(query).to_dataframe()
+        return df.iloc[0].to_dict() if not df.empty else None
+
+    def get_many(self, keys):
+        """Returns: dict -> {key: row} for the keys found."""
+        keys = sorted({str(k).replace("'", "") for k in keys if k})
+        if not keys:
+            return {}
+        keys_str = "', '".join(keys)
+        query = f"SELECT {self._columns()} FROM `{self.table}` WHERE {self.key} IN ('{keys_str}') {self._latest()}"
+        df = get_bigquery_client().query(query).to_dataframe()
+        return {row[self.key]: row for row in df.to_dict('records')}
+
+    def scan(self, batch_size=SQLITE_MAX_PARAMS):
+        """Yields lists of the latest row per key, `batch_size` at a time (one query)."""
+        df = get_bigquery_client().query(f"SELECT {self._columns()} FROM `{self.table}` WHERE TRUE {self._latest()}").to_dataframe()
+        rows = df.to_dict('records')
+        for start in range(0, len(rows), batch_size):
+            yield rows[start:start + batch_size]
+
+    def put(self, row):
+        self.put_many([row])
+
+    def put_many(self, rows):
+        if rows:
+            get_bigquery_client().insert_rows_json(self.table, rows)
+
+
+class LocalCache:
+    """
+    Cache rows in an embedded SQLite file (one upserted JSON row per key), shared by
+    every process on the host like the rate limiter and the job queue. Point lookups
+    cost a primary-key read instead of a BigQuery job. With `max_age` (seconds), rows
+    written longer ago are not returned by get/get_many (copies of another store).
+    """
+
+    uses_bigquery = False
+
+    def __init__(self, name, key="siret", path=None, exclude=(), max_age=None):
+        self.name = name
+        self.key = key
+        self.path = path or LOCAL_CACHE_DB
+        self.exclude = tuple(exclude)
+        self.max_age = max_age
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_rows (
+                    cache TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    row_json TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (cache, key)
+                )
+            """)
+            self._local.conn = conn
+        return conn
+
+    def _cutoff(self):
+        return time.time() - self.max_age if self.max_age is not None else 0.0
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT row_json FROM cache_rows WHERE cache = ? AND key = ? AND updated_at >= ?",
+            (self.name, str(key), self._cutoff()),
+        ).fetchone()
+        return self._decode(row[0]) if row else None
+
+    def _decode(self, row_json):
+        row = json.loads(row_json)
+        for col in self.exclude:
+            row.pop(col, None)
+        return row
+
+    def get_many(self, keys):
+        keys = sorted({str(k) for k in keys if k})
+        found = {}
+        cutoff = self._cutoff()
+        for start in range(0, len(keys), SQLITE_MAX_PARAMS):
+            chunk = keys[start:start + SQLITE_MAX_PARAMS]
+            placeholders = ", ".join("?" for _ in chunk)
+            rows = self._conn().execute(
+                f"SELECT key, row_json FROM cache_rows WHERE cache = ? AND updated_at >= ? AND key IN ({placeholders})",
+                [self.name, cutoff] + chunk,
+            ).fetchall()
+            found.update({k: self._decode(v) for k, v in rows})
+        return found
+
+    def put(self, row):
+        self.put_many([row])
+
+    def put_many(self, rows):
+        now = time.time()
+        self._conn().executemany(
+            "INSERT INTO cache_rows (cache, key, row_json, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (cache, key) DO UPDATE SET row_json = excluded.row_json, updated_at = excluded.updated_at",
+            [(self.name, str(r[self.key]), json.dumps(r, default=_json_default), now) for r in rows if r.get(self.key)],
+        )
+
+    def scan(self, batch_size=SQLITE_MAX_PARAMS):
+        """Yields lists of complete stored rows (excluded columns included), `batch_size` at a time."""
+        cursor = self._conn().execute("SELECT row_json FROM cache_rows WHERE cache = ? ORDER BY key", (self.name,))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield [json.loads(r[0]) for r in rows]
+
+    def clear(self):
+        self._conn().execute("DELETE FROM cache_rows WHERE cache = ?", (self.name,))
+
+
+class WriteThroughCache:
+    """
+    BigQuery stays the durable source: writes go to BigQuery then to the local store;
+    reads are served locally and misses are filled from BigQuery. Local copies expire
+    after the local store's `max_age` (WRITE_THROUGH_TTL_SECONDS), so a row refreshed by
+    another instance is served within that delay.
+    """
+
+    uses_bigquery = True
+
+    def __init__(self, local, durable):
+        self.local = local
+        self.durable = durable
+
+    def get(self, key):
+        try:
+            row = self.local.get(key)
+            if row is not None:
+                return row
+        except sqlite3.Error as e:
+            logger.warning(f"Local cache read failed ({self.local.name}): {e}")
+        row = self.durable.get(key)
+        if row is not None:
+            self._fill([row])
+        return row
+
+    def get_many(self, keys):
+        keys = {str(k) for k in keys if k}
+        try:
+            found = self.local.get_many(keys)
+        except sqlite3.Error as e:
+            logger.warning(f"Local cache read failed ({self.local.name}): {e}")
+            found = {}
+        missing = keys - set(found)
+        if missing:
+            fetched = self.durable.get_many(missing)
+            self._fill(list(fetched.values()))
+            found.update(fetched)
+        return found
+
+    def scan(self, batch_size=SQLITE_MAX_PARAMS):
+        """Scans the durable store (the local copy only holds the rows read so far)."""
+        return self.durable.scan(batch_size)
+
+    def put(self, row):
+        self.put_many([row])
+
+    def put_many(self, rows):
+        self.durable.put_many(rows)
+        self._fill(rows)
+
+    def _fill(self, rows):
+        try:
+            self.local.put_many(rows)
+        except sqlite3.Error as e:
+            logger.warning(f"Local cache write failed ({self.local.name}): {e}")
+
+    def clear(self):
+        """Drops the local copy only (BigQuery keeps every row)."""
+        self.local.clear()
+
+
+def make_cache(name, table, key="siret", order_by=None, backend=None, exclude=()):
+    """
+    Builds the cache `name` (BigQuery `table` as durable store) for the configured backend.
+    `exclude`: columns stored with each row but left out of get/get_many results.
+    """
+    backend = backend or CACHE_BACKEND
+    if backend not in CACHE_BACKENDS:
+        raise ValueError(f"Unknown CACHE_BACKEND '{backend}' (expected one of {CACHE_BACKENDS})")
+    if backend == "local":
+        return LocalCache(name, key, exclude=exclude)
+    durable = BigQueryCache(table, key, order_by, exclude)
+    if backend == "write_through":
+        return WriteThroughCache(LocalCache(name, key, exclude=exclude, max_age=WRITE_THROUGH_TTL_SECONDS), durable)
+    return durable
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name, table, key="siret", order_by=None, exclude=()):
+    """Process-wide cache instance per name."""
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = make_cache(name, table, key, order_by, exclude=exclude)
+        return _caches[name]
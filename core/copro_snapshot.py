@@ -0,0 +1,90 @@
+import os
+import time
+import tempfile
+from core.lazy import lazy_import
+from core.data_manager import climate_zone_series, COPRO_FILTER_COLUMNS
+from core.scoring import copro_scores
+from core.tracing import span
+
+pd = lazy_import("pandas")
+
+# Configuration
+SNAPSHOT_PATH = os.environ.get("CEE_SNAPSHOT_PATH", os.path.join(".cee_cache", "copro_snapshot.parquet"))
+SNAPSHOT_MAX_AGE_HOURS = 24
+SNAPSHOT_KEY = "numero_d_immatriculation"  # Copro identifier, key of the delta sync
+SNAPSHOT_COLUMNS = [SNAPSHOT_KEY] + COPRO_FILTER_COLUMNS
+FINGERPRINT_COLUMN = "row_fingerprint"    # Fingerprint of the filter columns (core/delta_sync.py)
+
+
+def prepare_snapshot(df):
+    """
+    Converts the string columns used for computation to numeric dtypes once and
+    precomputes the per-copro CEE score (`cee_score`) rolled up by aggregate_syndics.
+    """
+    df = df.copy()
+    df['lat'] = pd.to_numeric(df['lat'], errors='coerce')
+    df['long'] = pd.to_numeric(df['long'], errors='coerce')
+    df['nombre_de_lots_a_usage_d_habitation'] = pd.to_numeric(df['nombre_de_lots_a_usage_d_habitation'], errors='coerce')
+    df['nombre_total_de_lots'] = pd.to_numeric(df['nombre_total_de_lots'], errors='coerce')
+    df['cee_score'] = copro_scores(df, climate_zone_series(df['code_officiel_departement']))
+    return df.reset_index(drop=True)
+
+
+def snapshot_age_hours():
+    """Age of the local snapshot file, None if it does not exist."""
+    if not os.path.exists(SNAPSHOT_PATH):
+        return None
+    return (time.time() - os.path.getmtime(SNAPSHOT_PATH)) / 3600
+
+
+def atomic_write(path, write):
+    """
+    Calls `write(tmp_path)` on a temp file next to `path`, then moves it onto `path` in
+    one os.replace, so readers in other processes (the app during a CLI/cron sync) see
+    the old file or the new one, never a partial write.
+    """
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder or ".", prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def save_snapshot(df):
+    atomic_write(SNAPSHOT_PATH, lambda tmp_path: df.to_parquet(tmp_path, index=False))
+
+
+def load_snapshot(refresh=False):
+    """
+    Returns the local copro snapshot (filter columns only), synced with BigQuery when
+    missing, older than SNAPSHOT_MAX_AGE_HOURS or when `refresh` is set. The sync only
+    pulls the rows inserted or changed since the previous one (core/delta_sync.py).
+    """
+    age = snapshot_age_hours()
+    if not refresh and age is not None and age < SNAPSHOT_MAX_AGE_HOURS:
+        with span("snapshot_load", source="local"):
+            return pd.read_parquet(SNAPSHOT_PATH)
+
+    # Imported here: delta_sync builds on this module
+    from core.delta_sync import sync_snapshot
+
+    with span("snapshot_load", source="bigquery") as s:
+        # Called while get_copro_index builds: the index keeps being built from the
+        # synced snapshot, cached searches and refinement bases are expired
+        report = sync_snapshot(index="keep")
+        s.set(mode=report["mode"], rows=report.get("remote_rows", 0))
+        if not report.get("remote_rows"):
+            s.set(outcome="empty")
+            # Keep serving a stale snapshot rather than nothing
+            return pd.read_parquet(SNAPSHOT_PATH) if os.path.exists(SNAPSHOT_PATH) else pd.DataFrame(columns=SNAPSHOT_COLUMNS)
+        if report["mode"] == "unchanged":
+            # Same data: mark the snapshot as fresh again
+            os.utime(SNAPSHOT_PATH)
+        return pd.read_parquet(SNAPSHOT_PATH)
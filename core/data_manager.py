@@ -1,7 +1,11 @@
-import pandas as pd
-from google.cloud import bigquery
 import streamlit as st
 import os
+from core.lazy import lazy_import
+from core.scoring import copro_scores, score_sql, top_k, TOP_K_SYNDICS
+
+# Heavy dependencies are imported on first use (see core/lazy.py)
+pd = lazy_import("pandas")
+bigquery = lazy_import("google.cloud.bigquery")
 
 # Configuration
 PROJECT_ID = "gen-lang-client-0045947309"
@@ -12,6 +16,46 @@ H1_DEPARTMENTS = [
     "01", "02", "03", "05", "08", "10", "14", "15", "19", "21", "23", "25", "26", "27", "28", "38", "39", "42", "43", "45", "51", "52", "54", "55", "57", "58", "59", "60", "61", "62", "63", "67", "68", "69", "70", "71", "73", "74", "75", "76", "77", "78", "80", "87", "88", "89", "90", "91", "92", "93", "94", "95"
 ]
 
+H3_DEPARTMENTS = ["11", "13", "30", "34", "66", "83", "2A", "2B", "06"]
+
+# Construction periods: UI labels -> DB values
+PERIOD_MAPPING = {
+    'Avant 1949': ['AVANT_1949'],
+    '1949-1974': ['DE_1949_A_1960', 'DE_1961_A_1974'],
+    '1975-1993': ['DE_1975_A_1993'],
+    '1994-2000': ['DE_1994_A_2000'],
+    '2001-2010': ['DE_2001_A_2010'],
+    'Après 2011': ['A_COMPTER_DE_2011']
+}
+
+# Majors and placeholder names removed by "Exclure majors"
+BIG_SYNDIC_EXCLUSIONS = [
+    "FONCIA", "LAMY", "NEXITY", "CITYA", 
+    "IDENTITE NON PARTAGEE EN OPEN DATA", "IDENTITÉ NON PARTAGÉE EN OPEN DATA", "NON CONNU", 
+    "SYNDIC BENEVOLE", "EN COURS", "AUCUN"
+]
+
+# Columns needed to filter and aggregate copros locally (snapshot, caches)
+COPRO_FILTER_COLUMNS = [
+    "raison_sociale_du_representant_legal", "siret_du_representant_legal",
+    "nombre_de_lots_a_usage_d_habitation", "nombre_total_de_lots",
+    "periode_de_construction", "code_officiel_departement",
+    "code_qp_2024", "nom_qp_2024", "commune", "lat", "long"
+]
+
+# Compact schema of the step-3 detail frames (see compact_copro_frame)
+DETAIL_CATEGORY_COLUMNS = [
+    "code_officiel_departement", "commune", "periode_de_construction",
+    "code_qp_2024", "nom_qp_2024", "climate_zone", "in_qpv"
+]
+DETAIL_INTEGER_COLUMNS = ["nombre_de_lots_a_usage_d_habitation", "nombre_total_de_lots"]
+DETAIL_COORD_COLUMNS = ["lat", "long"]
+DETAIL_FLOAT_COLUMNS = DETAIL_COORD_COLUMNS + ["cee_score"]
+# Identical on every row of a syndic's frame (already in the selected row of step 2)
+DETAIL_DROP_COLUMNS = ["raison_sociale_du_representant_legal", "siret_du_representant_legal"]
+# Deep memory per detail row after compaction; checked by benchmarks/frame_footprint.py
+DETAIL_ROW_BUDGET_BYTES = 96  # ~76 B measured, so a regression fails the check
+
 def get_climate_zone(code_dept):
     """
     Categorizes a French department into a specific climatic zone (H1, H2, H3).
@@ -19,20 +63,56 @@ def get_climate_zone(code_dept):
     """
     if code_dept in H1_DEPARTMENTS:
         return "H1"
-    if code_dept in ["11", "13", "30", "34", "66", "83", "2A", "2B", "06"]:
+    if code_dept in H3_DEPARTMENTS:
         return "H3"
     return "H2"
 
-def get_bigquery_client():
+def get_secret(name, default=None):
+    """st.secrets value, else environment variable (CLIs, workers and benchmarks run without secrets.toml)."""
+    try:
+        if name in st.secrets:
+            return st.secrets[name]
+    except FileNotFoundError:
+        pass
+    return os.environ.get(name, default)
+
+@st.cache_resource(show_spinner=False)
+def _create_bigquery_client():
     """
     Initializes the BigQuery client using Streamlit secrets for authentication.
     Falls back to environment credentials if secrets are missing.
+    Cached as a resource: one client (and connection pool) shared by every session.
     """
-    if "GOOGLE_SERVICE_ACCOUNT_JSON" in st.secrets:
-        info = dict(st.secrets["GOOGLE_SERVICE_ACCOUNT_JSON"])
-        return bigquery.Client.from_service_account_info(info)
+    info = get_secret("GOOGLE_SERVICE_ACCOUNT_JSON")
+    if info:
+        return bigquery.Client.from_service_account_info(dict(info))
     return bigquery.Client(project=PROJECT_ID)
 
+_client_override = None
+
+def use_bigquery_client(client):
+    """Routes every query to `client` (e.g. the DuckDB stand-in of benchmarks/fakes.py); None restores BigQuery."""
+    global _client_override
+    _client_override = client
+
+def get_bigquery_client():
+    """The shared BigQuery client (or the client set with `use_bigquery_client`)."""
+    if _client_override is not None:
+        return _client_override
+    return _create_bigquery_client()
+
+def zone_case_sql(column="code_officiel_departement"):
+    """SQL CASE expression mapping a department code column to its climate zone (H1/H2/H3)."""
+    h1_str = "', '".join(H1_DEPARTMENTS)
+    h3_str = "', '".join(H3_DEPARTMENTS)
+    return f"""
+        CASE 
+            WHEN {column} IN ('{h1_str}') THEN 'H1'
+            WHEN {column} IN ('{h3_str}') THEN 'H3'
+            ELSE 'H2'
+        END
+    """
+
 def build_filter_clause(climate_zones, min_lots, max_lots, periods=None, exclude_big_syndics=False, qpv_only=False):
     """
     Constructs a SQL WHERE clause based on UI filters.
@@ -47,18 +127,9 @@ def build_filter_clause(climate_zones, min_lots, max_lots, periods=None, exclude
     # 2. Construction Periods
     if periods:
         # Mapping UI labels to DB values
-        period_mapping = {
-            'Avant 1949': ['AVANT_1949'],
-            '1949-1974': ['DE_1949_A_1960', 'DE_1961_A_1974'],
-            '1975-1993': ['DE_1975_A_1993'],
-            '1994-2000': ['DE_1994_A_2000'],
-            '2001-2010': ['DE_2001_A_2010'],
-            'Après 2011': ['A_COMPTER_DE_2011']
-        }
-        
         db_periods = []
         for p in periods:
-            db_periods.extend(period_mapping.get(p, []))
+            db_periods.extend(PERIOD_MAPPING.get(p, []))
             
         if db_periods:
             periods_str = "', '".join(db_periods)
@@ -66,12 +137,7 @@ def build_filter_clause(climate_zones, min_lots, max_lots, periods=None, exclude
 
     # 3. Exclusions (Big Syndics & Invalid Data)
     if exclude_big_syndics:
-        exclusions = [
-            "FONCIA", "LAMY", "NEXITY", "CITYA", 
-            "IDENTITE NON PARTAGEE EN OPEN DATA", "IDENTITÉ NON PARTAGÉE EN OPEN DATA", "NON CONNU", 
-            "SYNDIC BENEVOLE", "EN COURS", "AUCUN"
-        ]
-        regex_pattern = "|".join(exclusions)
+        regex_pattern = "|".join(BIG_SYNDIC_EXCLUSIONS)
         conditions.append(f"NOT REGEXP_CONTAINS(UPPER(raison_sociale_du_representant_legal), r'{regex_pattern}')")
 
     # 4. QPV Filter
@@ -79,17 +145,7 @@ def build_filter_clause(climate_zones, min_lots, max_lots, periods=None, exclude
         conditions.append("(code_qp_2024 != '' OR nom_qp_2024 != '')")
 
     # 5. Climate Zones 
-    h1_str = "', '".join(H1_DEPARTMENTS)
-    h3_str = "', '".join(["11", "13", "30", "34", "66", "83", "2A", "2B", "06"])
-    
-    # Dynamic SQL Zone Logic
-    zone_case = f"""
-        CASE 
-            WHEN code_officiel_departement IN ('{h1_str}') THEN 'H1'
-            WHEN code_officiel_departement IN ('{h3_str}') THEN 'H3'
-            ELSE 'H2'
-        END
-    """
+    zone_case = zone_case_sql()
     
     if climate_zones:
         selected_zones_str = "', '".join(climate_zones)
@@ -97,10 +153,119 @@ def build_filter_clause(climate_zones, min_lots, max_lots, periods=None, exclude
         
     return " AND ".join(conditions) if conditions else "1=1", zone_case
 
-def fetch_aggregated_syndics(climate_zones, min_lots, max_lots, periods=None, exclude_big_syndics=False, qpv_only=False):
+def filter_mask(df, climate_zones, min_lots, max_lots, periods=None, exclude_big_syndics=False, qpv_only=False):
+    """
+    Vectorized pandas equivalent of `build_filter_clause` for copro rows held locally.
+    NULL handling follows the SQL semantics (a NULL comparison never matches).
+    Returns: pd.Series[bool] aligned on df.index
+    """
+    lots = pd.to_numeric(df['nombre_de_lots_a_usage_d_habitation'], errors='coerce')
+    mask = lots.between(min_lots, max_lots)
+
+    if periods:
+        db_periods = []
+        for p in periods:
+            db_periods.extend(PERIOD_MAPPING.get(p, []))
+        if db_periods:
+            mask &= df['periode_de_construction'].isin(db_periods)
+
+    if exclude_big_syndics:
+        names = df['raison_sociale_du_representant_legal'].astype('object').str.upper()
+        mask &= ~names.str.contains("|".join(BIG_SYNDIC_EXCLUSIONS), regex=True, na=True)
+
+    if qpv_only:
+        code_qp, nom_qp = df['code_qp_2024'].astype('object'), df['nom_qp_2024'].astype('object')
+        mask &= (code_qp.notna() & (code_qp != '')) | (nom_qp.notna() & (nom_qp != ''))
+
+    if climate_zones:
+        mask &= climate_zone_series(df['code_officiel_departement']).isin(climate_zones)
+
+    return mask.fillna(False).astype(bool)
+
+def climate_zone_series(code_dept):
+    """Vectorized `get_climate_zone`."""
+    code_dept = code_dept.astype('object')
+    zone = pd.Series("H2", index=code_dept.index, dtype="object")
+    zone[code_dept.isin(H3_DEPARTMENTS)] = "H3"
+    zone[code_dept.isin(H1_DEPARTMENTS)] = "H1"
+    return zone
+
+def compact_copro_frame(df):
+    """
+    Shrinks a detail frame (all object dtypes as returned by BigQuery): categoricals for
+    low-cardinality text, downcast integers, float32 coordinates/scores, constant syndic columns
+    dropped and any other repetitive text column turned categorical.
+    """
+    df = df.drop(columns=[c for c in DETAIL_DROP_COLUMNS if c in df.columns]).reset_index(drop=True)
+    for col in DETAIL_FLOAT_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float32')
+    for col in DETAIL_INTEGER_COLUMNS:
+        if col in df.columns:
+            values = pd.to_numeric(df[col], errors='coerce')
+            # Integers downcast to int8/int16 when complete, float32 when NULLs remain
+            df[col] = pd.to_numeric(values, downcast='integer' if values.notna().all() else 'float')
+    for col in df.columns:
+        # object (pandas < 3) or str (pandas >= 3) text columns
+        if not pd.api.types.is_string_dtype(df[col].dtype) or isinstance(df[col].dtype, pd.CategoricalDtype):
+            continue
+        if col in DETAIL_CATEGORY_COLUMNS or df[col].nunique(dropna=True) <= len(df) // 2:
+            df[col] = df[col].astype('category')
+    return df
+
+def frame_bytes_per_row(df):
+    """Deep memory footprint per row (0 for an empty frame)."""
+    return int(df.memory_usage(deep=True).sum()) // len(df) if len(df) else 0
+
+def copro_score_series(df):
+    """CEE potential per copro row: the precomputed `cee_score` column when present."""
+    if 'cee_score' in df.columns:
+        return df['cee_score']
+    return copro_scores(df, climate_zone_series(df['code_officiel_departement']))
+
+def aggregate_syndics(df, limit=TOP_K_SYNDICS):
+    """
+    Local equivalent of the `fetch_aggregated_syndics` query on already filtered copro rows.
+    Returns: DataFrame -> Syndic, nb_copros, total_lots, Siret, score (top `limit` by score)
+    """
+    rows = df[df['raison_sociale_du_representant_legal'].notna()]
+    rows = rows.assign(
+        _total_lots=pd.to_numeric(rows['nombre_total_de_lots'], errors='coerce'),
+        _score=copro_score_series(rows).astype('float64'),
+    )
+    agg = rows.groupby('raison_sociale_du_representant_legal', observed=True, sort=False).agg(
+        nb_copros=('raison_sociale_du_representant_legal', 'size'),
+        total_lots=('_total_lots', 'sum'),
+        Siret=('siret_du_representant_legal', 'first'),
+        score=('_score', 'sum'),
+    )
+    agg = agg.reset_index().rename(columns={'raison_sociale_du_representant_legal': 'Syndic'})
+    agg['Syndic'] = agg['Syndic'].astype('object')
+    agg['Siret'] = agg['Siret'].astype('object')
+    agg['total_lots'] = agg['total_lots'].astype('int64')
+    agg['score'] = agg['score'].round(1)
+    return top_k(agg[['Syndic', 'nb_copros', 'total_lots', 'Siret', 'score']], limit)
+
+def fetch_copro_rows(columns=None, where_clause="1=1", limit=None):
+    """Pulls copro rows (only the requested columns) for local processing."""
+    client = get_bigquery_client()
+    cols = ", ".join(f"`{c}`" for c in (columns or COPRO_FILTER_COLUMNS))
+    query = f"SELECT {cols} FROM `{DATASET_TABLE}` WHERE {where_clause}"
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    try:
+        return client.query(query).to_dataframe()
+    except Exception as e:
+        st.error(f"Error fetching copro rows: {e}")
+        return pd.DataFrame()
+
+def fetch_aggregated_syndics(climate_zones, min_lots, max_lots, periods=None, exclude_big_syndics=False, qpv_only=False, raise_errors=False):
     """
     Step 2: Aggregated View.
-    Returns list of filtered syndics with their total stats.
+    Returns the TOP_K_SYNDICS filtered syndics with the highest CEE potential score
+    (ORDER BY + LIMIT runs as a top-K selection in BigQuery, not a full sort).
+    With `raise_errors` a failed query raises instead of returning an empty frame
+    (loaders of the shared ResultStore, which must not keep a failure as a result).
     """
     client = get_bigquery_client()
     where_clause, zone_case = build_filter_clause(climate_zones, min_lots, max_lots, periods, exclude_big_syndics, qpv_only)
@@ -110,27 +275,30 @@ def fetch_aggregated_syndics(climate_zones, min_lots, max_lots, periods=None, ex
             raison_sociale_du_representant_legal as Syndic,
             COUNT(*) as nb_copros,
             SUM(CAST(nombre_total_de_lots AS INT64)) as total_lots,
-            ANY_VALUE(siret_du_representant_legal) as Siret
+            ANY_VALUE(siret_du_representant_legal) as Siret,
+            ROUND(SUM({score_sql(zone_case)}), 1) as score
         FROM `{DATASET_TABLE}`
         WHERE 
             raison_sociale_du_representant_legal IS NOT NULL
             AND {where_clause}
         GROUP BY 1
-        ORDER BY 2 DESC
-        LIMIT 1000
+        ORDER BY score DESC, nb_copros DESC
+        LIMIT {TOP_K_SYNDICS}
     """
     
     try:
         df = client.query(query).to_dataframe()
         return df
     except Exception as e:
+        if raise_errors:
+            raise
         st.error(f"Error fetching aggregations: {e}")
         return pd.DataFrame()
 
-def fetch_data_by_syndic(syndic_name, climate_zones, min_lots, max_lots, periods=None, exclude_big_syndics=False, qpv_only=False):
+def fetch_data_by_syndic(syndic_name, climate_zones, min_lots, max_lots, periods=None, exclude_big_syndics=False, qpv_only=False, raise_errors=False):
     """
     Step 3: Detailed View.
-    Fetches rows for a specific syndic matching filters.
+    Fetches rows for a specific syndic matching filters (`raise_errors`: see fetch_aggregated_syndics).
     """
     client = get_bigquery_client()
     where_clause, zone_case = build_filter_clause(climate_zones, min_lots, max_lots, periods, exclude_big_syndics, qpv_only)
@@ -142,6 +310,7 @@ def fetch_data_by_syndic(syndic_name, climate_zones, min_lots, max_lots, periods
         SELECT 
             *,
             ({zone_case}) as climate_zone,
+            {score_sql(zone_case)} as cee_score,
             CASE 
                 WHEN (code_qp_2024 IS NOT NULL AND code_qp_2024 != '') 
                      OR (nom_qp_2024 IS NOT NULL AND nom_qp_2024 != '') 
@@ -151,7 +320,7 @@ def fetch_data_by_syndic(syndic_name, climate_zones, min_lots, max_lots, periods
         WHERE 
             raison_sociale_du_representant_legal = '{safe_syndic}'
             AND {where_clause}
-        ORDER BY CAST(nombre_de_lots_a_usage_d_habitation AS INT64) DESC
+        ORDER BY cee_score DESC, CAST(nombre_de_lots_a_usage_d_habitation AS INT64) DESC
     """
     
     try:
@@ -162,10 +331,12 @@ def fetch_data_by_syndic(syndic_name, climate_zones, min_lots, max_lots, periods
             df['lat'] = pd.to_numeric(df['lat'], errors='coerce')
             df['long'] = pd.to_numeric(df['long'], errors='coerce')
             df['nombre_de_lots_a_usage_d_habitation'] = pd.to_numeric(df['nombre_de_lots_a_usage_d_habitation'], errors='coerce').fillna(0)
-            df = df.dropna(subset=['lat', 'long'])
+            df = compact_copro_frame(df.dropna(subset=['lat', 'long']))
             
         return df
     except Exception as e:
+        if raise_errors:
+            raise
         st.error(f"Error fetching details for syndic: {e}")
         return pd.DataFrame()
 
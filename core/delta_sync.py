@@ -0,0 +1,260 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from core.lazy import lazy_import
+from core.data_manager import get_bigquery_client, DATASET_TABLE, COPRO_FILTER_COLUMNS
+from core.copro_snapshot import (
+    prepare_snapshot, save_snapshot, atomic_write, SNAPSHOT_PATH, SNAPSHOT_KEY, SNAPSHOT_COLUMNS, FINGERPRINT_COLUMN,
+)
+from core.tracing import span, logger
+
+pd = lazy_import("pandas")
+
+# Configuration
+SYNC_STATE_PATH = os.environ.get("CEE_SYNC_STATE_PATH", os.path.splitext(SNAPSHOT_PATH)[0] + "_sync.json")
+SYNC_FETCH_CHUNK = 5000  # Keys per IN (...) when pulling inserted/changed rows
+# Result store kinds derived from rnic.copro, reloaded after a sync that changed rows
+DERIVED_RESULT_KINDS = ("aggregated_syndics", "syndics_near", "syndic_details", "copro_rows")
+
+_seen_sync = None  # synced_at of the last watermark whose changes this process applied
+_seen_lock = threading.Lock()
+
+
+def fingerprint_sql(columns=COPRO_FILTER_COLUMNS):
+    """BigQuery INT64 fingerprint of the columns data_manager reads (NULL and '' hash alike)."""
+    parts = ", '|', ".join(f"IFNULL(CAST(`{c}` AS STRING), '')" for c in columns)
+    return f"FARM_FINGERPRINT(CONCAT({parts}))"
+
+
+def read_watermark():
+    """Returns: dict -> rows, checksum, synced_at of the last sync (None if never synced)."""
+    if not os.path.exists(SYNC_STATE_PATH):
+        return None
+    with open(SYNC_STATE_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_watermark(watermark):
+    """Replaces the watermark file atomically (written after the snapshot it describes)."""
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(watermark, f)
+    atomic_write(SYNC_STATE_PATH, write)
+
+
+def table_checksum(client):
+    """Row count and XOR of every row fingerprint: one aggregate query, no rows transferred."""
+    query = f"""
+        SELECT COUNT(*) AS n, BIT_XOR(fp) AS checksum
+        FROM (SELECT {fingerprint_sql()} AS fp FROM `{DATASET_TABLE}` WHERE {SNAPSHOT_KEY} IS NOT NULL)
+    """
+    row = client.query(query).to_dataframe().iloc[0]
+    return {"rows": int(row["n"]), "checksum": str(row["checksum"])}
+
+
+def fetch_fingerprints(client):
+    """Returns: DataFrame -> key, fingerprint of every copro (two narrow columns)."""
+    query = f"""
+        SELECT {SNAPSHOT_KEY}, {fingerprint_sql()} AS {FINGERPRINT_COLUMN}
+        FROM `{DATASET_TABLE}`
+        WHERE {SNAPSHOT_KEY} IS NOT NULL
+    """
+    return client.query(query).to_dataframe()
+
+
+def fetch_rows(client, keys=None):
+    """Snapshot columns + fingerprint of the copros in `keys` (every copro when None)."""
+    cols = ", ".join(f"`{c}`" for c in SNAPSHOT_COLUMNS)
+    base = f"SELECT {cols}, {fingerprint_sql()} AS {FINGERPRINT_COLUMN} FROM `{DATASET_TABLE}` WHERE {SNAPSHOT_KEY} IS NOT NULL"
+    if keys is None:
+        return client.query(base).to_dataframe()
+    keys = sorted(keys)
+    frames = []
+    for start in range(0, len(keys), SYNC_FETCH_CHUNK):
+        keys_str = "', '".join(str(k).replace("'", "") for k in keys[start:start + SYNC_FETCH_CHUNK])
+        frames.append(client.query(f"{base} AND {SNAPSHOT_KEY} IN ('{keys_str}')").to_dataframe())
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=SNAPSHOT_COLUMNS + [FINGERPRINT_COLUMN])
+
+
+def diff_fingerprints(local, remote):
+    """
+    Compares (key, fingerprint) frames.
+    Returns: (inserted keys, changed keys, deleted keys) as sets
+    """
+    merged = local[[SNAPSHOT_KEY, FINGERPRINT_COLUMN]].merge(
+        remote[[SNAPSHOT_KEY, FINGERPRINT_COLUMN]], on=SNAPSHOT_KEY, how="outer",
+        suffixes=("_local", "_remote"), indicator=True,
+    )
+    inserted = set(merged.loc[merged["_merge"] == "right_only", SNAPSHOT_KEY])
+    deleted = set(merged.loc[merged["_merge"] == "left_only", SNAPSHOT_KEY])
+    both = merged[merged["_merge"] == "both"]
+    local_fp = both[f"{FINGERPRINT_COLUMN}_local"].astype("string")
+    remote_fp = both[f"{FINGERPRINT_COLUMN}_remote"].astype("string")
+    changed = set(both.loc[(local_fp != remote_fp).to_numpy(), SNAPSHOT_KEY])
+    return inserted, changed, deleted
+
+
+def apply_delta(snapshot, rows, removed_keys):
+    """Snapshot without `removed_keys` (deleted + changed) plus the prepared new versions in `rows`."""
+    kept = snapshot[~snapshot[SNAPSHOT_KEY].isin(removed_keys)]
+    if rows.empty:
+        return kept.reset_index(drop=True)
+    return pd.concat([kept, prepare_snapshot(rows)], ignore_index=True)
+
+
+def refresh_derived_stores(index="rebuild"):
+    """
+    Points the stores built on rnic.copro at the new data: cached search results and
+    refinement bases reload on next use; the spatial index is rebuilt from the updated
+    snapshot now (`index`='rebuild'), dropped to be rebuilt on next use ('drop') or left
+    alone ('keep': it is being built from the new snapshot, e.g. by load_snapshot).
+    Returns: (index rebuild time in ms, number of expired results)
+    """
+    from core.spatial_index import get_copro_index
+    from core.result_store import get_result_store
+    from core.refinement import clear_bases
+
+    t0 = time.perf_counter()
+    if index != "keep":
+        get_copro_index.clear()
+    if index == "rebuild":
+        get_copro_index()
+    rebuild_ms = round((time.perf_counter() - t0) * 1000, 1)
+    expired = get_result_store().expire(DERIVED_RESULT_KINDS)
+    clear_bases()
+    return rebuild_ms, expired
+
+
+def refresh_if_synced():
+    """
+    Applies syncs run elsewhere (CLI, cron, load_snapshot) to the stores of this process:
+    when the watermark file holds a sync this process has not seen, the spatial index is
+    dropped and cached searches / refinement bases expired. Cheap enough for every app run
+    (one small file read).
+    Returns: True when a refresh ran
+    """
+    global _seen_sync
+    try:
+        watermark = read_watermark()
+    except (OSError, ValueError) as e:
+        logger.warning(f"Sync watermark unreadable: {e}")
+        return False
+    synced_at = (watermark or {}).get("synced_at")
+    with _seen_lock:
+        if synced_at is None or synced_at == _seen_sync:
+            return False
+        _seen_sync = synced_at
+    refresh_derived_stores(index="drop")
+    return True
+
+
+def sync_snapshot(full=False, dry_run=False, refresh_derived=True, index="rebuild"):
+    """
+    Brings the local copro snapshot up to date with rnic.copro.
+
+    1. Watermark check: row count + fingerprint checksum of the table (one aggregate
+       query) against the last sync; nothing else runs when they match.
+    2. Fingerprint diff: (key, fingerprint) of every copro vs the snapshot's
+       `row_fingerprint` column -> inserted, changed, deleted keys.
+    3. Only inserted/changed rows are pulled, prepared (numeric columns, cee_score)
+       and merged into the snapshot; derived stores of this process are then refreshed
+       (`refresh_derived`, `index`: see refresh_derived_stores). Other processes (the app) pick the new watermark up
+       through `refresh_if_synced`.
+
+    A full download runs when `full` is set or the snapshot has no fingerprints.
+    Returns: dict -> sync report (mode, row counts, timings in ms, watermark)
+    """
+    global _seen_sync
+    client = get_bigquery_client()
+    report = {"mode": "delta", "timings_ms": {}}
+    timings = report["timings_ms"]
+
+    def timed(name, fn):
+        t0 = time.perf_counter()
+        value = fn()
+        timings[name] = round((time.perf_counter() - t0) * 1000, 1)
+        return value
+
+    with span("delta_sync") as s:
+        snapshot = None
+        if not full and os.path.exists(SNAPSHOT_PATH):
+            snapshot = timed("snapshot_read", lambda: pd.read_parquet(SNAPSHOT_PATH))
+            if FINGERPRINT_COLUMN not in snapshot.columns or SNAPSHOT_KEY not in snapshot.columns:
+                snapshot = None
+
+        watermark = timed("checksum", lambda: table_checksum(client))
+        previous = read_watermark()
+        if not watermark["rows"]:
+            # Empty or unreadable table: keep the current snapshot
+            report.update(mode="empty", remote_rows=0, inserted=0, changed=0, deleted=0, fetched_rows=0)
+            s.set(mode="empty")
+            return report
+        if snapshot is not None and previous and {k: previous.get(k) for k in watermark} == watermark:
+            report.update(mode="unchanged", remote_rows=watermark["rows"], inserted=0, changed=0, deleted=0, fetched_rows=0)
+            s.set(mode="unchanged")
+            report["watermark"] = previous
+            return report
+
+        if snapshot is None:
+            report["mode"] = "full"
+            rows = timed("fetch_rows", lambda: fetch_rows(client))
+            report.update(remote_rows=len(rows), inserted=len(rows), changed=0, deleted=0, fetched_rows=len(rows))
+            if not dry_run:
+                snapshot = timed("apply", lambda: prepare_snapshot(rows))
+        else:
+            remote = timed("fetch_fingerprints", lambda: fetch_fingerprints(client))
+            inserted, changed, deleted = timed("diff", lambda: diff_fingerprints(snapshot, remote))
+            report.update(remote_rows=len(remote), inserted=len(inserted), changed=len(changed), deleted=len(deleted))
+            rows = timed("fetch_rows", lambda: fetch_rows(client, inserted | changed)) if inserted or changed else pd.DataFrame()
+            report["fetched_rows"] = len(rows)
+            if not dry_run:
+                snapshot = timed("apply", lambda: apply_delta(snapshot, rows, changed | deleted))
+
+        s.set(mode=report["mode"], inserted=report["inserted"], changed=report["changed"], deleted=report["deleted"])
+        if dry_run:
+            return report
+
+        timed("save", lambda: save_snapshot(snapshot))
+        watermark["synced_at"] = time.time()
+        write_watermark(watermark)
+        report["watermark"] = watermark
+        report["snapshot_rows"] = len(snapshot)
+        if refresh_derived and (report["inserted"] or report["changed"] or report["deleted"]):
+            try:
+                timings["index_rebuild"], report["results_expired"] = refresh_derived_stores(index)
+                with _seen_lock:
+                    _seen_sync = watermark["synced_at"]
+            except Exception as e:
+                logger.warning(f"Derived store refresh failed: {e}")
+        return report
+
+
+def format_sync_report(report):
+    lines = [
+        f"mode: {report['mode']}",
+        f"remote rows: {report.get('remote_rows', 0)}  snapshot rows: {report.get('snapshot_rows', '-')}",
+        f"inserted: {report.get('inserted', 0)}  changed: {report.get('changed', 0)}  deleted: {report.get('deleted', 0)}  fetched: {report.get('fetched_rows', 0)}",
+    ]
+    if "results_expired" in report:
+        lines.append(f"cached results expired: {report['results_expired']}")
+    lines += [f"  {name:<20} {value} ms" for name, value in report["timings_ms"].items()]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incremental sync of rnic.copro into the local snapshot and derived stores.")
+    parser.add_argument("--full", action="store_true", help="Download every row instead of the delta")
+    parser.add_argument("--dry-run", action="store_true", help="Compute the delta without writing anything")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = sync_snapshot(full=args.full, dry_run=args.dry_run)
+    print(json.dumps(report, indent=2, default=str) if args.json else format_sync_report(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
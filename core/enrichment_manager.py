@@ -1,40 +1,62 @@
-
 import os
-import requests
+import sys
+import argparse
 import json
 import re
 from urllib.parse import urlparse
 import streamlit as st
-from google.cloud import bigquery
 from datetime import datetime
-from duckduckgo_search import DDGS
-from rapidfuzz import fuzz
+from core.lazy import lazy_import
+from core.tracing import span, logger
+from core.rate_limiter import acquire, record_throttle, parse_retry_after, RateLimitExceeded
+from core.data_manager import get_bigquery_client, get_secret, zone_case_sql, DATASET_TABLE
+from core.cache_backend import get_cache
+
+requests = lazy_import("requests")
+pd = lazy_import("pandas")
+duckduckgo_search = lazy_import("duckduckgo_search")
+fuzz = lazy_import("rapidfuzz.fuzz")
 
 # Configuration
 PROJECT_ID = "gen-lang-client-0045947309"
 CACHE_TABLE = "gen-lang-client-0045947309.rnic.cache_enrichissement"
+# Upstream endpoints (overridable to point at a proxy or at the benchmark stubs)
+APOLLO_API_URL = os.environ.get("APOLLO_API_URL", "https://api.apollo.io").rstrip("/")
+APOLLO_ORG_SEARCH_URL = f"{APOLLO_API_URL}/v1/mixed_companies/search"
+APOLLO_PEOPLE_SEARCH_URL = f"{APOLLO_API_URL}/v1/mixed_people/api_search"
+# JSON endpoint returning DDGS-style results (title/href/body) used instead of DuckDuckGo when set
+SEARCH_API_URL = os.environ.get("SEARCH_API_URL")
+
+# Typed contact records stored in the `contacts` column (ARRAY<STRUCT>)
+CONTACT_FIELDS = ["first_name", "last_name", "title", "email", "linkedin_url", "photo_url"]
+CONTACTS_TYPE = f"ARRAY<STRUCT<{', '.join(f'{f} STRING' for f in CONTACT_FIELDS)}>>"
+CONTACT_QUERY_LIMIT = 5000  # Rows returned by find_contacts
+# Cache rows whose contacts are still only in the pre-ARRAY<STRUCT> JSON blob
+LEGACY_CONTACTS_SQL = "IFNULL(ARRAY_LENGTH(contacts), 0) = 0 AND contacts_json IS NOT NULL AND contacts_json NOT IN ('', '[]')"
+
+# Titles to target
+TARGET_TITLES = ["Gestionnaire", "Principal", "Directeur copropriété", "Syndic", "Gérant"]
+# Webmail domains that never identify the syndic itself
+GENERIC_EMAIL_DOMAINS = ['gmail.com', 'orange.fr', 'wanadoo.fr', 'yahoo.fr', 'outlook.com', 'hotmail.fr', 'hotmail.com']
 
 def get_apollo_api_key():
-    key = None
-    if "APOLLO_API_KEY" in st.secrets:
-        key = st.secrets["APOLLO_API_KEY"]
-        print(f"DEBUG: Found Apollo API Key in st.secrets (starts with {key[:4]}...)")
-    else:
-        key = os.environ.get("APOLLO_API_KEY", None)
-        if key:
-            print(f"DEBUG: Found Apollo API Key in environment (starts with {key[:4]}...)")
-        else:
-            print("DEBUG: Apollo API Key NOT FOUND")
+    key = get_secret("APOLLO_API_KEY")
+    if not key:
+        logger.warning("Apollo API Key NOT FOUND")
     return key
 
-def get_bigquery_client():
-    if "GOOGLE_SERVICE_ACCOUNT_JSON" in st.secrets:
-        info = dict(st.secrets["GOOGLE_SERVICE_ACCOUNT_JSON"])
-        return bigquery.Client.from_service_account_info(info)
-    return bigquery.Client(project=PROJECT_ID)
+def get_enrichment_cache():
+    """Enrichment cache backend (CACHE_BACKEND: BigQuery table, local store or write-through)."""
+    return get_cache("enrichment", CACHE_TABLE, order_by="last_enriched")
 
 def init_enrichment_cache():
-    """Creates the enrichment cache table if it doesn't exist."""
+    """
+    Creates the enrichment cache table if it doesn't exist. Tables from before the
+    typed `contacts` column get it added; their JSON contacts are migrated on every
+    call while unmigrated rows remain (a failed UPDATE is retried on the next start).
+    """
+    if not get_enrichment_cache().uses_bigquery:
+        return
     client = get_bigquery_client()
     query = f"""
         CREATE TABLE IF NOT EXISTS `{CACHE_TABLE}` (
@@ -43,6 +65,7 @@ def init_enrichment_cache():
             domain STRING,
             domain_source STRING,
             apollo_org_id STRING,
+            contacts {CONTACTS_TYPE},
             contacts_json STRING,
             last_enriched TIMESTAMP,
             confidence_score FLOAT64
@@ -50,13 +73,189 @@ def init_enrichment_cache():
     """
     try:
         client.query(query).result()
+        existing_cols = [schema.name for schema in client.get_table(CACHE_TABLE).schema]
+        if "contacts" not in existing_cols:
+            client.query(f"ALTER TABLE `{CACHE_TABLE}` ADD COLUMN contacts {CONTACTS_TYPE}").result()
+            print("Migration: Added column contacts")
+    except Exception as e:
+        logger.error(f"Error creating enrichment cache: {e}")
+        return
+    try:
+        if pending_contacts_migration(client):
+            migrate_contacts_json(client)
     except Exception as e:
-        print(f"Error creating enrichment cache: {e}")
+        # e.g. rows still in the streaming buffer: find_contacts reads the blobs meanwhile
+        logger.error(f"Contacts migration failed (retried on next start): {e}")
+
+def pending_contacts_migration(client=None):
+    """Number of cache rows whose contacts are still only in the legacy `contacts_json` blob."""
+    client = client or get_bigquery_client()
+    df = client.query(f"SELECT COUNT(*) AS n FROM `{CACHE_TABLE}` WHERE {LEGACY_CONTACTS_SQL}").to_dataframe()
+    return int(df.iloc[0]["n"])
+
+def migrate_contacts_json(client=None):
+    """
+    Set-based backfill of `contacts` from the legacy `contacts_json` blobs (one UPDATE);
+    the blob is cleared once converted, so running it again only touches rows left over.
+    """
+    client = client or get_bigquery_client()
+    fields = ",\n                    ".join(f"IFNULL(JSON_VALUE(c, '$.{f}'), '') AS {f}" for f in CONTACT_FIELDS)
+    query = f"""
+        UPDATE `{CACHE_TABLE}`
+        SET contacts = ARRAY(
+                SELECT AS STRUCT {fields}
+                FROM UNNEST(JSON_QUERY_ARRAY(contacts_json)) AS c
+            ),
+            contacts_json = NULL
+        WHERE {LEGACY_CONTACTS_SQL}
+    """
+    with span("contacts_migration"):
+        client.query(query).result()
+
+def contacts_of(row):
+    """
+    Contact list of a cache row or enrichment result: the typed `contacts` column,
+    or `contacts_json` for rows written before it (JSON string or list).
+    """
+    if not row:
+        return []
+    contacts = row.get('contacts')
+    if contacts is not None and len(contacts):
+        return [dict(c) for c in contacts]
+    legacy = row.get('contacts_json')
+    if isinstance(legacy, str):
+        try:
+            legacy = json.loads(legacy)
+        except ValueError:
+            legacy = []
+    return list(legacy) if isinstance(legacy, list) else []
+
+def contact_record(contact):
+    """A contact dict with exactly the CONTACT_FIELDS, as STRING values."""
+    return {f: str(contact.get(f) or "") for f in CONTACT_FIELDS}
 
 class EnrichmentManager:
-    def __init__(self):
-        self.bq_client = get_bigquery_client()
+    def __init__(self, wait_for_quota=True):
+        self._bq_client = None
         self.apollo_key = get_apollo_api_key()
+        # Wait for an Apollo rate-limit token (True) or fail fast (False)
+        self.wait_for_quota = wait_for_quota
+
+    @property
+    def cache(self):
+        return get_enrichment_cache()
+
+    @property
+    def bq_client(self):
+        """BigQuery client, created on first use rather than at construction."""
+        if self._bq_client is None:
+            self._bq_client = get_bigquery_client()
+        return self._bq_client
+
+    def _apollo_post(self, url, headers, data, s):
+        """
+        POSTs to Apollo through the shared rate limiter and records the status on span `s`.
+        Raises RateLimitExceeded (QuotaExceeded) when no token or credit is available or
+        Apollo answers 429: a refused call must not be mistaken for "no contacts".
+        """
+        waited = acquire("apollo", wait=self.wait_for_quota)
+        s.set(rate_limit_wait_ms=round(waited * 1000, 1))
+        response = requests.post(url, headers=headers, json=data, timeout=10)
+        s.set(upstream_status=response.status_code)
+        if response.status_code == 429:
+            retry_after = parse_retry_after(response)
+            record_throttle("apollo", retry_after)
+            raise RateLimitExceeded("apollo", float(retry_after or 1.0))
+        return response
+
+    def _apollo_headers(self, no_cache=False):
+        headers = {
+            "Content-Type": "application/json",
+            "X-Api-Key": self.apollo_key
+        }
+        if no_cache:
+            headers["Cache-Control"] = "no-cache"
+        return headers
+
+    @staticmethod
+    def _org_id_from_response(res):
+        """Picks the first organization id of an Apollo mixed_companies response."""
+        # Response contains 'accounts' or 'organizations'
+        items = res.get('organizations', []) or res.get('accounts', [])
+        if items:
+            # Prefer organization_id if available, fallback to id
+            item = items[0]
+            return item.get('organization_id') or item.get('id')
+        return None
+
+    @staticmethod
+    def _org_payload(domain=None, name=None):
+        if domain:
+            return {
+                "q_organization_domains_list": [domain], # Note: List parameter format
+                "page": 1,
+                "per_page": 1
+            }
+        return {
+            "q_organization_name": name,
+            "page": 1,
+            "per_page": 1
+        }
+
+    @staticmethod
+    def _people_payload(org_id=None, domain=None):
+        data = {
+            "person_titles": TARGET_TITLES,
+            "page": 1,
+            "per_page": 10
+        }
+        if domain:
+            data["q_organization_domains_list"] = [domain]
+        elif org_id:
+            data["organization_ids"] = [org_id]
+        return data
+
+    @staticmethod
+    def _contacts_from_response(res):
+        """Maps an Apollo people response to the contact format stored in cache."""
+        contacts = []
+        for p in res.get('people', []):
+            contacts.append({
+                "first_name": p.get("first_name") or "",
+                "last_name": p.get("last_name") or "",
+                "title": p.get("title") or "Unknown Title",
+                "email": p.get("email") or "",
+                "linkedin_url": p.get("linkedin_url") or "",
+                "photo_url": p.get("photo_url") or ""
+            })
+        return contacts
+
+    @staticmethod
+    def _pappers_candidates(pappers_data):
+        """Candidate domains from Pappers data (declared websites, then email domain)."""
+        candidates = []
+        
+        # 1. Inspect 'sites_internet'
+        sites = pappers_data.get('sites_internet', '')
+        if sites:
+            # Pappers can return "site1.com, site2.com". Split them.
+            for site in sites.split(','):
+                candidates.append(site.strip())
+
+        # 2. Inspect 'email'
+        email = pappers_data.get('email', '')
+        if email and '@' in email:
+            email_domain = email.split('@')[-1].strip()
+            # Ignore generic domains
+            if email_domain not in GENERIC_EMAIL_DOMAINS:
+                candidates.append(email_domain)
+        return candidates
+
+    @staticmethod
+    def _decode_cached(cached):
+        cached['contacts'] = contacts_of(cached)
+        cached.pop('contacts_json', None)
+        return cached
 
     def clean_domain(self, url):
         """Extracts root domain from URL (e.g., https://www.foncia.com/fr -> foncia.com)"""
@@ -72,48 +271,181 @@ class EnrichmentManager:
             return None
 
     def get_cached_data(self, siret):
-        try:
-            query = f"SELECT * FROM `{CACHE_TABLE}` WHERE siret = '{siret}' LIMIT 1"
-            df = self.bq_client.query(query).to_dataframe()
-            if not df.empty:
-                return df.iloc[0].to_dict()
-        except Exception as e:
-            print(f"Enrichment Cache Lookup Error: {e}")
+        with span("cache_lookup", siret=siret) as s:
+            try:
+                row = self.cache.get(siret)
+                if row is not None:
+                    s.set(outcome="hit")
+                    return row
+                s.set(outcome="miss")
+            except Exception as e:
+                s.set(outcome="error", error=str(e)[:200])
+                logger.error(f"Enrichment Cache Lookup Error: {e}")
         return None
 
+    def get_cached_data_many(self, sirets):
+        """
+        Batch cache lookup (latest row per SIRET, one query per backend).
+        Returns: dict -> {siret: cache row dict} with decoded `contacts`
+        """
+        keys = {str(s) for s in sirets if s}
+        if not keys:
+            return {}
+        with span("cache_lookup_batch", sirets=len(keys)) as s:
+            try:
+                rows = self.cache.get_many(keys)
+                s.set(hits=len(rows))
+                return {siret: self._decode_cached(row) for siret, row in rows.items()}
+            except Exception as e:
+                s.set(outcome="error", error=str(e)[:200])
+                logger.error(f"Enrichment Cache Batch Lookup Error: {e}")
+        return {}
+
     def save_to_cache(self, data):
         try:
+            # Contacts go to the typed column; the legacy JSON blob is no longer written
+            row = {k: v for k, v in data.items() if k not in ('contacts', 'contacts_json')}
+            row['contacts'] = [contact_record(ct) for ct in contacts_of(data)]
             # Ensure timestamp logic suitable for BQ
-            data['last_enriched'] = datetime.now().isoformat()
-            if isinstance(data.get('contacts_json'), list) or isinstance(data.get('contacts_json'), dict):
-                 data['contacts_json'] = json.dumps(data['contacts_json'])
-            
-            self.bq_client.insert_rows_json(CACHE_TABLE, [data])
+            row['last_enriched'] = data['last_enriched'] = datetime.now().isoformat()
+            self.cache.put(row)
         except Exception as e:
-            print(f"Enrichment Cache Save Error: {e}")
+            logger.error(f"Enrichment Cache Save Error: {e}")
+
+    def find_contacts(self, sirets=None, titles=None, require_email=False, climate_zones=None, limit=CONTACT_QUERY_LIMIT):
+        """
+        Contacts across syndics in one set-based query over the latest cache row per SIRET
+        (on the BigQuery table, the durable copy of every CACHE_BACKEND but 'local', where
+        the same filters run over a scan of the local rows).
+        Rows not migrated yet are read from their `contacts_json` blob.
+
+        Args:
+            sirets (list): Restrict to these syndics (e.g. the step-2 result list).
+            titles (list): Keep contacts whose title contains one of these words (case-insensitive).
+            require_email (bool): Only contacts with an email.
+            climate_zones (list): Only syndics managing at least one copro in these zones.
+        Returns:
+            DataFrame -> siret, syndic_name, domain, first_name, last_name, title, email, linkedin_url
+        """
+        columns = ["siret", "syndic_name", "domain"] + CONTACT_FIELDS[:-1]
+        conditions = []
+        if sirets is not None:
+            keys = sorted({str(s).replace("'", "") for s in sirets if s})
+            if not keys:
+                return pd.DataFrame(columns=columns)
+        if not self.cache.uses_bigquery:
+            return self._find_contacts_local(keys if sirets is not None else None, titles, require_email, climate_zones, limit)
+        if sirets is not None:
+            sirets_str = "', '".join(keys)
+            conditions.append(f"c.siret IN ('{sirets_str}')")
+        if titles:
+            words = [t.lower().replace("'", "") for t in titles]
+            conditions.append("(" + " OR ".join(f"STRPOS(LOWER(c.title), '{w}') > 0" for w in words) + ")")
+        if require_email:
+            conditions.append("IFNULL(c.email, '') != ''")
+        if climate_zones:
+            zones_str = "', '".join(climate_zones)
+            conditions.append(f"""c.siret IN (
+                SELECT DISTINCT siret_du_representant_legal FROM `{DATASET_TABLE}`
+                WHERE ({zone_case_sql()}) IN ('{zones_str}')
+            )""")
+        legacy_fields = ", ".join(f"IFNULL(JSON_VALUE(j, '$.{f}'), '') AS {f}" for f in CONTACT_FIELDS[:-1])
+        query = f"""
+            WITH latest AS (
+                SELECT * FROM `{CACHE_TABLE}`
+                QUALIFY ROW_NUMBER() OVER (PARTITION BY siret ORDER BY last_enriched DESC) = 1
+            )
+            , contacts AS (
+                SELECT l.siret, l.syndic_name, l.domain,
+                    t.first_name, t.last_name, t.title, t.email, t.linkedin_url
+                FROM latest l, UNNEST(l.contacts) AS t
+                UNION ALL
+                SELECT l.siret, l.syndic_name, l.domain, {legacy_fields}
+                FROM latest l, UNNEST(JSON_QUERY_ARRAY(l.contacts_json)) AS j
+                WHERE IFNULL(ARRAY_LENGTH(l.contacts), 0) = 0
+            )
+            SELECT * FROM contacts c
+            WHERE {" AND ".join(conditions) or "TRUE"}
+            ORDER BY c.syndic_name, c.last_name
+            LIMIT {int(limit)}
+        """
+        with span("contacts_query") as s:
+            try:
+                df = self.bq_client.query(query).to_dataframe()
+                s.set(rows=len(df))
+                return df
+            except Exception as e:
+                s.set(outcome="error", error=str(e)[:200])
+                logger.error(f"Contacts Query Error: {e}")
+        return pd.DataFrame(columns=columns)
+
+    def _find_contacts_local(self, sirets, titles, require_email, climate_zones, limit):
+        """find_contacts on CACHE_BACKEND='local': the same filters over a scan of the cache rows."""
+        columns = ["siret", "syndic_name", "domain"] + CONTACT_FIELDS[:-1]
+        words = [t.lower() for t in titles or []]
+        with span("contacts_scan") as s:
+            try:
+                wanted = set(sirets) if sirets is not None else None
+                if climate_zones:
+                    zones_str = "', '".join(climate_zones)
+                    query = f"""
+                        SELECT DISTINCT CAST(siret_du_representant_legal AS STRING) AS siret FROM `{DATASET_TABLE}`
+                        WHERE ({zone_case_sql()}) IN ('{zones_str}')
+                    """
+                    in_zones = set(self.bq_client.query(query).to_dataframe()["siret"].dropna())
+                    wanted = in_zones if wanted is None else wanted & in_zones
+                records = []
+                for batch in self.cache.scan():
+                    for row in batch:
+                        if wanted is not None and str(row.get('siret')) not in wanted:
+                            continue
+                        for contact in map(contact_record, contacts_of(row)):
+                            if words and not any(w in contact['title'].lower() for w in words):
+                                continue
+                            if require_email and not contact['email']:
+                                continue
+                            records.append([row.get('siret'), row.get('syndic_name'), row.get('domain')] + [contact[f] for f in CONTACT_FIELDS[:-1]])
+                records.sort(key=lambda r: (str(r[1] or ''), r[4]))
+                s.set(rows=min(len(records), int(limit)))
+                return pd.DataFrame(records[:int(limit)], columns=columns)
+            except Exception as e:
+                s.set(outcome="error", error=str(e)[:200])
+                logger.error(f"Contacts Scan Error: {e}")
+        return pd.DataFrame(columns=columns)
 
     def web_search_syndic(self, name, city):
         """Step 1: Search for official website using DuckDuckGo."""
         # Minimal query: Name + City to find the business entity
         query = f"{name} {city}"
-        print(f"Searching: {query}")
         
-        try:
-            with DDGS() as ddgs:
-                # Use default backend (api) usually better for business entities than 'html' if 'html' fails
-                results = list(ddgs.text(query, region="fr-fr", max_results=5))
-                
+        with span("ddg_search", query=query) as s:
+            try:
+                results = self._search_results(query)
+
                 # Filter out garbage (Google Support, Government info pages)
                 clean_results = []
                 for r in results:
                     href = r.get('href', '')
                     if 'google.com' not in href and '.gouv.fr' not in href and 'societe.com' not in href:
                         clean_results.append(r)
-                        
+
+                s.set(outcome="hit" if clean_results else "empty", results=len(results), kept=len(clean_results))
                 return clean_results
-        except Exception as e:
-            print(f"Search Error: {e}")
-            return []
+            except Exception as e:
+                s.set(outcome="error", error=str(e)[:200])
+                logger.error(f"Search Error: {e}")
+                return []
+
+    @staticmethod
+    def _search_results(query, max_results=5):
+        """Raw web results (title/href/body) from DuckDuckGo, or from SEARCH_API_URL when set."""
+        if SEARCH_API_URL:
+            response = requests.get(SEARCH_API_URL, params={"q": query, "max_results": max_results}, timeout=10)
+            response.raise_for_status()
+            return response.json()
+        with duckduckgo_search.DDGS() as ddgs:
+            # Use default backend (api) usually better for business entities than 'html' if 'html' fails
+            return list(ddgs.text(query, region="fr-fr", max_results=max_results))
 
     def validate_domain(self, candidate_url, syndic_name):
         """Step 2: Heuristic Validation of the domain."""
@@ -143,42 +475,32 @@ class EnrichmentManager:
     def search_apollo_org(self, domain=None, name=None):
         """Step 3a: Apollo Org Search using mixed_companies/search endpoint (most reliable)."""
         if not self.apollo_key: 
-            print("DEBUG: Apollo search skipped - No API Key")
+            logger.debug("Apollo search skipped - No API Key")
             return None
         
-        print(f"DEBUG: Searching Apollo Org. Domain: {domain}, Name: {name}")
-        url = "https://api.apollo.io/v1/mixed_companies/search"
-        headers = {
-            "Content-Type": "application/json",
-            "Cache-Control": "no-cache",
-            "X-Api-Key": self.apollo_key
-        }
+        url = APOLLO_ORG_SEARCH_URL
+        headers = self._apollo_headers(no_cache=True)
         
         org_id = None
 
         # 1. Try Domain Search if domain exists
         if domain:
-            data_domain = {
-                "q_organization_domains_list": [domain], # Note: List parameter format
-                "page": 1,
-                "per_page": 1
-            }
-            try:
-                response = requests.post(url, headers=headers, json=data_domain, timeout=10)
-                print(f"DEBUG: Apollo Org Search (Domain) Status: {response.status_code}")
-                
-                if response.status_code == 200:
-                    res = response.json()
-                    # Response contains 'accounts' or 'organizations'
-                    items = res.get('organizations', []) or res.get('accounts', [])
-                    if items:
-                        # Prefer organization_id if available, fallback to id
-                        item = items[0]
-                        org_id = item.get('organization_id') or item.get('id')
-                        print(f"DEBUG: Found Apollo Org ID by Domain: {org_id}")
-                        return org_id
-            except Exception as e:
-                print(f"DEBUG: Apollo Org Domain Error: {e}")
+            data_domain = self._org_payload(domain=domain)
+            with span("apollo_org", by="domain", domain=domain) as s:
+                try:
+                    response = self._apollo_post(url, headers, data_domain, s)
+                    if response.status_code == 200:
+                        org_id = self._org_id_from_response(response.json())
+                        if org_id:
+                            s.set(outcome="hit", org_id=org_id)
+                            return org_id
+                        s.set(outcome="empty")
+                    else:
+                        s.set(outcome="http_error")
+                except RateLimitExceeded:
+                    raise
+                except Exception as e:
+                    s.set(outcome="error", error=str(e)[:200])
         
         # 2. Fallback: Try Name Search
         # If domain lookup failed or no domain provided, use name
@@ -187,90 +509,101 @@ class EnrichmentManager:
              search_name = domain.split('.')[0]
         
         if search_name and not org_id:
-            print(f"DEBUG: Trying Name Search for: {search_name}")
             # For name search, mixed_companies might behave differently, let's stick to org search for name 
             # OR we can try q_organization_name param in mixed_companies if supported.
             # Safe bet: use the same endpoint but check params. 
             # Documentation often suggests q_organization_name for name search.
             
-            data_name = {
-                "q_organization_name": search_name,
-                "page": 1,
-                "per_page": 1
-            } 
-            try: 
-                response_name = requests.post(url, headers=headers, json=data_name, timeout=10)
-                if response_name.status_code == 200:
-                    res_name = response_name.json()
-                    items_name = res_name.get('organizations', []) or res_name.get('accounts', [])
-                    if items_name:
-                        item = items_name[0]
-                        org_id = item.get('organization_id') or item.get('id')
-                        print(f"DEBUG: Found Apollo Org ID by Name ({search_name}): {org_id}")
-                        return org_id
+            data_name = self._org_payload(name=search_name)
+            with span("apollo_org", by="name", name=search_name) as s:
+                try:
+                    response_name = self._apollo_post(url, headers, data_name, s)
+                    if response_name.status_code == 200:
+                        org_id = self._org_id_from_response(response_name.json())
+                        if org_id:
+                            s.set(outcome="hit", org_id=org_id)
+                            return org_id
+                        s.set(outcome="empty")
                     else:
-                        print(f"DEBUG: No Apollo Org found by Name either: {search_name}")
-                else:
-                    print(f"DEBUG: Apollo Org Search (Name) Failed: {response_name.status_code}")
-            except Exception as e:
-                print(f"DEBUG: Apollo Org Name Error: {e}")
+                        s.set(outcome="http_error")
+                except RateLimitExceeded:
+                    raise
+                except Exception as e:
+                    s.set(outcome="error", error=str(e)[:200])
         
         return None
 
     def search_apollo_people(self, org_id=None, domain=None):
         """Step 3b: Apollo People Search. Supports direct domain search or Org ID."""
         if not self.apollo_key: 
-            print(f"DEBUG: Apollo people search skipped - No Key")
+            logger.debug("Apollo people search skipped - No Key")
             return []
         
         if not org_id and not domain:
-            print(f"DEBUG: Apollo people search skipped - No Org ID or Domain")
+            logger.debug("Apollo people search skipped - No Org ID or Domain")
             return []
 
-        print(f"DEBUG: Searching Apollo People. Org ID: {org_id}, Domain: {domain}")
-        url = "https://api.apollo.io/v1/mixed_people/api_search"
-        headers = {
-            "Content-Type": "application/json",
-            "X-Api-Key": self.apollo_key
-        }
-        
-        # Titles to target
-        titles = ["Gestionnaire", "Principal", "Directeur copropriété", "Syndic", "Gérant"]
-        
-        data = {
-            "person_titles": titles,
-            "page": 1,
-            "per_page": 10
-        }
-
-        if domain:
-            data["q_organization_domains_list"] = [domain]
-        elif org_id:
-            data["organization_ids"] = [org_id]
+        url = APOLLO_PEOPLE_SEARCH_URL
+        headers = self._apollo_headers()
+        data = self._people_payload(org_id=org_id, domain=domain)
         
         contacts = []
-        try:
-            response = requests.post(url, headers=headers, json=data, timeout=10)
-            print(f"DEBUG: Apollo People Search Status: {response.status_code}")
-            if response.status_code == 200:
-                people = response.json().get('people', [])
-                print(f"DEBUG: Found {len(people)} people in Apollo")
-                for p in people:
-                    contacts.append({
-                        "first_name": p.get("first_name") or "",
-                        "last_name": p.get("last_name") or "",
-                        "title": p.get("title") or "Unknown Title",
-                        "email": p.get("email") or "",
-                        "linkedin_url": p.get("linkedin_url") or "",
-                        "photo_url": p.get("photo_url") or ""
-                    })
-            else:
-                print(f"DEBUG: Apollo People Search Failed - Status: {response.status_code}, Content: {response.text[:200]}")
-        except Exception as e:
-            print(f"DEBUG: Apollo People Error: {e}")
+        with span("apollo_people", by="domain" if domain else "org_id", domain=domain, org_id=org_id) as s:
+            try:
+                response = self._apollo_post(url, headers, data, s)
+                if response.status_code == 200:
+                    contacts = self._contacts_from_response(response.json())
+                    s.set(outcome="hit" if contacts else "empty", people=len(contacts))
+                else:
+                    s.set(outcome="http_error", response=response.text[:200])
+            except RateLimitExceeded:
+                raise
+            except Exception as e:
+                s.set(outcome="error", error=str(e)[:200])
             
         return contacts
 
+    def _best_pappers_domain(self, siret, name, pappers_data):
+        """Validates the Pappers candidates. Returns: (domain or None, score)"""
+        best_domain = None
+        best_score = 0
+        with span("pappers_validation", siret=siret) as s:
+            candidates = self._pappers_candidates(pappers_data)
+            
+            # Validate Candidates
+            for cand in candidates:
+                dom, score = self.validate_domain(cand, name)
+                if dom and score > best_score:
+                    best_domain = dom
+                    best_score = score
+
+            s.set(outcome="hit" if best_domain else "miss", candidates=len(candidates), score=best_score)
+        return best_domain, best_score
+
+    def _best_search_domain(self, search_results, name, best_score=0):
+        """Validates web search hits. Returns: (domain or None, score)"""
+        best_domain = None
+        for res in search_results:
+            url = res.get('href', '')
+            dom, score = self.validate_domain(url, name)
+            logger.debug(f"Validating {url} -> Domain: {dom}, Score: {score}")
+            if dom and score > best_score:
+                best_domain = dom
+                best_score = score
+        return best_domain, best_score
+
+    @staticmethod
+    def _build_result(siret, name, best_domain, source, org_id, contacts, best_score):
+        return {
+            "siret": siret,
+            "syndic_name": name,
+            "domain": best_domain,
+            "domain_source": source,
+            "apollo_org_id": org_id or "",
+            "contacts": contacts,
+            "confidence_score": float(best_score)
+        }
+
     def enrich_syndic(self, siret, name, city, pappers_data=None):
         """
         Executes the full Sales Intelligence Pipeline for a Syndic.
@@ -285,17 +618,18 @@ class EnrichmentManager:
            - Searches for official contacts by domain.
            - Falls back to organization name search if domain-based search fails.
         5. Cache Persistence: saves the final result to BigQuery.
+
+        Each stage is recorded as a span (see core.tracing).
+
+        Raises:
+            RateLimitExceeded / QuotaExceeded: an Apollo call was refused. Nothing is
+            cached, so the syndic is enriched again on the next attempt.
         """
         
         # A. Check Cache
         cached = self.get_cached_data(siret)
         if cached:
-            if isinstance(cached.get('contacts_json'), str):
-                try:
-                    cached['contacts_json'] = json.loads(cached['contacts_json'])
-                except:
-                    cached['contacts_json'] = []
-            return cached
+            return self._decode_cached(cached)
 
         best_domain = None
         best_score = 0
@@ -303,51 +637,20 @@ class EnrichmentManager:
 
         # B. Try Pappers Data (Website or Email Domain)
         if pappers_data:
-            candidates = []
-            
-            # 1. Inspect 'sites_internet'
-            sites = pappers_data.get('sites_internet', '')
-            if sites:
-                # Pappers can return "site1.com, site2.com". Split them.
-                for s in sites.split(','):
-                    candidates.append(s.strip())
-
-            # 2. Inspect 'email'
-            email = pappers_data.get('email', '')
-            if email and '@' in email:
-                email_domain = email.split('@')[-1].strip()
-                # Ignore generic domains
-                if email_domain not in ['gmail.com', 'orange.fr', 'wanadoo.fr', 'yahoo.fr', 'outlook.com', 'hotmail.fr', 'hotmail.com']:
-                    candidates.append(email_domain)
-            
-            # Validate Candidates
-            for cand in candidates:
-                dom, score = self.validate_domain(cand, name)
-                if dom and score > best_score:
-                    best_domain = dom
-                    best_score = score
-                    source = "pappers_data"
+            best_domain, best_score = self._best_pappers_domain(siret, name, pappers_data)
+            if best_domain:
+                source = "pappers_data"
         
         # C. Web Search Fallback (Only if Pappers failed)
         if not best_domain:
-            print(f"DEBUG: Pappers fallback failed, launching web search for {name} in {city}")
             search_results = self.web_search_syndic(name, city)
-            print(f"DEBUG: Web search returned {len(search_results)} results")
-            for res in search_results:
-                url = res.get('href', '')
-                dom, score = self.validate_domain(url, name)
-                print(f"DEBUG: Validating {url} -> Domain: {dom}, Score: {score}")
-                if dom and score > best_score:
-                    best_domain = dom
-                    best_score = score
-                    source = "web_search"
+            best_domain, best_score = self._best_search_domain(search_results, name, best_score)
         
         # If no good domain found, we used to stop. Now we try Apollo with Name.
         if not best_domain:
-            print(f"DEBUG: No valid domain found for {name}. Attempting Apollo Name Search directly.")
             source = "name_fallback"
             
-        print(f"DEBUG: Best Domain found: {best_domain} (Source: {source}, Score: {best_score})")
+        logger.debug(f"Best Domain found for {name}: {best_domain} (Source: {source}, Score: {best_score})")
  
         # D. Apollo Enrichment
         contacts = []
@@ -357,7 +660,6 @@ class EnrichmentManager:
             
         # Fallback if no domain or no contacts found by domain
         if not contacts:
-            print(f"DEBUG: No contacts found by domain. Attempting Org ID fallback.")
             org_id = self.search_apollo_org(domain=best_domain, name=name)
             if org_id:
                 contacts = self.search_apollo_people(org_id=org_id)
@@ -370,16 +672,23 @@ class EnrichmentManager:
             org_id = "" # Will be filled by cache logic or kept empty
             
         # E. Save Result
-        result = {
-            "siret": siret,
-            "syndic_name": name,
-            "domain": best_domain,
-            "domain_source": source,
-            "apollo_org_id": org_id or "",
-            "contacts_json": contacts,
-            "confidence_score": float(best_score)
-        }
+        result = self._build_result(siret, name, best_domain, source, org_id, contacts, best_score)
         
         self.save_to_cache(result)
         return result
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enrichment cache maintenance.")
+    parser.add_argument("--migrate-contacts", action="store_true", help="Convert remaining contacts_json blobs to the typed contacts column")
+    args = parser.parse_args(argv)
+
+    if args.migrate_contacts:
+        client = get_bigquery_client()
+        pending = pending_contacts_migration(client)
+        if pending:
+            migrate_contacts_json(client)
+        print(f"migrated: {pending}  remaining: {pending_contacts_migration(client)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+import os
+import csv
+import sys
+import json
+import argparse
+from core.data_manager import fetch_aggregated_syndics
+from core.pappers_connector import read_cached_infos, normalize_siret, get_syndic_info
+from core.enrichment_manager import EnrichmentManager, contacts_of
+from core.tracing import span, logger
+
+# Configuration
+EXPORT_CHUNK_SIZE = 200  # Syndics resolved per batch (one cache query per source and chunk)
+EXPORT_FORMATS = ("csv", "xlsx", "jsonl")
+
+PACK_COLUMNS = [
+    "syndic", "siret", "nb_copros", "total_lots",
+    "denomination", "dirigeant", "ca_annuel", "telephone", "email_societe", "domain",
+    "contact_prenom", "contact_nom", "contact_titre", "contact_email", "contact_linkedin",
+    "icebreaker",
+]
+
+
+def build_icebreaker(syndic_row, contact):
+    """Email icebreaker of the prospecting pack (also used by step 4 of the app)."""
+    first_name = contact.get('first_name', 'Bonjour')
+    return (
+        f"Objet : {syndic_row.get('Syndic')}\n\nBonjour {first_name},\n\n"
+        f"J'ai identifié {int(syndic_row.get('nb_copros', 0))} de vos immeubles à fort potentiel CEE..."
+    )
+
+
+def _pack_rows(syndic_row, legal, enrichment):
+    """One row per Apollo contact, or a single row without contact."""
+    legal = legal or {}
+    base = {
+        "syndic": syndic_row.get('Syndic'),
+        "siret": syndic_row.get('Siret'),
+        "nb_copros": int(syndic_row.get('nb_copros', 0)),
+        "total_lots": int(syndic_row.get('total_lots', 0) or 0),
+        "denomination": legal.get('denomination') or "",
+        "dirigeant": f"{legal.get('prenom_dirigeant') or ''} {legal.get('nom_dirigeant') or ''}".strip(),
+        "ca_annuel": legal.get('ca_annuel'),
+        "telephone": legal.get('telephone') or "",
+        "email_societe": legal.get('email') or "",
+        "domain": (enrichment or {}).get('domain') or "",
+    }
+    contacts = contacts_of(enrichment) or [{}]
+    for ct in contacts:
+        row = dict(base)
+        row.update({
+            "contact_prenom": ct.get('first_name', ''),
+            "contact_nom": ct.get('last_name', ''),
+            "contact_titre": ct.get('title', ''),
+            "contact_email": ct.get('email', ''),
+            "contact_linkedin": ct.get('linkedin_url', ''),
+            "icebreaker": build_icebreaker(syndic_row, ct),
+        })
+        yield row
+
+
+def iter_pack_chunks(syndics_df, chunk_size=EXPORT_CHUNK_SIZE, fetch_missing_legal=False, enricher=None):
+    """
+    Streams prospecting-pack rows chunk by chunk from an aggregate result.
+    Each chunk costs one Pappers-cache and one enrichment-cache query; only the
+    current chunk is held in memory. Missing legal data is fetched from the
+    Pappers API (rate limited) only when `fetch_missing_legal` is set.
+
+    Yields: (rows, syndics_done, syndics_total)
+    """
+    enricher = enricher or EnrichmentManager()
+    total = len(syndics_df)
+
+    for start in range(0, total, chunk_size):
+        chunk = syndics_df.iloc[start:start + chunk_size]
+        with span("export_chunk", start=start, size=len(chunk)) as s:
+            sirets = [x for x in chunk['Siret'].tolist() if x]
+            try:
+                legal_by_siret = read_cached_infos(sirets)
+            except Exception as e:
+                logger.error(f"Export: Pappers cache read failed ({e})")
+                legal_by_siret = {}
+            enrich_by_siret = enricher.get_cached_data_many(sirets)
+
+            rows = []
+            for syndic_row in chunk.to_dict('records'):
+                siret = syndic_row.get('Siret')
+                legal = legal_by_siret.get(normalize_siret(siret))
+                if legal is None and fetch_missing_legal:
+                    legal = get_syndic_info(siret)
+                rows.extend(_pack_rows(syndic_row, legal, enrich_by_siret.get(siret)))
+            s.set(rows=len(rows))
+        yield rows, min(start + chunk_size, total), total
+
+
+class _CsvWriter:
+    def __init__(self, path):
+        self._f = open(path, "w", newline="", encoding="utf-8-sig")
+        self._w = csv.DictWriter(self._f, fieldnames=PACK_COLUMNS)
+        self._w.writeheader()
+
+    def write(self, rows):
+        self._w.writerows(rows)
+
+    def close(self):
+        self._f.close()
+
+
+class _JsonlWriter:
+    def __init__(self, path):
+        self._f = open(path, "w", encoding="utf-8")
+
+    def write(self, rows):
+        for row in rows:
+            self._f.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+
+    def close(self):
+        self._f.close()
+
+
+class _XlsxWriter:
+    """openpyxl write-only mode streams rows to disk instead of building the sheet in memory."""
+
+    def __init__(self, path):
+        from openpyxl import Workbook
+        self._path = path
+        self._wb = Workbook(write_only=True)
+        self._ws = self._wb.create_sheet("Packs")
+        self._ws.append(PACK_COLUMNS)
+
+    def write(self, rows):
+        for row in rows:
+            self._ws.append([row.get(c) for c in PACK_COLUMNS])
+
+    def close(self):
+        self._wb.save(self._path)
+
+
+WRITERS = {"csv": _CsvWriter, "jsonl": _JsonlWriter, "xlsx": _XlsxWriter}
+
+
+def export_packs(syndics_df, path, fmt="csv", chunk_size=EXPORT_CHUNK_SIZE, fetch_missing_legal=False, progress=None, enricher=None):
+    """
+    Writes prospecting packs for every syndic of `syndics_df` to `path`.
+
+    Args:
+        syndics_df (DataFrame): Aggregate rows (Syndic, Siret, nb_copros, total_lots).
+        fmt (str): 'csv', 'xlsx' or 'jsonl'.
+        progress (callable): Optional progress(syndics_done, syndics_total) callback.
+    Returns:
+        int: Number of rows written.
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format '{fmt}' (expected one of {EXPORT_FORMATS})")
+
+    writer = WRITERS[fmt](path)
+    written = 0
+    try:
+        for rows, done, total in iter_pack_chunks(syndics_df, chunk_size, fetch_missing_legal, enricher):
+            writer.write(rows)
+            written += len(rows)
+            if progress:
+                progress(done, total)
+    finally:
+        writer.close()
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export prospecting packs for every syndic matching the filters.")
+    parser.add_argument("--zones", nargs="*", default=["H1"], help="Climate zones (H1 H2 H3)")
+    parser.add_argument("--min-lots", type=int, default=20)
+    parser.add_argument("--max-lots", type=int, default=500)
+    parser.add_argument("--periods", nargs="*", default=None, help="UI period labels, e.g. 'Avant 1949' '1949-1974'")
+    parser.add_argument("--exclude-big", action="store_true", help="Exclude majors and placeholder syndics")
+    parser.add_argument("--qpv", action="store_true", help="QPV copros only")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--out", required=True, help="Output file")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    parser.add_argument("--fetch-missing-legal", action="store_true", help="Call Pappers for SIRETs missing from cache")
+    args = parser.parse_args(argv)
+
+    syndics = fetch_aggregated_syndics(args.zones, args.min_lots, args.max_lots, args.periods, args.exclude_big, args.qpv)
+    if syndics.empty:
+        print("No syndic matches these filters.")
+        return 1
+
+    def progress(done, total):
+        print(f"\r{done}/{total} syndics", end="", file=sys.stderr, flush=True)
+
+    written = export_packs(syndics, args.out, args.format, args.chunk_size, args.fetch_missing_legal, progress)
+    print(f"\n{written} rows written to {os.path.abspath(args.out)}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    # Usage: python -m core.export_pack --zones H1 --exclude-big --format xlsx --out packs.xlsx
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import streamlit as st
+from core.lazy import lazy_import
+from core.data_manager import get_bigquery_client, build_filter_clause, DATASET_TABLE, PERIOD_MAPPING
+from core.spatial_index import EARTH_RADIUS_KM
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# Configuration
+# Grid levels (Web Mercator tile zoom of each cell). A cell of level z is drawn at map zoom z - 3 (~32px).
+ZOOM_LEVELS = {"France": 8, "Département": 11, "Quartier": 14}
+# Levels this fine are only offered around a site (bounded area), see the step-2 zone map
+SITE_ONLY_ZOOM = ZOOM_LEVELS["Quartier"]
+MAP_MAX_CELLS = 5000  # Cells per map payload; above it the next coarser level is used
+EARTH_CIRCUMFERENCE_M = 40075016.686
+MAX_MERCATOR_LAT = 85.05112878
+
+# Construction-period mix columns of each cell (UI labels)
+UNKNOWN_PERIOD = "Inconnue"
+PERIOD_COLUMNS = list(PERIOD_MAPPING.keys()) + [UNKNOWN_PERIOD]
+PERIOD_LABELS = {db: label for label, db_values in PERIOD_MAPPING.items() for db in db_values}
+
+
+def mercator_cell_index(lat, lon, zoom):
+    """Vectorized lat/lon (degrees) -> integer cell coordinates (ix, iy) on the 2^zoom grid."""
+    n = 2 ** zoom
+    lat = np.clip(np.asarray(lat, dtype="float64"), -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT)
+    lon = np.asarray(lon, dtype="float64")
+    lat_rad = np.radians(lat)
+    x = (lon + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(lat_rad) + 1.0 / np.cos(lat_rad)) / np.pi) / 2.0
+    ix = np.clip(np.floor(x * n), 0, n - 1).astype("int64")
+    iy = np.clip(np.floor(y * n), 0, n - 1).astype("int64")
+    return ix, iy
+
+
+def cell_center(ix, iy, zoom):
+    """Vectorized cell coordinates -> center (lat, lon) in degrees."""
+    n = 2 ** zoom
+    lon = (np.asarray(ix) + 0.5) / n * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (np.asarray(iy) + 0.5) / n))))
+    return lat, lon
+
+
+def cell_size_m(lat, zoom):
+    """Approximate cell width in meters at a given latitude."""
+    return EARTH_CIRCUMFERENCE_M * np.cos(np.radians(lat)) / 2 ** zoom
+
+
+def _finalize_cells(cells, zoom):
+    """Adds cell centers, dominant period and zoom to aggregated cells."""
+    for col in PERIOD_COLUMNS:
+        if col not in cells.columns:
+            cells[col] = 0
+    cells["lat"], cells["lon"] = cell_center(cells["ix"].to_numpy(), cells["iy"].to_numpy(), zoom)
+    cells["dominant_period"] = cells[PERIOD_COLUMNS].idxmax(axis=1) if not cells.empty else pd.Series(dtype="object")
+    cells["zoom"] = zoom
+    return cells[["zoom", "ix", "iy", "lat", "lon", "nb_copros", "lots", "dominant_period"] + PERIOD_COLUMNS]
+
+
+def bin_copros(df, zoom):
+    """
+    Aggregates copro rows (lat, long, lots, period) into grid cells in one vectorized pass.
+    Returns: DataFrame -> one row per occupied cell with counts, lots and period mix.
+    """
+    lat = pd.to_numeric(df["lat"], errors="coerce").to_numpy()
+    lon = pd.to_numeric(df["long"], errors="coerce").to_numpy()
+    valid = ~(np.isnan(lat) | np.isnan(lon))
+
+    ix, iy = mercator_cell_index(lat[valid], lon[valid], zoom)
+    points = pd.DataFrame({
+        "ix": ix,
+        "iy": iy,
+        "lots": pd.to_numeric(df["nombre_de_lots_a_usage_d_habitation"], errors="coerce").fillna(0).to_numpy()[valid],
+        "period": df["periode_de_construction"].astype("object").map(PERIOD_LABELS).fillna(UNKNOWN_PERIOD).to_numpy()[valid],
+    })
+
+    cells = points.groupby(["ix", "iy"]).agg(nb_copros=("lots", "size"), lots=("lots", "sum")).reset_index()
+    mix = points.groupby(["ix", "iy", "period"]).size().unstack(fill_value=0).reset_index()
+    cells = cells.merge(mix, on=["ix", "iy"], how="left")
+    return _finalize_cells(cells, zoom)
+
+
+def build_map_tiles(df, zoom_levels=None):
+    """Precomputes cells for every zoom level. Returns: dict -> {zoom: cells DataFrame}"""
+    zoom_levels = zoom_levels or ZOOM_LEVELS.values()
+    return {zoom: bin_copros(df, zoom) for zoom in zoom_levels}
+
+
+def fetch_map_cells(zoom, climate_zones, min_lots, max_lots, periods=None, exclude_big_syndics=False, qpv_only=False, syndic_name=None, site=None, max_cells=None):
+    """
+    Server-side binning: BigQuery aggregates matching copros into cells, so the payload
+    grows with the number of occupied cells, not with the number of buildings.
+    `site` (lat, lon, radius_km) keeps the copros within the radius; `max_cells` caps the
+    cells read (max_cells + 1, so the caller can tell the cap was reached).
+    """
+    client = get_bigquery_client()
+    where_clause, zone_case = build_filter_clause(climate_zones, min_lots, max_lots, periods, exclude_big_syndics, qpv_only)
+
+    if syndic_name:
+        safe_syndic = syndic_name.replace("'", "\\'")
+        where_clause += f" AND raison_sociale_du_representant_legal = '{safe_syndic}'"
+
+    site_clause = ""
+    if site:
+        site_lat, site_lon, radius_km = (float(v) for v in site)
+        # Haversine distance on the (clamped) radians of each point
+        site_clause = f"""
+            AND 2 * {EARTH_RADIUS_KM} * ASIN(SQRT(
+                POW(SIN((lat_rad - {np.radians(site_lat)}) / 2), 2)
+                + COS(lat_rad) * {np.cos(np.radians(site_lat))} * POW(SIN((lon - {site_lon}) * ACOS(-1) / 360), 2)
+            )) <= {radius_km}"""
+
+    n = 2 ** zoom
+    period_counts = ",\n".join(
+        f"COUNTIF(periode IN ('" + "', '".join(PERIOD_MAPPING[label]) + f"')) AS p{i}"
+        for i, label in enumerate(PERIOD_MAPPING)
+    )
+
+    query = f"""
+        WITH pts AS (
+            SELECT
+                LEAST(GREATEST(SAFE_CAST(lat AS FLOAT64), -{MAX_MERCATOR_LAT}), {MAX_MERCATOR_LAT}) * ACOS(-1) / 180 AS lat_rad,
+                SAFE_CAST(`long` AS FLOAT64) AS lon,
+                SAFE_CAST(nombre_de_lots_a_usage_d_habitation AS INT64) AS lots,
+                periode_de_construction AS periode
+            FROM `{DATASET_TABLE}`
+            WHERE {where_clause}
+        )
+        SELECT
+            CAST(FLOOR((lon + 180) / 360 * {n}) AS INT64) AS ix,
+            CAST(FLOOR((1 - LN(TAN(lat_rad) + 1 / COS(lat_rad)) / ACOS(-1)) / 2 * {n}) AS INT64) AS iy,
+            COUNT(*) AS nb_copros,
+            SUM(IFNULL(lots, 0)) AS lots,
+            {period_counts}
+        FROM pts
+        WHERE lat_rad IS NOT NULL AND lon IS NOT NULL{site_clause}
+        GROUP BY 1, 2
+    """
+    if max_cells:
+        query += f"LIMIT {int(max_cells) + 1}"
+
+    try:
+        cells = client.query(query).to_dataframe()
+        labels = list(PERIOD_MAPPING.keys())
+        cells = cells.rename(columns={f"p{i}": label for i, label in enumerate(labels)})
+        cells[UNKNOWN_PERIOD] = cells["nb_copros"] - cells[labels].sum(axis=1)
+        return _finalize_cells(cells, zoom)
+    except Exception as e:
+        st.error(f"Error fetching map cells: {e}")
+        return pd.DataFrame()
+
+
+def fetch_map_cells_capped(zoom, *args, max_cells=MAP_MAX_CELLS, **kwargs):
+    """
+    fetch_map_cells at `zoom`, falling back to the next coarser ZOOM_LEVELS level while
+    the area holds more than `max_cells` occupied cells, so the payload stays bounded.
+    Returns: (cells DataFrame, zoom actually used)
+    """
+    levels = sorted({z for z in ZOOM_LEVELS.values() if z < zoom} | {zoom}, reverse=True)
+    for z in levels:
+        cells = fetch_map_cells(z, *args, max_cells=max_cells, **kwargs)
+        if len(cells) <= max_cells:
+            return cells, z
+    return cells.head(max_cells), z
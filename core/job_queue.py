@@ -0,0 +1,294 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from core.tracing import stage_listener, span, logger
+
+# Configuration
+JOBS_DB = os.environ.get("CEE_JOBS_DB", os.path.join(".cee_cache", "jobs.sqlite"))
+JOB_WORKERS = int(os.environ.get("CEE_JOB_WORKERS", 4))  # Enrichment threads per process
+JOB_POLL_SECONDS = 1.0       # Idle workers look for jobs submitted by other processes this often
+JOB_STALE_SECONDS = 600      # A running job without progress for this long is considered orphaned
+JOB_MAX_ATTEMPTS = 2         # Orphaned jobs are requeued until this many attempts, then failed
+
+ACTIVE_STATUSES = ("queued", "running")
+# Spans emitted by EnrichmentManager.enrich_syndic, in pipeline order (for progress display)
+ENRICH_STAGES = ["cache_lookup", "pappers_validation", "ddg_search", "apollo_people", "apollo_org"]
+
+
+def _connect():
+    """Opens the shared job database (same pattern as the rate limiter: SQLite + WAL, shared by every process)."""
+    folder = os.path.dirname(JOBS_DB)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    conn = sqlite3.connect(JOBS_DB, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            siret TEXT NOT NULL,
+            name TEXT,
+            city TEXT,
+            pappers_json TEXT,
+            status TEXT NOT NULL,
+            stage TEXT,
+            stages_json TEXT NOT NULL DEFAULT '[]',
+            result_json TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            worker TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            updated_at REAL NOT NULL,
+            finished_at REAL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_siret ON jobs (siret, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+    return conn
+
+
+def _job_dict(row):
+    if row is None:
+        return None
+    job = dict(row)
+    job["stages"] = json.loads(job.pop("stages_json") or "[]")
+    job["result"] = json.loads(job.pop("result_json")) if job.get("result_json") else None
+    job.pop("pappers_json", None)
+    return job
+
+
+def submit_enrichment(siret, name, city, pappers_data=None):
+    """
+    Queues an enrichment job and returns its id. A job already queued or running
+    for the same SIRET is reused, so two reps clicking on the same syndic share one run.
+    """
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            f"SELECT id FROM jobs WHERE siret = ? AND status IN {ACTIVE_STATUSES} ORDER BY id DESC LIMIT 1",
+            (str(siret),),
+        ).fetchone()
+        if row:
+            conn.execute("COMMIT")
+            return row["id"]
+        cur = conn.execute(
+            "INSERT INTO jobs (kind, siret, name, city, pappers_json, status, created_at, updated_at) "
+            "VALUES ('enrich', ?, ?, ?, ?, 'queued', ?, ?)",
+            (str(siret), name, city, json.dumps(pappers_data, default=str) if pappers_data else None, now, now),
+        )
+        conn.execute("COMMIT")
+        job_id = cur.lastrowid
+    finally:
+        conn.close()
+
+    start_workers()
+    _wake.set()
+    return job_id
+
+
+def get_job(job_id):
+    """Returns: dict -> job state (status, stage, stages, result, error...) or None."""
+    conn = _connect()
+    try:
+        return _job_dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+    finally:
+        conn.close()
+
+
+def latest_job_for(siret):
+    """Most recent job of a SIRET, from any session or process (None if never submitted)."""
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE siret = ? ORDER BY id DESC LIMIT 1", (str(siret),)).fetchone()
+        return _job_dict(row)
+    finally:
+        conn.close()
+
+
+def list_jobs(status=None, limit=50):
+    conn = _connect()
+    try:
+        if status:
+            rows = conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?", (status, limit)).fetchall()
+        else:
+            rows = conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [_job_dict(r) for r in rows]
+    finally:
+        conn.close()
+
+
+def queue_status():
+    """Returns: dict -> number of jobs per status."""
+    conn = _connect()
+    try:
+        return {r["status"]: r["n"] for r in conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+    finally:
+        conn.close()
+
+
+def _recover_orphans(conn, now):
+    """
+    Jobs left 'running' by a worker that died (process restart, crash) stop making
+    progress: requeue them, or fail them once JOB_MAX_ATTEMPTS is reached.
+    """
+    cutoff = now - JOB_STALE_SECONDS
+    conn.execute(
+        "UPDATE jobs SET status = 'queued', worker = NULL, updated_at = ? "
+        "WHERE status = 'running' AND updated_at < ? AND attempts < ?",
+        (now, cutoff, JOB_MAX_ATTEMPTS),
+    )
+    conn.execute(
+        "UPDATE jobs SET status = 'failed', error = 'Worker lost (restart or crash)', finished_at = ?, updated_at = ? "
+        "WHERE status = 'running' AND updated_at < ?",
+        (now, now, cutoff),
+    )
+
+
+def _claim(conn, worker):
+    """Atomically moves the oldest queued job to 'running'. Returns: sqlite3.Row or None."""
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _recover_orphans(conn, now)
+        row = conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+        if row:
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                "started_at = ?, updated_at = ?, stage = NULL, stages_json = '[]' WHERE id = ?",
+                (worker, now, now, row["id"]),
+            )
+        conn.execute("COMMIT")
+        return row
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _finish(conn, job_id, status, result=None, error=None):
+    now = time.time()
+    conn.execute(
+        "UPDATE jobs SET status = ?, result_json = ?, error = ?, stage = NULL, finished_at = ?, updated_at = ? WHERE id = ?",
+        (status, json.dumps(result, default=str) if result is not None else None, error, now, now, job_id),
+    )
+
+
+class _StageRecorder:
+    """Stage listener writing each finished span of a job into its row (also acts as heartbeat)."""
+
+    def __init__(self, conn, job_id):
+        self.conn = conn
+        self.job_id = job_id
+        self.stages = []
+
+    def __call__(self, finished):
+        self.stages.append({
+            "stage": finished.stage,
+            "outcome": finished.outcome,
+            "duration_ms": round(finished.duration_ms, 1),
+        })
+        self.conn.execute(
+            "UPDATE jobs SET stage = ?, stages_json = ?, updated_at = ? WHERE id = ?",
+            (finished.stage, json.dumps(self.stages), time.time(), self.job_id),
+        )
+
+
+def _run_enrichment(conn, job, enricher):
+    pappers_data = json.loads(job["pappers_json"]) if job["pappers_json"] else None
+    recorder = _StageRecorder(conn, job["id"])
+    with span("job_enrich", job_id=job["id"], siret=job["siret"]) as s:
+        try:
+            with stage_listener(recorder):
+                result = enricher.enrich_syndic(job["siret"], job["name"], job["city"], pappers_data=pappers_data)
+        except Exception as e:
+            logger.error(f"Enrichment job {job['id']} failed: {e}")
+            s.set(outcome="error", error=str(e)[:200])
+            _finish(conn, job["id"], "failed", error=str(e)[:500])
+            return
+        if result:
+            _finish(conn, job["id"], "done", result=result)
+        else:
+            s.set(outcome="empty")
+            _finish(conn, job["id"], "failed", error="No result")
+
+
+def _worker_loop(worker):
+    from core.enrichment_manager import EnrichmentManager
+    enricher = EnrichmentManager()
+    conn = _connect()
+    while not _stop.is_set():
+        try:
+            job = _claim(conn, worker)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Job claim failed ({worker}): {e}")
+            job = None
+        if job is None:
+            _wake.wait(JOB_POLL_SECONDS)
+            _wake.clear()
+            continue
+        _run_enrichment(conn, job, enricher)
+    conn.close()
+
+
+_workers = []
+_workers_lock = threading.Lock()
+_wake = threading.Event()
+_stop = threading.Event()
+
+
+def start_workers(count=JOB_WORKERS):
+    """Starts the process-wide worker threads once (idempotent)."""
+    with _workers_lock:
+        _workers[:] = [t for t in _workers if t.is_alive()]
+        for i in range(len(_workers), count):
+            worker = f"{os.getpid()}-{i}"
+            t = threading.Thread(target=_worker_loop, args=(worker,), name=f"enrich-job-{i}", daemon=True)
+            t.start()
+            _workers.append(t)
+
+
+def stop_workers(timeout=None):
+    """Asks workers to exit after their current job."""
+    _stop.set()
+    _wake.set()
+    with _workers_lock:
+        for t in _workers:
+            t.join(timeout)
+        _workers.clear()
+    _stop.clear()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enrichment job queue.")
+    sub = parser.add_subparsers(dest="command")
+    worker = sub.add_parser("worker", help="Run a standalone worker process")
+    worker.add_argument("--threads", type=int, default=JOB_WORKERS)
+    sub.add_parser("status", help="Jobs per status and latest jobs")
+    args = parser.parse_args(argv)
+
+    if args.command == "worker":
+        start_workers(args.threads)
+        print(f"{args.threads} enrichment workers running on {JOBS_DB} (Ctrl+C to stop)", file=sys.stderr)
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            stop_workers()
+        return 0
+
+    print(queue_status())
+    for job in list_jobs(limit=20):
+        print(f"#{job['id']:<6} {job['status']:<8} {job['siret']:<16} {job['stage'] or '':<20} {job['error'] or ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    # Usage: python -m core.job_queue worker --threads 8   |   python -m core.job_queue status
+    sys.exit(main())
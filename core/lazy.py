@@ -0,0 +1,47 @@
+import sys
+import types
+import importlib
+import threading
+
+
+class LazyModule(types.ModuleType):
+    """
+    Placeholder for a heavy dependency: the real module is imported on first
+    attribute access, so importing a core module (or reaching the login screen)
+    does not pay for pandas, BigQuery, DuckDuckGo, etc.
+    """
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__["_lazy_lock"] = threading.Lock()
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with self.__dict__["_lazy_lock"]:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        # Only called for names not yet in __dict__: resolve once, then cache
+        value = getattr(self._load(), attr)
+        self.__dict__[attr] = value
+        return value
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_lazy_module"] is not None else "not loaded"
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_import(name):
+    """Returns the module if already imported, else a LazyModule placeholder."""
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
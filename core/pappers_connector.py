@@ -1,28 +1,47 @@
 
 import os
-import requests
-import pandas as pd
+import sys
+import gzip
+import json
+import base64
+import argparse
 import streamlit as st
-from google.cloud import bigquery
 from datetime import datetime
+from core.lazy import lazy_import
+from core.data_manager import get_bigquery_client, get_secret
+from core.rate_limiter import acquire, record_throttle, parse_retry_after, RateLimitExceeded, QuotaExceeded
+from core.cache_backend import get_cache
+from core.tracing import logger
+
+requests = lazy_import("requests")
 
 # Configuration
 PROJECT_ID = "gen-lang-client-0045947309"
 CACHE_TABLE = "gen-lang-client-0045947309.rnic.cache_pappers"
+PAPPERS_API_URL = os.environ.get("PAPPERS_API_URL", "https://api.pappers.fr/v2/entreprise/")
+RAW_PAYLOAD_COLUMN = "raw_payload"  # Full API answer, gzip + base64 (written, never read back by lookups)
+# Columns extract_pappers_fields derives from a payload (re-derivable by backfill_from_payloads)
+DERIVED_COLUMNS = [
+    "denomination", "nom_dirigeant", "prenom_dirigeant", "code_ape", "ca_annuel",
+    "sites_internet", "telephone", "email", "lien_linkedin", "categorie_entreprise",
+]
+BACKFILL_BATCH_SIZE = 500  # Rows per UPDATE statement / local write
 
 def get_pappers_api_key():
-    if "PAPPERS_API_KEY" in st.secrets:
-        return st.secrets["PAPPERS_API_KEY"]
-    return os.environ.get("PAPPERS_API_KEY", None)
+    return get_secret("PAPPERS_API_KEY")
 
-def get_bigquery_client():
-    if "GOOGLE_SERVICE_ACCOUNT_JSON" in st.secrets:
-        info = dict(st.secrets["GOOGLE_SERVICE_ACCOUNT_JSON"])
-        return bigquery.Client.from_service_account_info(info)
-    return bigquery.Client(project=PROJECT_ID)
+def get_pappers_cache():
+    """Pappers cache backend (CACHE_BACKEND: BigQuery table, local store or write-through)."""
+    return get_cache("pappers", CACHE_TABLE, order_by="derniere_maj_pappers", exclude=(RAW_PAYLOAD_COLUMN,))
 
 def init_cache_table():
-    """Creates the cache table if it doesn't exist or adds missing columns."""
+    """
+    Creates the cache table if it doesn't exist or adds missing columns. Derived columns
+    added to a table holding archived payloads are filled from them right away
+    (backfill_from_payloads), so old rows are not treated as incomplete and re-bought.
+    """
+    if not get_pappers_cache().uses_bigquery:
+        return
     client = get_bigquery_client()
     
     # 1. Ensure Table Exists
@@ -46,55 +65,144 @@ def init_cache_table():
             "telephone": "STRING",
             "email": "STRING",
             "lien_linkedin": "STRING",
-            "categorie_entreprise": "STRING"
+            "categorie_entreprise": "STRING",
+            RAW_PAYLOAD_COLUMN: "STRING"
         }
         
         # Get existing columns
         table = client.get_table(CACHE_TABLE)
         existing_cols = [schema.name for schema in table.schema]
         
+        added = []
         for col, col_type in new_cols.items():
             if col not in existing_cols:
                 alter_query = f"ALTER TABLE `{CACHE_TABLE}` ADD COLUMN {col} {col_type}"
                 client.query(alter_query).result()
                 print(f"Migration: Added column {col}")
+                added.append(col)
                 
     except Exception as e:
         st.error(f"Error initializing/migrating cache table: {e}")
+        return
+
+    # 3. Fill the new derived columns from the archived payloads (no API call)
+    backfill = [c for c in added if c in DERIVED_COLUMNS]
+    if backfill and RAW_PAYLOAD_COLUMN in existing_cols:
+        try:
+            report = backfill_from_payloads(backfill)
+            print(f"Migration: filled {report['updated']} rows of {', '.join(backfill)} from archived payloads")
+            if report["failed"]:
+                logger.warning(
+                    f"Pappers backfill left {report['failed']} rows for later: "
+                    f"`python -m core.pappers_connector --columns {' '.join(backfill)}`"
+                )
+        except Exception as e:
+            logger.warning(f"Pappers backfill after migration failed: {e}")
+
+def normalize_siret(siret):
+    """Keeps digits only. Returns None if the value cannot be a SIREN/SIRET."""
+    if not siret:
+        return None
+    # Cleaning: remove spaces or non-digits
+    clean_siret = "".join(filter(str.isdigit, str(siret))).strip()
+    if not clean_siret or len(clean_siret) < 9:
+        return None
+    return clean_siret
+
+def read_cached_info(clean_siret, cache=None):
+    """
+    Reads a cache row. Returns None when missing or when it is an old entry
+    lacking the contact fields (it must then be refreshed from the API).
+    """
+    res = (cache or get_pappers_cache()).get(clean_siret)
+    if res is not None:
+        # If crucial new fields are missing (None or empty), we might want to re-fetch or just return
+        # Let's check if 'telephone' is present and not None. If it is None, it means it's an old cache entry
+        if res.get('telephone') is not None or res.get('email') is not None:
+            return res
+    return None
 
-def get_syndic_info(siret):
+def read_cached_infos(sirets, cache=None):
+    """
+    Batch cache read for many SIRETs (latest row per SIRET, one query per backend).
+    Returns: dict -> {clean_siret: cache row dict}
+    """
+    clean = {s for s in (normalize_siret(x) for x in sirets) if s}
+    if not clean:
+        return {}
+    return (cache or get_pappers_cache()).get_many(clean)
+
+def compress_payload(data):
+    """Pappers JSON answer -> gzip + base64 text for the raw_payload column."""
+    raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.b64encode(gzip.compress(raw)).decode("ascii")
+
+def decompress_payload(blob):
+    return json.loads(gzip.decompress(base64.b64decode(blob)))
+
+def cache_row(result, data):
+    """Cache row for an API answer: the extracted fields plus the archived payload."""
+    return {**result, RAW_PAYLOAD_COLUMN: compress_payload(data)}
+
+def extract_pappers_fields(data, clean_siret):
+    """Maps a Pappers v2 /entreprise payload to the cache row format."""
+    result = {
+        "siret": clean_siret,
+        "denomination": data.get("denomination", ""),
+        "nom_dirigeant": "",
+        "prenom_dirigeant": "",
+        "code_ape": data.get("code_naf", ""),
+        "ca_annuel": 0.0,
+        "derniere_maj_pappers": datetime.now().isoformat(),
+        # NEW FIELDS
+        "sites_internet": ", ".join(data.get("sites_internet", [])) if isinstance(data.get("sites_internet"), list) else (data.get("siege", {}).get("site_internet", "")),
+        "telephone": data.get("telephone", "") or data.get("siege", {}).get("telephone", ""),
+        "email": data.get("email", "") or data.get("siege", {}).get("email", ""),
+        "lien_linkedin": data.get("lien_linkedin", ""),
+        "categorie_entreprise": data.get("categorie_entreprise", "")
+    }
+    
+    # Extract Leader
+    representants = data.get("representants", [])
+    if representants:
+        first_rep = representants[0]
+        result["nom_dirigeant"] = first_rep.get("nom", "") or first_rep.get("nom_complet", "")
+        result["prenom_dirigeant"] = first_rep.get("prenom", "")
+    
+    # Extract Financials
+    finances = data.get("finances", [])
+    if finances:
+        result["ca_annuel"] = float(finances[0].get("chiffre_affaires") or 0)
+    return result
+
+def get_syndic_info(siret, wait_for_quota=True, refresh=False):
     """
     Retrieves syndic information using a 'Cache-Aside' strategy.
     1. Checks the BigQuery cache table (rnic.cache_pappers).
     2. If missing or incomplete (e.g., missing phone/email), calls the Pappers API.
     3. Updates the cache with the fresh API data.
     
+    API calls go through the shared Pappers rate limiter (core.rate_limiter).
+    
     Args:
         siret (str): The French SIRET number of the syndic.
+        wait_for_quota (bool): Wait for a rate-limit token (True) or fail fast (False).
+        refresh (bool): Skip the cache lookup and re-fetch from the API (stale entries).
     Returns:
         dict: A dictionary containing legal info (dirigeant, CA, contact details).
     """
-    if not siret:
-        return None
-        
-    # Cleaning: remove spaces or non-digits
-    clean_siret = "".join(filter(str.isdigit, str(siret))).strip()
-    if not clean_siret or len(clean_siret) < 9:
+    clean_siret = normalize_siret(siret)
+    if not clean_siret:
         return None
 
-    client = get_bigquery_client()
+    cache = get_pappers_cache()
     
     # 1. Check Cache
     try:
-        query = f"SELECT * FROM `{CACHE_TABLE}` WHERE siret = '{clean_siret}' LIMIT 1"
-        df = client.query(query).to_dataframe()
-        if not df.empty:
-            res = df.iloc[0].to_dict()
-            # If crucial new fields are missing (None or empty), we might want to re-fetch or just return
-            # Let's check if 'telephone' is present and not None. If it is None, it means it's an old cache entry
-            if res.get('telephone') is not None or res.get('email') is not None:
-                return res
-            # Otherwise, we continue to API to "refresh" this entry
+        res = None if refresh else read_cached_info(clean_siret, cache)
+        if res is not None:
+            return res
+        # Otherwise, we continue to API to "refresh" this entry
     except Exception as e:
         st.warning(f"⚠️ Cache lookup error: {e}")
 
@@ -103,47 +211,28 @@ def get_syndic_info(siret):
     if not api_key:
         return {"nom_dirigeant": "Clé Manquante", "ca_annuel": None}
 
+    try:
+        acquire("pappers", wait=wait_for_quota)
+    except QuotaExceeded as e:
+        st.warning(f"⏳ Quota Pappers du jour épuisé ({e.used}/{e.budget} crédits)")
+        return None
+    except RateLimitExceeded as e:
+        st.warning(f"⏳ Limite Pappers atteinte, réessayez dans {e.retry_after:.0f}s")
+        return None
+
     try:
         # Pappers API v2
-        url = "https://api.pappers.fr/v2/entreprise/"
         params = {"siret": clean_siret, "api_token": api_key}
-        response = requests.get(url, params=params, timeout=10)
+        response = requests.get(PAPPERS_API_URL, params=params, timeout=10)
         
         if response.status_code == 200:
-            data = response.json()
-            
             # Extract relevant fields
-            result = {
-                "siret": clean_siret,
-                "denomination": data.get("denomination", ""),
-                "nom_dirigeant": "",
-                "prenom_dirigeant": "",
-                "code_ape": data.get("code_naf", ""),
-                "ca_annuel": 0.0,
-                "derniere_maj_pappers": datetime.now().isoformat(),
-                # NEW FIELDS
-                "sites_internet": ", ".join(data.get("sites_internet", [])) if isinstance(data.get("sites_internet"), list) else (data.get("siege", {}).get("site_internet", "")),
-                "telephone": data.get("telephone", "") or data.get("siege", {}).get("telephone", ""),
-                "email": data.get("email", "") or data.get("siege", {}).get("email", ""),
-                "lien_linkedin": data.get("lien_linkedin", ""),
-                "categorie_entreprise": data.get("categorie_entreprise", "")
-            }
-            
-            # Extract Leader
-            representants = data.get("representants", [])
-            if representants:
-                first_rep = representants[0]
-                result["nom_dirigeant"] = first_rep.get("nom", "") or first_rep.get("nom_complet", "")
-                result["prenom_dirigeant"] = first_rep.get("prenom", "")
-            
-            # Extract Financials
-            finances = data.get("finances", [])
-            if finances:
-                result["ca_annuel"] = float(finances[0].get("chiffre_affaires") or 0)
+            data = response.json()
+            result = extract_pappers_fields(data, clean_siret)
 
-            # 3. Update Cache
+            # 3. Update Cache (with the raw answer, so new fields never need a new call)
             try:
-                client.insert_rows_json(CACHE_TABLE, [result])
+                cache.put(cache_row(result, data))
             except Exception as e:
                 st.info(f"💡 Info: Cache update failed ({e})")
                 
@@ -151,6 +240,9 @@ def get_syndic_info(siret):
             
         elif response.status_code == 404:
             return {"nom_dirigeant": "Non trouvé", "ca_annuel": 0}
+        elif response.status_code == 429:
+            record_throttle("pappers", parse_retry_after(response))
+            st.error("❌ Erreur API Pappers: 429 - trop de requêtes, nouvel essai différé")
         else:
             st.error(f"❌ Erreur API Pappers: {response.status_code} - {response.text}")
             
@@ -158,3 +250,105 @@ def get_syndic_info(siret):
         st.error(f"❌ Erreur de connexion API: {e}")
         
     return None
+
+def rederive_rows(rows, columns):
+    """
+    Re-extracts `columns` of cache rows from their archived payload.
+    Returns: list of updated rows (rows without a readable payload are left out)
+    """
+    updated = []
+    for row in rows:
+        blob = row.get(RAW_PAYLOAD_COLUMN)
+        if not blob:
+            continue
+        try:
+            fields = extract_pappers_fields(decompress_payload(blob), row["siret"])
+        except (ValueError, OSError) as e:
+            logger.warning(f"Unreadable Pappers payload for {row.get('siret')}: {e}")
+            continue
+        updated.append({**row, **{c: fields[c] for c in columns}})
+    return updated
+
+def _sql_literal(value, col):
+    if value is None:
+        return f"CAST(NULL AS {'FLOAT64' if col == 'ca_annuel' else 'STRING'})"
+    if col == "ca_annuel":
+        return repr(float(value))
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+def _backfill_bigquery(columns, only_missing, batch_size, report):
+    """Latest row per SIRET with a payload -> re-derived locally -> one UPDATE ... FROM per batch."""
+    client = get_bigquery_client()
+    missing = " OR ".join(f"{c} IS NULL" for c in columns) if only_missing else "TRUE"
+    query = f"""
+        SELECT siret, {RAW_PAYLOAD_COLUMN} FROM (
+            SELECT siret, {RAW_PAYLOAD_COLUMN}, {", ".join(columns)} FROM `{CACHE_TABLE}`
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY siret ORDER BY derniere_maj_pappers DESC) = 1
+        )
+        WHERE {RAW_PAYLOAD_COLUMN} IS NOT NULL AND ({missing})
+    """
+    rows = client.query(query).to_dataframe().to_dict("records")
+    report["scanned"] += len(rows)
+    updated = rederive_rows(rows, columns)
+    report["skipped"] += len(rows) - len(updated)
+
+    assignments = ", ".join(f"{c} = s.{c}" for c in columns)
+    for start in range(0, len(updated), batch_size):
+        batch = updated[start:start + batch_size]
+        source = " UNION ALL ".join(
+            "SELECT " + ", ".join([f"{_sql_literal(r['siret'], 'siret')} AS siret"] + [f"{_sql_literal(r[c], c)} AS {c}" for c in columns])
+            for r in batch
+        )
+        try:
+            client.query(f"UPDATE `{CACHE_TABLE}` t SET {assignments} FROM ({source}) s WHERE t.siret = s.siret").result()
+            report["updated"] += len(batch)
+        except Exception as e:
+            # e.g. rows still in the streaming buffer: the batch is retried on the next run
+            logger.warning(f"Pappers backfill batch failed: {e}")
+            report["failed"] += len(batch)
+
+def backfill_from_payloads(columns=None, only_missing=True, batch_size=BACKFILL_BATCH_SIZE):
+    """
+    Fills cache columns from the archived Pappers answers instead of calling the API,
+    e.g. after init_cache_table added a field. Only rows with one of `columns` NULL are
+    touched unless `only_missing` is False. BigQuery backends are updated in place with
+    set-based UPDATEs (the write-through local copy is then cleared and refills on read);
+    the local backend rewrites its rows.
+    Returns: dict -> scanned, updated, skipped (no payload), failed row counts
+    """
+    columns = list(columns or DERIVED_COLUMNS)
+    unknown = set(columns) - set(DERIVED_COLUMNS)
+    if unknown:
+        raise ValueError(f"Columns not derived from Pappers payloads: {sorted(unknown)}")
+
+    report = {"scanned": 0, "updated": 0, "skipped": 0, "failed": 0}
+    cache = get_pappers_cache()
+    if cache.uses_bigquery:
+        _backfill_bigquery(columns, only_missing, batch_size, report)
+        if hasattr(cache, "clear"):
+            cache.clear()
+        return report
+
+    for rows in cache.scan(batch_size):
+        if only_missing:
+            rows = [r for r in rows if any(r.get(c) is None for c in columns)]
+        updated = rederive_rows(rows, columns)
+        cache.put_many(updated)
+        report["scanned"] += len(rows)
+        report["updated"] += len(updated)
+        report["skipped"] += len(rows) - len(updated)
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-derive Pappers cache columns from the archived API answers (no API call).")
+    parser.add_argument("--columns", nargs="+", choices=DERIVED_COLUMNS, help="Columns to fill (default: every derived column)")
+    parser.add_argument("--all", action="store_true", help="Rewrite every row, not only rows with a missing value")
+    args = parser.parse_args(argv)
+
+    init_cache_table()
+    report = backfill_from_payloads(args.columns, only_missing=not args.all)
+    print(f"scanned: {report['scanned']}  updated: {report['updated']}  without payload: {report['skipped']}  failed: {report['failed']}")
+    return 1 if report["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from core.tracing import span, logger
+
+# Configuration
+PREFETCH_WORKERS = 4        # Shared by every session of the process
+PREFETCH_SESSION_CAP = 10   # Max syndics warmed per session and result list
+PREFETCH_TOP_N = 5          # Rows of the result table warmed while the rep reads it
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Process-wide bounded pool, so prefetching never grows with the number of sessions."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+        return _executor
+
+
+class Prefetcher:
+    """
+    Per-session prefetch state. Tasks only warm caches (st.cache_data loaders,
+    BigQuery/Pappers caches); the page reads results back through those caches.
+
+    A prefetcher is bound to a filter signature: when the filters change, `bind`
+    cancels queued work and running tasks stop before their next stage.
+    """
+
+    def __init__(self, cap=PREFETCH_SESSION_CAP):
+        self.cap = cap
+        self.signature = None
+        self._generation = 0
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def bind(self, signature):
+        """Attaches the prefetcher to a filter set, cancelling everything from a previous one."""
+        if signature != self.signature:
+            self.cancel()
+            self.signature = signature
+
+    def cancel(self):
+        with self._lock:
+            self._generation += 1
+            for future in self._futures.values():
+                future.cancel()
+            self._futures.clear()
+
+    def submit(self, key, tasks):
+        """
+        Queues `tasks` (list of (stage, callable)) for `key`, run in order by one worker.
+        Returns False when the key is already queued or the session cap is reached.
+        """
+        with self._lock:
+            if key in self._futures or len(self._futures) >= self.cap:
+                return False
+            generation = self._generation
+            self._futures[key] = get_executor().submit(self._run, generation, key, tasks)
+            return True
+
+    def _run(self, generation, key, tasks):
+        for stage, task in tasks:
+            if generation != self._generation:
+                return
+            with span(f"prefetch_{stage}", key=key) as s:
+                try:
+                    task()
+                except Exception as e:
+                    s.set(outcome="error", error=str(e)[:200])
+                    logger.debug(f"Prefetch {stage} failed for {key}: {e}")
+
+    def status(self):
+        """Returns: dict -> queued, running, done counts for the current generation."""
+        with self._lock:
+            futures = list(self._futures.values())
+        done = sum(1 for f in futures if f.done())
+        running = sum(1 for f in futures if f.running())
+        return {"queued": len(futures) - done - running, "running": running, "done": done}
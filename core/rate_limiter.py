@@ -0,0 +1,222 @@
+import os
+import time
+import asyncio
+import sqlite3
+from datetime import date
+
+# Configuration
+LIMITER_DB = os.environ.get("CEE_LIMITER_DB", os.path.join(".cee_cache", "rate_limiter.sqlite"))
+
+# Per-upstream token buckets and daily credit budgets.
+# rate_per_sec: sustained call rate, burst: bucket capacity, daily_credits: paid credits per calendar day
+RATE_LIMITS = {
+    "pappers": {"rate_per_sec": 5.0, "burst": 10, "daily_credits": int(os.environ.get("PAPPERS_DAILY_CREDITS", 2000))},
+    "apollo": {"rate_per_sec": 1.0, "burst": 5, "daily_credits": int(os.environ.get("APOLLO_DAILY_CREDITS", 600))},
+}
+
+
+class RateLimitExceeded(Exception):
+    """No token became available within the allowed wait (or fail-fast was requested)."""
+
+    def __init__(self, upstream, retry_after):
+        super().__init__(f"Rate limit reached for {upstream}, retry in {retry_after:.1f}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class QuotaExceeded(RateLimitExceeded):
+    """The daily credit budget of an upstream is spent."""
+
+    def __init__(self, upstream, used, budget):
+        Exception.__init__(self, f"Daily quota exhausted for {upstream} ({used}/{budget} credits)")
+        self.upstream = upstream
+        self.retry_after = None
+        self.used = used
+        self.budget = budget
+
+
+def _connect():
+    """
+    Opens the shared limiter database. SQLite file locking makes the buckets
+    consistent across every Streamlit process and CLI job on the host.
+    """
+    folder = os.path.dirname(LIMITER_DB)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    conn = sqlite3.connect(LIMITER_DB, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS buckets (
+            upstream TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS usage (
+            upstream TEXT NOT NULL,
+            day TEXT NOT NULL,
+            calls INTEGER NOT NULL DEFAULT 0,
+            credits INTEGER NOT NULL DEFAULT 0,
+            throttled INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (upstream, day)
+        )
+    """)
+    return conn
+
+
+def _refill(conn, upstream, now):
+    """Returns the current token count of a bucket after time-based refill."""
+    limits = RATE_LIMITS[upstream]
+    row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE upstream = ?", (upstream,)).fetchone()
+    if row is None:
+        return float(limits["burst"])
+    tokens, updated_at = row
+    return min(float(limits["burst"]), tokens + (now - updated_at) * limits["rate_per_sec"])
+
+
+def _credits_used(conn, upstream, day):
+    row = conn.execute("SELECT credits FROM usage WHERE upstream = ? AND day = ?", (upstream, day)).fetchone()
+    return row[0] if row else 0
+
+
+def acquire(upstream, credits=1, wait=True, timeout=30.0):
+    """
+    Takes one token from the upstream bucket and charges `credits` to today's budget.
+
+    Args:
+        upstream (str): Key of RATE_LIMITS ('pappers', 'apollo').
+        credits (int): Paid credits consumed by the call.
+        wait (bool): Sleep until a token is available (True) or fail fast (False).
+        timeout (float): Maximum total wait in seconds.
+    Returns:
+        float: Seconds spent waiting for a token.
+    Raises:
+        QuotaExceeded: The daily budget would be exceeded.
+        RateLimitExceeded: No token available in time.
+    """
+    limits = RATE_LIMITS[upstream]
+    started = time.monotonic()
+
+    while True:
+        conn = _connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            day = date.today().isoformat()
+            used = _credits_used(conn, upstream, day)
+            if used + credits > limits["daily_credits"]:
+                conn.execute("ROLLBACK")
+                raise QuotaExceeded(upstream, used, limits["daily_credits"])
+
+            tokens = _refill(conn, upstream, now)
+            if tokens >= 1:
+                conn.execute(
+                    "INSERT OR REPLACE INTO buckets (upstream, tokens, updated_at) VALUES (?, ?, ?)",
+                    (upstream, tokens - 1, now)
+                )
+                conn.execute("""
+                    INSERT INTO usage (upstream, day, calls, credits) VALUES (?, ?, 1, ?)
+                    ON CONFLICT(upstream, day) DO UPDATE SET calls = calls + 1, credits = credits + excluded.credits
+                """, (upstream, day, credits))
+                conn.execute("COMMIT")
+                return time.monotonic() - started
+
+            conn.execute("ROLLBACK")
+            retry_after = (1 - tokens) / limits["rate_per_sec"]
+        finally:
+            conn.close()
+
+        if not wait or (time.monotonic() - started) + retry_after > timeout:
+            raise RateLimitExceeded(upstream, retry_after)
+        time.sleep(retry_after)
+
+
+async def acquire_async(upstream, credits=1, wait=True, timeout=30.0, executor=None):
+    """
+    Async counterpart of `acquire`: the SQLite transaction runs on `executor` (the
+    caller's blocking pool; the loop's default executor when None) and waiting uses
+    asyncio.sleep, so the event loop is never blocked.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    while True:
+        try:
+            await loop.run_in_executor(executor, acquire, upstream, credits, False)
+            return loop.time() - started
+        except QuotaExceeded:
+            raise
+        except RateLimitExceeded as e:
+            if not wait or (loop.time() - started) + e.retry_after > timeout:
+                raise
+            await asyncio.sleep(e.retry_after)
+
+
+def record_throttle(upstream, retry_after=None):
+    """
+    Registers a 429 from the provider. The bucket is drained (and pushed into debt
+    for `retry_after` seconds) so every process backs off, not only the caller.
+    """
+    limits = RATE_LIMITS[upstream]
+    penalty = float(retry_after) if retry_after else 1.0 / limits["rate_per_sec"]
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "INSERT OR REPLACE INTO buckets (upstream, tokens, updated_at) VALUES (?, ?, ?)",
+            (upstream, -penalty * limits["rate_per_sec"], time.time())
+        )
+        conn.execute("""
+            INSERT INTO usage (upstream, day, throttled) VALUES (?, ?, 1)
+            ON CONFLICT(upstream, day) DO UPDATE SET throttled = throttled + 1
+        """, (upstream, date.today().isoformat()))
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+
+def parse_retry_after(response):
+    """Reads the Retry-After header (seconds) of a 429 response, if any."""
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def quota_status():
+    """
+    Returns today's usage per upstream.
+    Returns: list of dict -> upstream, calls, credits_used, daily_credits, remaining, throttled, tokens
+    """
+    conn = _connect()
+    try:
+        now = time.time()
+        day = date.today().isoformat()
+        status = []
+        for upstream, limits in RATE_LIMITS.items():
+            row = conn.execute(
+                "SELECT calls, credits, throttled FROM usage WHERE upstream = ? AND day = ?", (upstream, day)
+            ).fetchone()
+            calls, credits, throttled = row if row else (0, 0, 0)
+            status.append({
+                "upstream": upstream,
+                "day": day,
+                "calls": calls,
+                "credits_used": credits,
+                "daily_credits": limits["daily_credits"],
+                "remaining": max(0, limits["daily_credits"] - credits),
+                "throttled": throttled,
+                "tokens": round(_refill(conn, upstream, now), 2),
+            })
+        return status
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    # Usage: python -m core.rate_limiter
+    for s in quota_status():
+        print(
+            f"{s['upstream']:<10} {s['credits_used']:>6}/{s['daily_credits']:<6} credits "
+            f"(remaining {s['remaining']}, calls {s['calls']}, 429s {s['throttled']}, tokens {s['tokens']})"
+        )
@@ -0,0 +1,150 @@
+import threading
+from core.data_manager import (
+    fetch_aggregated_syndics, fetch_copro_rows, build_filter_clause, filter_mask,
+    aggregate_syndics, PERIOD_MAPPING, COPRO_FILTER_COLUMNS,
+)
+from core.copro_snapshot import prepare_snapshot
+from core.result_store import get_result_store, query_key
+from core.prefetch import get_executor
+from core.tracing import span, logger
+
+# Configuration
+REFINE_MAX_ROWS = 300_000   # Larger searches are not kept as copro rows (aggregate query only)
+REFINE_MAX_BASES = 8        # Cached row sets per process (stored in the result store)
+REFINE_CATEGORY_COLUMNS = [
+    "raison_sociale_du_representant_legal", "siret_du_representant_legal",
+    "periode_de_construction", "code_officiel_departement", "commune",
+    "code_qp_2024", "nom_qp_2024",
+]
+
+_bases = []       # [(normalized filters, result store key)], most recent last
+_pending = set()  # normalized filters whose rows are being loaded
+_lock = threading.Lock()
+
+
+def normalize_filters(climate_zones, min_lots, max_lots, periods=None, exclude_big_syndics=False, qpv_only=False):
+    """
+    Filters in the form build_filter_clause applies them: None means "no condition"
+    for zones and periods, periods are DB values.
+    Returns: (zones, min_lots, max_lots, db_periods, exclude_big, qpv_only)
+    """
+    db_periods = sorted({v for p in (periods or []) for v in PERIOD_MAPPING.get(p, [])})
+    return (
+        tuple(sorted(climate_zones)) if climate_zones else None,
+        int(min_lots), int(max_lots),
+        tuple(db_periods) or None,
+        bool(exclude_big_syndics), bool(qpv_only),
+    )
+
+
+def filters_contain(outer, inner):
+    """True when every copro matching `inner` also matches `outer` (normalized filters)."""
+    zones_o, min_o, max_o, periods_o, big_o, qpv_o = outer
+    zones_i, min_i, max_i, periods_i, big_i, qpv_i = inner
+    return (
+        (zones_o is None or (zones_i is not None and set(zones_i) <= set(zones_o)))
+        and min_o <= min_i and max_i <= max_o
+        and (periods_o is None or (periods_i is not None and set(periods_i) <= set(periods_o)))
+        and (not big_o or big_i)
+        and (not qpv_o or qpv_i)
+    )
+
+
+def compact_base_rows(df):
+    """Prepared copro rows with repetitive text as categoricals (a few dozen bytes per row)."""
+    df = prepare_snapshot(df)
+    for col in REFINE_CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    for col in ("lat", "long"):
+        df[col] = df[col].astype('float32')
+    return df
+
+
+def find_base(norm):
+    """
+    Smallest fresh cached row set whose filters contain `norm`, or None. Bases older
+    than the store TTL (or expired by a data sync) are forgotten, so the search goes
+    back to BigQuery and reloads them, as aggregate results do.
+    """
+    store = get_result_store()
+    with _lock:
+        candidates = [(n, k) for n, k in _bases if filters_contain(n, norm)]
+    best = None
+    for n, key in candidates:
+        rows = store.get_fresh(key)
+        if rows is None:
+            # Evicted or expired: forget it
+            with _lock:
+                if (n, key) in _bases:
+                    _bases.remove((n, key))
+            continue
+        if best is None or len(rows) < len(best):
+            best = rows
+    return best
+
+
+def load_base(filters, norm):
+    """Pulls the copro rows matching `filters` and registers them as a refinement base."""
+    try:
+        with span("refine_base_load") as s:
+            where_clause, _ = build_filter_clause(**filters)
+            rows = fetch_copro_rows(
+                COPRO_FILTER_COLUMNS,
+                f"raison_sociale_du_representant_legal IS NOT NULL AND {where_clause}",
+                limit=REFINE_MAX_ROWS + 1,
+            )
+            if rows.empty or len(rows) > REFINE_MAX_ROWS:
+                s.set(outcome="skipped", rows=len(rows))
+                return
+            rows = compact_base_rows(rows)
+            key = query_key("copro_rows", *norm)
+            get_result_store().put(key, rows)
+            s.set(rows=len(rows))
+            with _lock:
+                # A wider base makes the ones it contains redundant
+                _bases[:] = [(n, k) for n, k in _bases if not filters_contain(norm, n)]
+                _bases.append((norm, key))
+                del _bases[:-REFINE_MAX_BASES]
+    except Exception as e:
+        logger.warning(f"Refinement base load failed: {e}")
+    finally:
+        with _lock:
+            _pending.discard(norm)
+
+
+def clear_bases():
+    """Forgets every refinement base (the copro rows changed, e.g. after a delta sync)."""
+    with _lock:
+        _bases.clear()
+
+
+def fetch_syndics_refined(climate_zones, min_lots, max_lots, periods=None, exclude_big_syndics=False, qpv_only=False, raise_errors=False):
+    """
+    Same result as fetch_aggregated_syndics. When the filters narrow a previous search
+    whose copro rows are cached, the rows are filtered (filter_mask) and re-aggregated
+    locally; otherwise BigQuery answers and the rows of this search are loaded in the
+    background, so the next narrowing step stays local. `raise_errors`: see
+    fetch_aggregated_syndics.
+    """
+    filters = dict(
+        climate_zones=climate_zones, min_lots=min_lots, max_lots=max_lots,
+        periods=periods, exclude_big_syndics=exclude_big_syndics, qpv_only=qpv_only,
+    )
+    norm = normalize_filters(**filters)
+    base = find_base(norm)
+    if base is not None:
+        with span("refine_local", base_rows=len(base)) as s:
+            rows = base[filter_mask(base, **filters)]
+            s.set(matches=len(rows))
+            return aggregate_syndics(rows)
+
+    df = fetch_aggregated_syndics(**filters, raise_errors=raise_errors)
+    # nb_copros of the top syndics is a lower bound of the row count
+    if not df.empty and df['nb_copros'].sum() <= REFINE_MAX_ROWS:
+        with _lock:
+            schedule = norm not in _pending
+            _pending.add(norm)
+        if schedule:
+            get_executor().submit(load_base, filters, norm)
+    return df
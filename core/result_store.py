@@ -0,0 +1,266 @@
+import os
+import sys
+import time
+import uuid
+import weakref
+import threading
+from collections import OrderedDict
+from core.tracing import span, logger
+
+# Configuration
+RESULT_STORE_MAX_MB = float(os.environ.get("CEE_RESULT_STORE_MB", 512))  # Budget for all shared results of the process
+RESULT_TTL_SECONDS = 3600  # Same freshness as the former st.cache_data loaders
+SESSION_MEMORY_BUDGET_MB = 64  # Expected ceiling of what one session references (search list + detail frame)
+
+
+def query_key(kind, *args):
+    """
+    Hashable identity of a query: kind + normalized arguments (lists become sorted
+    tuples so ['H1', 'H2'] and ['H2', 'H1'] share one entry).
+    """
+    def norm(value):
+        if isinstance(value, (list, set)):
+            return tuple(sorted(norm(v) for v in value))
+        if isinstance(value, tuple):
+            return tuple(norm(v) for v in value)
+        return value
+    return (kind,) + tuple(norm(a) for a in args)
+
+
+def estimate_bytes(value):
+    """Deep memory footprint of a DataFrame/Series, shallow size otherwise."""
+    usage = getattr(value, "memory_usage", None)
+    if usage is not None:
+        try:
+            total = usage(deep=True)
+            return int(total.sum()) if hasattr(total, "sum") else int(total)
+        except TypeError:
+            pass
+    return sys.getsizeof(value)
+
+
+class _Entry:
+    __slots__ = ("value", "nbytes", "holders", "created_at", "last_access", "hits")
+
+    def __init__(self, value):
+        self.value = value
+        self.nbytes = estimate_bytes(value)
+        self.holders = set()
+        self.created_at = time.time()
+        self.last_access = self.created_at
+        self.hits = 0
+
+
+class SessionRef:
+    """
+    Token identifying one session in the store (kept in st.session_state). When the
+    session is dropped and the token garbage-collected, its references are released.
+    """
+
+    def __init__(self, store):
+        self.id = uuid.uuid4().hex
+        weakref.finalize(self, store.release_holder, self.id)
+
+
+class ResultStore:
+    """
+    Process-wide, memory-bounded store of query results shared by every session.
+
+    Values are stored once and handed out by reference, so they must be treated
+    as read-only (derive new frames instead of modifying them in place). Sessions
+    hold references per slot ('syndic_list', 'selected_syndic_data'...): only
+    entries no session references are evicted (least recently used first) when
+    the budget is exceeded. Concurrent requests for the same key run the loader once.
+    """
+
+    def __init__(self, max_bytes=RESULT_STORE_MAX_MB * 1024 * 1024, ttl=RESULT_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._slots = {}  # holder id -> {slot: key}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    def _fresh(self, entry, now):
+        if not entry.created_at:
+            return False  # expire()d
+        return self.ttl is None or now - entry.created_at < self.ttl
+
+    def get(self, key, default=None):
+        """Stored value of `key` (even if expired, so held results stay readable), or `default`."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            entry.last_access = time.time()
+            entry.hits += 1
+            self._entries.move_to_end(key)
+            return entry.value
+
+    def get_fresh(self, key, default=None):
+        """Value of `key` if stored and not expired (TTL or expire()), else `default`."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not self._fresh(entry, time.time()):
+                return default
+            entry.last_access = time.time()
+            entry.hits += 1
+            self._entries.move_to_end(key)
+            return entry.value
+
+    def get_or_load(self, key, loader):
+        """
+        Returns the fresh value of `key`, running `loader()` when missing or expired.
+        Only one caller loads a given key; the others wait for its result. A loader
+        that raises stores nothing (the error propagates and the next call retries),
+        so loaders must raise on failure rather than return an empty placeholder.
+        """
+        while True:
+            with self._lock:
+                now = time.time()
+                entry = self._entries.get(key)
+                if entry is not None and self._fresh(entry, now):
+                    entry.last_access = now
+                    entry.hits += 1
+                    self._entries.move_to_end(key)
+                    return entry.value
+                pending = self._inflight.get(key)
+                if pending is None:
+                    pending = self._inflight[key] = threading.Event()
+                    break
+            pending.wait()
+            # Loop: the loader either stored the value or failed (then we try ourselves)
+
+        try:
+            with span("result_store_load", kind=key[0] if isinstance(key, tuple) else str(key)) as s:
+                value = loader()
+                s.set(bytes=estimate_bytes(value))
+            self.put(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            pending.set()
+
+    def put(self, key, value):
+        with self._lock:
+            entry = _Entry(value)
+            entry.holders = {h for h, slots in self._slots.items() if key in slots.values()}
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self.loads += 1
+            self._evict(keep=key)
+
+    def expire(self, kinds):
+        """
+        Marks every entry of the given query kinds as expired: values stay readable
+        for the sessions holding them, the next get_or_load reloads them.
+        Returns: number of expired entries
+        """
+        kinds = set(kinds)
+        with self._lock:
+            expired = [e for k, e in self._entries.items() if isinstance(k, tuple) and k[0] in kinds]
+            for entry in expired:
+                entry.created_at = 0
+            return len(expired)
+
+    def hold(self, holder, slot, key):
+        """Makes `holder` reference `key` in `slot`, releasing what the slot referenced before."""
+        with self._lock:
+            slots = self._slots.setdefault(holder, {})
+            previous = slots.get(slot)
+            slots[slot] = key
+            if previous is not None and previous != key:
+                self._drop_reference(holder, previous)
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.holders.add(holder)
+
+    def release(self, holder, slot):
+        with self._lock:
+            key = self._slots.get(holder, {}).pop(slot, None)
+            if key is not None:
+                self._drop_reference(holder, key)
+            self._evict()
+
+    def release_holder(self, holder):
+        """Drops every reference of a session (called when its SessionRef is collected)."""
+        with self._lock:
+            for key in self._slots.pop(holder, {}).values():
+                self._drop_reference(holder, key)
+            self._evict()
+
+    def _drop_reference(self, holder, key):
+        # A holder may reference one key from several slots
+        if key in self._slots.get(holder, {}).values():
+            return
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.holders.discard(holder)
+
+    def _evict(self, keep=None):
+        """
+        Evicts unreferenced entries, least recently used first, until under budget
+        (`keep`: a value just loaded, about to be referenced by its caller).
+        """
+        total = sum(e.nbytes for e in self._entries.values())
+        if total <= self.max_bytes:
+            return
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            entry = self._entries[key]
+            if entry.holders or key == keep:
+                continue
+            total -= entry.nbytes
+            del self._entries[key]
+            self.evictions += 1
+        if total > self.max_bytes:
+            logger.warning(f"Result store over budget: {total / 1e6:.0f} MB held by active sessions")
+
+    def memory_report(self):
+        """
+        Returns: dict -> totals (entries, bytes, budget, sessions, loads, evictions),
+        the largest per-session footprint, sessions above SESSION_MEMORY_BUDGET_MB
+        and one row per entry (kind, key, MB, references, hits, age).
+        """
+        now = time.time()
+        with self._lock:
+            rows = [{
+                "kind": key[0] if isinstance(key, tuple) else str(key),
+                "key": repr(key[1:] if isinstance(key, tuple) else key)[:120],
+                "mb": round(e.nbytes / 1e6, 2),
+                "refs": len(e.holders),
+                "hits": e.hits,
+                "age_min": round((now - e.created_at) / 60, 1),
+            } for key, e in self._entries.items()]
+            session_bytes = {
+                holder: sum(self._entries[k].nbytes for k in set(slots.values()) if k in self._entries)
+                for holder, slots in self._slots.items()
+            }
+            return {
+                "entries": len(rows),
+                "mb": round(sum(e.nbytes for e in self._entries.values()) / 1e6, 2),
+                "budget_mb": round(self.max_bytes / 1e6, 2),
+                "sessions": len(self._slots),
+                "max_session_mb": round(max(session_bytes.values(), default=0) / 1e6, 2),
+                "sessions_over_budget": sum(1 for b in session_bytes.values() if b > SESSION_MEMORY_BUDGET_MB * 1e6),
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "rows": rows,
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_result_store():
+    """The process-wide store (shared by every Streamlit session of the server)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ResultStore()
+        return _store
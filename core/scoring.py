@@ -0,0 +1,58 @@
+from core.lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# Configuration
+# CEE potential of one copro = habitation lots x period weight x zone weight x (1 + QPV bonus).
+# Pre-1975 buildings (no thermal regulation) weigh the most; colder zones earn more kWh cumac.
+PERIOD_SCORE_WEIGHTS = {
+    "AVANT_1949": 0.9,
+    "DE_1949_A_1960": 1.0,
+    "DE_1961_A_1974": 1.0,
+    "DE_1975_A_1993": 0.7,
+    "DE_1994_A_2000": 0.4,
+    "DE_2001_A_2010": 0.2,
+    "A_COMPTER_DE_2011": 0.05,
+}
+UNKNOWN_PERIOD_WEIGHT = 0.5
+ZONE_SCORE_WEIGHTS = {"H1": 1.0, "H2": 0.83, "H3": 0.58}
+QPV_SCORE_BONUS = 0.5        # Precarity bonus on works in priority neighbourhoods
+SCORE_LOTS_CAP = 300         # A single very large building should not outweigh a portfolio
+TOP_K_SYNDICS = 1000         # Syndics returned by the aggregate view, best score first
+
+
+def copro_scores(df, zones):
+    """
+    Vectorized CEE potential of copro rows (lots, period, QPV columns as strings or numbers).
+    `zones`: climate zone of each row ('H1', 'H2', 'H3'), aligned on df.index.
+    Returns: pd.Series[float32] aligned on df.index
+    """
+    lots = pd.to_numeric(df['nombre_de_lots_a_usage_d_habitation'], errors='coerce').fillna(0).clip(0, SCORE_LOTS_CAP)
+    period_w = df['periode_de_construction'].astype('object').map(PERIOD_SCORE_WEIGHTS).fillna(UNKNOWN_PERIOD_WEIGHT)
+    zone_w = pd.Series(zones, index=df.index).astype('object').map(ZONE_SCORE_WEIGHTS).fillna(ZONE_SCORE_WEIGHTS["H2"])
+    code_qp, nom_qp = df['code_qp_2024'].astype('object'), df['nom_qp_2024'].astype('object')
+    qpv = ((code_qp.notna() & (code_qp != '')) | (nom_qp.notna() & (nom_qp != ''))).to_numpy()
+    score = lots.to_numpy(dtype="float64") * period_w.to_numpy(dtype="float64") * zone_w.to_numpy(dtype="float64")
+    score = score * np.where(qpv, 1 + QPV_SCORE_BONUS, 1.0)
+    return pd.Series(score.astype("float32"), index=df.index)
+
+
+def score_sql(zone_case):
+    """
+    BigQuery expression of `copro_scores` for one row (same weights, same rounding-free
+    arithmetic), so server-side and local rankings agree.
+    """
+    periods = " ".join(f"WHEN '{p}' THEN {w}" for p, w in PERIOD_SCORE_WEIGHTS.items())
+    zones = " ".join(f"WHEN '{z}' THEN {w}" for z, w in ZONE_SCORE_WEIGHTS.items())
+    return f"""(
+        LEAST(GREATEST(IFNULL(SAFE_CAST(nombre_de_lots_a_usage_d_habitation AS INT64), 0), 0), {SCORE_LOTS_CAP})
+        * (CASE periode_de_construction {periods} ELSE {UNKNOWN_PERIOD_WEIGHT} END)
+        * (CASE ({zone_case}) {zones} ELSE {ZONE_SCORE_WEIGHTS['H2']} END)
+        * (CASE WHEN IFNULL(code_qp_2024, '') != '' OR IFNULL(nom_qp_2024, '') != '' THEN {1 + QPV_SCORE_BONUS} ELSE 1 END)
+    )"""
+
+
+def top_k(df, k=TOP_K_SYNDICS, column="score"):
+    """Best `k` rows by `column` (heap selection, no full sort of the frame)."""
+    return df.nlargest(k, column).reset_index(drop=True)
@@ -0,0 +1,163 @@
+import streamlit as st
+from core.lazy import lazy_import
+from core.copro_snapshot import load_snapshot
+from core.data_manager import filter_mask, aggregate_syndics
+from core.tracing import span
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# Configuration
+BUCKET_DEG = 0.05           # Bucket edge (~5.5 km in latitude)
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = 111.32
+KNN_MAX_RADIUS_KM = 300.0
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Vectorized great-circle distance in km."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def within_radius_mask(df, lat, lon, radius_km):
+    """Rows of a copro frame (lat/long columns) within `radius_km` of a point."""
+    dist = haversine_km(lat, lon, pd.to_numeric(df['lat'], errors='coerce'), pd.to_numeric(df['long'], errors='coerce'))
+    return pd.Series(dist <= radius_km, index=df.index).fillna(False)
+
+
+class SpatialIndex:
+    """
+    Grid-bucket (geohash-like) index over point coordinates.
+
+    Points are sorted by bucket key once; each bucket is a contiguous slice of the
+    sorted positions, so a query only touches the buckets overlapping its box and
+    then refines candidates with vectorized exact tests.
+    """
+
+    def __init__(self, lat, lon, bucket_deg=BUCKET_DEG):
+        self.lat = np.asarray(lat, dtype="float64")
+        self.lon = np.asarray(lon, dtype="float64")
+        self.bucket_deg = bucket_deg
+        self._n_cols = int(np.ceil(360.0 / bucket_deg)) + 1
+
+        positions = np.flatnonzero(~(np.isnan(self.lat) | np.isnan(self.lon)))
+        keys = self._key(*self._cell(self.lat[positions], self.lon[positions]))
+        order = np.argsort(keys, kind="stable")
+        self._sorted_positions = positions[order]
+        uniq, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+        self._buckets = dict(zip(uniq.tolist(), zip(starts.tolist(), counts.tolist())))
+
+    def __len__(self):
+        return len(self._sorted_positions)
+
+    def _cell(self, lat, lon):
+        iy = np.floor((np.asarray(lat) + 90.0) / self.bucket_deg).astype("int64")
+        ix = np.floor((np.asarray(lon) + 180.0) / self.bucket_deg).astype("int64")
+        return iy, ix
+
+    def _key(self, iy, ix):
+        return iy * self._n_cols + ix
+
+    def _candidates(self, min_lat, min_lon, max_lat, max_lon):
+        """Positions of every point in buckets overlapping the box."""
+        iy0, ix0 = self._cell(min_lat, min_lon)
+        iy1, ix1 = self._cell(max_lat, max_lon)
+        slices = []
+        for iy in range(int(iy0), int(iy1) + 1):
+            for ix in range(int(ix0), int(ix1) + 1):
+                bucket = self._buckets.get(iy * self._n_cols + ix)
+                if bucket:
+                    start, count = bucket
+                    slices.append(self._sorted_positions[start:start + count])
+        return np.concatenate(slices) if slices else np.empty(0, dtype="int64")
+
+    def query_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """Returns: positions of points inside the box."""
+        cand = self._candidates(min_lat, min_lon, max_lat, max_lon)
+        lat, lon = self.lat[cand], self.lon[cand]
+        inside = (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+        return cand[inside]
+
+    def query_radius(self, lat, lon, radius_km):
+        """Returns: (positions, distances_km) of points within `radius_km`."""
+        dlat = radius_km / KM_PER_DEG_LAT
+        dlon = radius_km / (KM_PER_DEG_LAT * max(np.cos(np.radians(lat)), 1e-6))
+        cand = self._candidates(lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+        dist = haversine_km(lat, lon, self.lat[cand], self.lon[cand])
+        inside = dist <= radius_km
+        return cand[inside], dist[inside]
+
+    def query_knn(self, lat, lon, k, max_radius_km=KNN_MAX_RADIUS_KM, predicate=None):
+        """
+        k nearest points, optionally restricted to positions accepted by
+        `predicate(positions) -> bool array`. The search radius doubles until k
+        matches are found (the k nearest are then guaranteed inside it).
+        Returns: (positions, distances_km) sorted by distance.
+        """
+        radius = self.bucket_deg * KM_PER_DEG_LAT
+        while True:
+            positions, dist = self.query_radius(lat, lon, radius)
+            if predicate is not None and len(positions):
+                keep = predicate(positions)
+                positions, dist = positions[keep], dist[keep]
+            if len(positions) >= k or radius >= max_radius_km:
+                order = np.argsort(dist, kind="stable")[:k]
+                return positions[order], dist[order]
+            radius = min(radius * 2, max_radius_km)
+
+
+@st.cache_resource(show_spinner=False)
+def get_copro_index():
+    """Process-wide (snapshot, SpatialIndex) pair."""
+    with span("spatial_index_build") as s:
+        snapshot = load_snapshot()
+        index = SpatialIndex(snapshot['lat'].to_numpy(), snapshot['long'].to_numpy())
+        s.set(points=len(index))
+    return snapshot, index
+
+
+def _aggregate_with_distance(rows, limit):
+    agg = aggregate_syndics(rows, limit)
+    nearest = rows.groupby('raison_sociale_du_representant_legal', observed=True)['distance_km'].min()
+    agg['distance_km'] = agg['Syndic'].map(nearest).astype('float64').round(2)
+    return agg
+
+
+def search_syndics_near(lat, lon, radius_km, climate_zones, min_lots, max_lots, periods=None, exclude_big_syndics=False, qpv_only=False, limit=1000):
+    """
+    Syndic aggregates (same columns as fetch_aggregated_syndics + distance_km of the
+    closest matching copro) for copros within `radius_km` that match the usual filters.
+    """
+    snapshot, index = get_copro_index()
+    with span("spatial_radius_search", radius_km=radius_km) as s:
+        positions, dist = index.query_radius(lat, lon, radius_km)
+        rows = snapshot.iloc[positions].assign(distance_km=dist)
+        rows = rows[filter_mask(rows, climate_zones, min_lots, max_lots, periods, exclude_big_syndics, qpv_only)]
+        s.set(candidates=len(positions), matches=len(rows))
+        return _aggregate_with_distance(rows, limit)
+
+
+def search_syndics_in_bbox(min_lat, min_lon, max_lat, max_lon, climate_zones, min_lots, max_lots, periods=None, exclude_big_syndics=False, qpv_only=False, limit=1000):
+    """Syndic aggregates for matching copros inside a bounding box (e.g. around a sales route)."""
+    snapshot, index = get_copro_index()
+    with span("spatial_bbox_search") as s:
+        positions = index.query_bbox(min_lat, min_lon, max_lat, max_lon)
+        rows = snapshot.iloc[positions]
+        rows = rows[filter_mask(rows, climate_zones, min_lots, max_lots, periods, exclude_big_syndics, qpv_only)]
+        s.set(candidates=len(positions), matches=len(rows))
+        return aggregate_syndics(rows, limit)
+
+
+def nearest_copros(lat, lon, k, climate_zones, min_lots, max_lots, periods=None, exclude_big_syndics=False, qpv_only=False):
+    """The k matching copros closest to a point. Returns: snapshot rows + distance_km."""
+    snapshot, index = get_copro_index()
+
+    def matches(positions):
+        rows = snapshot.iloc[positions]
+        return filter_mask(rows, climate_zones, min_lots, max_lots, periods, exclude_big_syndics, qpv_only).to_numpy()
+
+    with span("spatial_knn_search", k=k):
+        positions, dist = index.query_knn(lat, lon, k, predicate=matches)
+        return snapshot.iloc[positions].assign(distance_km=dist.round(2)).reset_index(drop=True)
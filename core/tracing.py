@@ -0,0 +1,235 @@
+import os
+import sys
+import math
+import json
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Configuration
+TRACE_FILE = os.environ.get("CEE_TRACE_FILE", None)  # JSON-lines export, disabled if unset
+TRACE_OTEL = os.environ.get("CEE_TRACE_OTEL", "") == "1"  # Forward spans to OpenTelemetry if installed
+TRACE_BUFFER_SIZE = 5000  # Spans kept in memory for latency reports
+
+logger = logging.getLogger("cee_hunter")
+
+
+class Span:
+    """A single timed stage of a pipeline (cache lookup, API call, search...)."""
+
+    def __init__(self, stage, **attributes):
+        self.stage = stage
+        self.attributes = dict(attributes)
+        self.outcome = "ok"
+        self.upstream_status = None
+        self.started_at = None
+        self.duration_ms = None
+
+    def set(self, outcome=None, upstream_status=None, **attributes):
+        """Updates the span outcome, upstream HTTP status or free-form attributes."""
+        if outcome is not None:
+            self.outcome = outcome
+        if upstream_status is not None:
+            self.upstream_status = upstream_status
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return {
+            "stage": self.stage,
+            "started_at": datetime.fromtimestamp(self.started_at, tz=timezone.utc).isoformat(),
+            "duration_ms": round(self.duration_ms, 3),
+            "outcome": self.outcome,
+            "upstream_status": self.upstream_status,
+            "attributes": self.attributes,
+        }
+
+
+class JsonlSink:
+    """Appends finished spans to a local JSON-lines file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class OpenTelemetrySink:
+    """Replays finished spans into the globally configured OpenTelemetry tracer."""
+
+    def __init__(self, tracer_name="cee_hunter"):
+        from opentelemetry import trace
+        self._tracer = trace.get_tracer(tracer_name)
+
+    def export(self, span):
+        start_ns = int(span.started_at * 1e9)
+        otel_span = self._tracer.start_span(span.stage, start_time=start_ns)
+        otel_span.set_attribute("outcome", span.outcome)
+        if span.upstream_status is not None:
+            otel_span.set_attribute("upstream_status", span.upstream_status)
+        for key, value in span.attributes.items():
+            if isinstance(value, (str, bool, int, float)):
+                otel_span.set_attribute(key, value)
+        otel_span.end(end_time=start_ns + int(span.duration_ms * 1e6))
+
+
+_records = deque(maxlen=TRACE_BUFFER_SIZE)
+_sinks = []
+_lock = threading.Lock()
+_thread_state = threading.local()
+
+
+def configure_tracing(jsonl_path=None, otel=False):
+    """
+    (Re)configures span exporters. Spans are always kept in an in-memory ring buffer;
+    `jsonl_path` and `otel` add a JSON-lines file and an OpenTelemetry exporter.
+    """
+    sinks = []
+    if jsonl_path:
+        sinks.append(JsonlSink(jsonl_path))
+    if otel:
+        try:
+            sinks.append(OpenTelemetrySink())
+        except ImportError:
+            logger.warning("OpenTelemetry export requested but opentelemetry is not installed")
+    with _lock:
+        _sinks[:] = sinks
+
+
+@contextmanager
+def stage_listener(callback):
+    """
+    Calls `callback(span)` for every span finished on the current thread while
+    the block runs (used by background jobs to report per-stage progress).
+    """
+    previous = getattr(_thread_state, "listener", None)
+    _thread_state.listener = callback
+    try:
+        yield
+    finally:
+        _thread_state.listener = previous
+
+
+@contextmanager
+def span(stage, **attributes):
+    """
+    Times a pipeline stage. Exceptions mark the span as 'error' and are re-raised.
+
+    Usage:
+        with span("apollo_people", domain=domain) as s:
+            response = requests.post(...)
+            s.set(upstream_status=response.status_code)
+    """
+    current = Span(stage, **attributes)
+    current.started_at = time.time()
+    t0 = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.set(outcome="error", error=str(e)[:200])
+        raise
+    finally:
+        current.duration_ms = (time.perf_counter() - t0) * 1000
+        _record(current)
+
+
+def _record(finished):
+    with _lock:
+        _records.append(finished.to_dict())
+        sinks = list(_sinks)
+    for sink in sinks:
+        try:
+            sink.export(finished)
+        except Exception as e:
+            logger.warning(f"Trace export failed ({type(sink).__name__}): {e}")
+    listener = getattr(_thread_state, "listener", None)
+    if listener is not None:
+        try:
+            listener(finished)
+        except Exception as e:
+            logger.warning(f"Stage listener failed: {e}")
+    logger.debug(
+        f"{finished.stage} {finished.outcome} in {finished.duration_ms:.1f} ms "
+        f"(status={finished.upstream_status}) {finished.attributes}"
+    )
+
+
+def get_recorded_spans():
+    """Returns a copy of the spans currently held in memory."""
+    with _lock:
+        return list(_records)
+
+
+def load_trace_file(path):
+    """Reads spans back from a JSON-lines export."""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile on an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def latency_report(records=None):
+    """
+    Aggregates spans per stage.
+    Returns: dict -> {stage: {count, p50_ms, p95_ms, max_ms, outcomes}}
+    """
+    if records is None:
+        records = get_recorded_spans()
+
+    by_stage = {}
+    for r in records:
+        by_stage.setdefault(r["stage"], []).append(r)
+
+    report = {}
+    for stage, rows in sorted(by_stage.items()):
+        durations = sorted(r["duration_ms"] for r in rows)
+        outcomes = {}
+        for r in rows:
+            outcomes[r["outcome"]] = outcomes.get(r["outcome"], 0) + 1
+        report[stage] = {
+            "count": len(rows),
+            "p50_ms": _percentile(durations, 50),
+            "p95_ms": _percentile(durations, 95),
+            "max_ms": durations[-1],
+            "outcomes": outcomes,
+        }
+    return report
+
+
+def format_report(report):
+    lines = [f"{'stage':<28}{'count':>8}{'p50 ms':>12}{'p95 ms':>12}{'max ms':>12}  outcomes"]
+    for stage, s in report.items():
+        outcomes = ", ".join(f"{k}={v}" for k, v in sorted(s["outcomes"].items()))
+        lines.append(
+            f"{stage:<28}{s['count']:>8}{s['p50_ms']:>12.1f}{s['p95_ms']:>12.1f}{s['max_ms']:>12.1f}  {outcomes}"
+        )
+    return "\n".join(lines)
+
+
+configure_tracing(jsonl_path=TRACE_FILE, otel=TRACE_OTEL)
+
+
+if __name__ == "__main__":
+    # Usage: python -m core.tracing trace.jsonl
+    if len(sys.argv) != 2:
+        print("Usage: python -m core.tracing <trace.jsonl>")
+        sys.exit(1)
+    print(format_report(latency_report(load_trace_file(sys.argv[1]))))
@@ -0,0 +1,404 @@
+import sys
+import json
+import time
+import hashlib
+import argparse
+from datetime import datetime, timedelta
+from core.lazy import lazy_import
+from core.data_manager import get_bigquery_client, build_filter_clause, DATASET_TABLE
+from core.copro_snapshot import SNAPSHOT_COLUMNS
+from core.delta_sync import fingerprint_sql
+from core.pappers_connector import read_cached_infos, normalize_siret, get_syndic_info
+from core.enrichment_manager import get_enrichment_cache, contacts_of
+from core.cache_backend import get_cache
+from core.tracing import span, logger
+
+pd = lazy_import("pandas")
+
+# Configuration
+WATCHLIST_TABLE = "gen-lang-client-0045947309.rnic.watchlist"
+WATCH_PAPPERS_FIELDS = [
+    "denomination", "nom_dirigeant", "prenom_dirigeant", "code_ape", "ca_annuel",
+    "telephone", "email", "sites_internet", "categorie_entreprise",
+]
+WATCH_QUERY_CHUNK = 500  # Syndic names per IN (...) of the portfolio query
+FEED_LIMIT = 50
+WATCH_PAPPERS_MAX_AGE_DAYS = 7     # Pappers rows older than this are re-fetched by check_watchlist
+WATCH_PAPPERS_REFRESH_LIMIT = 50   # Max Pappers API calls per check_watchlist pass (oldest rows first)
+JSON_FIELDS = ("filters", "pappers_fields", "contact_keys", "changes")
+
+
+def get_watchlist_cache():
+    """Watchlist rows (one per syndic, latest wins) on the configured CACHE_BACKEND."""
+    return get_cache("watchlist", WATCHLIST_TABLE, key="syndic", order_by="updated_at")
+
+
+def init_watchlist_table():
+    """
+    Creates the watchlist table when the backend stores it in BigQuery.
+    Returns: True when the watchlist is usable
+    """
+    if not get_watchlist_cache().uses_bigquery:
+        return True
+    query = f"""
+        CREATE TABLE IF NOT EXISTS `{WATCHLIST_TABLE}` (
+            syndic STRING,
+            siret STRING,
+            filters STRING,
+            active BOOL,
+            followed_at TIMESTAMP,
+            updated_at TIMESTAMP,
+            changed_at TIMESTAMP,
+            nb_copros INT64,
+            nb_lots INT64,
+            copro_fp STRING,
+            pappers_fp STRING,
+            pappers_fields STRING,
+            contacts_fp STRING,
+            contact_keys STRING,
+            changes STRING,
+            pappers_checked_at TIMESTAMP
+        )
+    """
+    try:
+        client = get_bigquery_client()
+        client.query(query).result()
+        # Migration: tables created before the Pappers refresh of check_watchlist
+        client.query(f"ALTER TABLE `{WATCHLIST_TABLE}` ADD COLUMN IF NOT EXISTS pappers_checked_at TIMESTAMP").result()
+        return True
+    except Exception as e:
+        logger.warning(f"Error initializing watchlist table: {e}")
+        return False
+
+
+def watch_filters(climate_zones, min_lots, max_lots, periods=None, exclude_big_syndics=False, qpv_only=False):
+    """Search filters of a followed syndic (build_filter_clause arguments, JSON-ready)."""
+    return {
+        "climate_zones": sorted(climate_zones or []), "min_lots": int(min_lots), "max_lots": int(max_lots),
+        "periods": sorted(periods) if periods else None,
+        "exclude_big_syndics": bool(exclude_big_syndics), "qpv_only": bool(qpv_only),
+    }
+
+
+def _plain(value):
+    """BigQuery/pandas scalar -> JSON value (timestamps as ISO strings, NaN/NaT as None)."""
+    if value is None or (not isinstance(value, (list, dict, str)) and pd.isna(value)):
+        return None
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def _decode(row):
+    entry = {k: _plain(v) for k, v in row.items()}
+    for field in JSON_FIELDS:
+        entry[field] = json.loads(entry[field]) if entry.get(field) else None
+    entry["active"] = bool(entry.get("active"))
+    return entry
+
+
+def _encode(entry):
+    row = {k: _plain(v) for k, v in entry.items() if k not in JSON_FIELDS}
+    for field in JSON_FIELDS:
+        row[field] = json.dumps(entry[field], ensure_ascii=False) if entry.get(field) is not None else None
+    return row
+
+
+def list_watched(cache=None):
+    """Returns: list of the active watchlist entries (decoded)."""
+    cache = cache or get_watchlist_cache()
+    return [e for batch in cache.scan() for e in map(_decode, batch) if e["active"]]
+
+
+def is_watched(syndic, cache=None):
+    row = (cache or get_watchlist_cache()).get(syndic)
+    return row is not None and bool(_plain(row.get("active")))
+
+
+def portfolio_fingerprints(names, filters):
+    """
+    Copros of several syndics matching `filters`, summarized per syndic in one
+    set-based query: count, habitation lots and XOR of the row fingerprints.
+    Returns: dict -> {syndic: {"nb_copros", "nb_lots", "copro_fp"}}
+    """
+    client = get_bigquery_client()
+    where_clause, _ = build_filter_clause(**filters)
+    names = sorted(set(names))
+    found = {}
+    for start in range(0, len(names), WATCH_QUERY_CHUNK):
+        names_str = "', '".join(n.replace("'", "\\'") for n in names[start:start + WATCH_QUERY_CHUNK])
+        query = f"""
+            SELECT
+                raison_sociale_du_representant_legal as syndic,
+                COUNT(*) as nb_copros,
+                SUM(IFNULL(SAFE_CAST(nombre_de_lots_a_usage_d_habitation AS INT64), 0)) as nb_lots,
+                CAST(BIT_XOR({fingerprint_sql(SNAPSHOT_COLUMNS)}) AS STRING) as copro_fp
+            FROM `{DATASET_TABLE}`
+            WHERE raison_sociale_du_representant_legal IN ('{names_str}') AND {where_clause}
+            GROUP BY syndic
+        """
+        for row in client.query(query).to_dataframe().to_dict('records'):
+            found[row["syndic"]] = {"nb_copros": int(row["nb_copros"]), "nb_lots": int(row["nb_lots"] or 0), "copro_fp": row["copro_fp"]}
+    return found
+
+
+def _fingerprint(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def pappers_state(row):
+    """Tracked Pappers fields of a cache row (as strings) and their fingerprint."""
+    fields = {}
+    for f in WATCH_PAPPERS_FIELDS:
+        value = _plain(row.get(f))
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        fields[f] = "" if value is None else str(value)
+    return _fingerprint(fields), fields
+
+
+def contacts_state(row):
+    """Sorted contact labels ("First Last <email>") of an enrichment cache row and their fingerprint."""
+    keys = set()
+    for c in contacts_of(row):
+        name = f"{c.get('first_name') or ''} {c.get('last_name') or ''}".strip()
+        keys.add(f"{name} <{c['email']}>" if c.get("email") else name)
+    keys = sorted(k for k in keys if k)
+    return _fingerprint(keys), keys
+
+
+def _as_datetime(value):
+    """Timestamp (BigQuery, ISO string) as a naive datetime (None when unknown)."""
+    value = pd.to_datetime(_plain(value), errors="coerce")
+    if pd.isna(value):
+        return None
+    if value.tzinfo is not None:
+        value = value.tz_convert(None)
+    return value.to_pydatetime()
+
+
+def refresh_stale_pappers(sirets, rows, checked=None, limit=WATCH_PAPPERS_REFRESH_LIMIT, max_age_days=WATCH_PAPPERS_MAX_AGE_DAYS):
+    """
+    Re-fetches from the Pappers API (shared rate limiter and daily quota) at most `limit`
+    SIRETs last fetched more than `max_age_days` ago: stale cache rows oldest first, then
+    SIRETs never looked up. `checked` ({siret: last lookup time}) covers lookups that left
+    no cache row (Pappers 404), so they are not bought again on every pass. The cache is
+    updated by get_syndic_info. Stops at the first refused or failed call (quota, rate
+    limit, missing key).
+    Returns: dict -> {clean_siret: fresh cache row, or None when Pappers does not know it}
+    """
+    checked = checked or {}
+    cutoff = datetime.now() - timedelta(days=max_age_days)
+    ages = {}
+    for s in set(sirets):
+        known = [t for t in (_as_datetime(rows[s].get("derniere_maj_pappers")) if s in rows else None, _as_datetime(checked.get(s))) if t]
+        ages[s] = max(known) if known else None
+    stale = sorted((s for s, at in ages.items() if at is None or at < cutoff), key=lambda s: (ages[s] is None, ages[s] or datetime.min, s))
+    refreshed = {}
+    for siret in stale[:max(limit, 0)]:
+        info = get_syndic_info(siret, refresh=True)
+        if info is None or info.get("nom_dirigeant") == "Clé Manquante":
+            logger.info(f"Watchlist Pappers refresh stopped after {len(refreshed)} lookups")
+            break
+        refreshed[siret] = info if info.get("siret") else None  # 404 answers carry no row
+    return refreshed
+
+
+def evaluate(entries, refresh_limit=0):
+    """
+    Current state of watchlist entries: one portfolio query per distinct filter set,
+    one batched Pappers cache read and one batched enrichment cache read overall.
+    With `refresh_limit`, up to that many stale Pappers rows are re-fetched from the
+    API first (see refresh_stale_pappers), so legal changes are seen without a visit;
+    `pappers_checked_at` of the state records the lookup.
+    Pappers/contacts states are None when the syndic is not in the cache.
+    Returns: dict -> {syndic: state}
+    """
+    groups = {}
+    for e in entries:
+        groups.setdefault(json.dumps(e["filters"], sort_keys=True), []).append(e["syndic"])
+    portfolios = {}
+    for filters_json, names in groups.items():
+        portfolios.update(portfolio_fingerprints(names, json.loads(filters_json)))
+
+    sirets = {e["syndic"]: normalize_siret(e.get("siret")) for e in entries}
+    valid = [s for s in sirets.values() if s]
+    pappers = read_cached_infos(valid) if valid else {}
+    refreshed = {}
+    if valid and refresh_limit:
+        checked = {sirets[e["syndic"]]: e.get("pappers_checked_at") for e in entries if sirets[e["syndic"]]}
+        refreshed = refresh_stale_pappers(valid, pappers, checked, limit=refresh_limit)
+        pappers.update({s: row for s, row in refreshed.items() if row})
+    now = datetime.now().isoformat()
+    enrichment = get_enrichment_cache().get_many(valid) if valid else {}
+
+    states = {}
+    for e in entries:
+        siret = sirets[e["syndic"]]
+        state = portfolios.get(e["syndic"], {"nb_copros": 0, "nb_lots": 0, "copro_fp": None})
+        state = dict(
+            state, pappers_fp=None, pappers_fields=None, contacts_fp=None, contact_keys=None,
+            pappers_checked_at=now if siret in refreshed else e.get("pappers_checked_at"),
+        )
+        if siret in pappers:
+            state["pappers_fp"], state["pappers_fields"] = pappers_state(pappers[siret])
+        if siret in enrichment:
+            state["contacts_fp"], state["contact_keys"] = contacts_state(enrichment[siret])
+        states[e["syndic"]] = state
+    return states
+
+
+def diff_states(entry, state):
+    """
+    Compact diff between a stored entry and its current state (parts whose
+    fingerprint did not change, or that are not known on either side, are left out).
+    Returns: dict -> {"copros": {...}, "pappers": {...}, "contacts": {...}} (empty if unchanged)
+    """
+    changes = {}
+    if entry.get("copro_fp") != state["copro_fp"]:
+        changes["copros"] = {
+            "nb_copros": [entry.get("nb_copros") or 0, state["nb_copros"]],
+            "nb_lots": [entry.get("nb_lots") or 0, state["nb_lots"]],
+        }
+    if entry.get("pappers_fp") and state["pappers_fp"] and entry["pappers_fp"] != state["pappers_fp"]:
+        old = entry.get("pappers_fields") or {}
+        changes["pappers"] = {
+            f: [old.get(f, ""), v] for f, v in state["pappers_fields"].items() if old.get(f, "") != v
+        }
+    if entry.get("contacts_fp") and state["contacts_fp"] and entry["contacts_fp"] != state["contacts_fp"]:
+        old, new = set(entry.get("contact_keys") or []), set(state["contact_keys"])
+        changes["contacts"] = {"added": sorted(new - old), "removed": sorted(old - new)}
+    return changes
+
+
+def _apply_state(entry, state, now):
+    """The entry with `state` as its new baseline (unknown Pappers/contacts keep the old one)."""
+    updated = dict(
+        entry, nb_copros=state["nb_copros"], nb_lots=state["nb_lots"], copro_fp=state["copro_fp"],
+        pappers_checked_at=state.get("pappers_checked_at"), updated_at=now,
+    )
+    if state["pappers_fp"]:
+        updated.update(pappers_fp=state["pappers_fp"], pappers_fields=state["pappers_fields"])
+    if state["contacts_fp"]:
+        updated.update(contacts_fp=state["contacts_fp"], contact_keys=state["contact_keys"])
+    return updated
+
+
+def follow(syndic, siret, filters):
+    """Adds a syndic (with the search filters of its portfolio) and records its baseline."""
+    now = datetime.now().isoformat()
+    entry = {
+        "syndic": syndic, "siret": normalize_siret(siret), "filters": filters, "active": True,
+        "followed_at": now, "changed_at": None, "changes": None,
+    }
+    state = evaluate([entry])[syndic]
+    entry = _apply_state(entry, state, now)
+    get_watchlist_cache().put(_encode(entry))
+    return entry
+
+
+def unfollow(syndic):
+    cache = get_watchlist_cache()
+    row = cache.get(syndic)
+    if row is not None:
+        entry = _decode(row)
+        cache.put(_encode(dict(entry, active=False, updated_at=datetime.now().isoformat())))
+
+
+def check_watchlist(refresh_limit=WATCH_PAPPERS_REFRESH_LIMIT):
+    """
+    Scheduled pass: re-evaluates every followed syndic in a few set-based reads
+    (see `evaluate`, which also re-fetches up to `refresh_limit` stale Pappers rows),
+    stores the new baseline and diff of the syndics that changed and leaves the
+    others untouched.
+    Returns: dict -> report (watched, changed, timings in ms, changes per syndic)
+    """
+    cache = get_watchlist_cache()
+    report = {"watched": 0, "changed": 0, "changes": {}, "timings_ms": {}}
+    with span("watchlist_check") as s:
+        t0 = time.perf_counter()
+        entries = list_watched(cache)
+        report["watched"] = len(entries)
+        t1 = time.perf_counter()
+        states = evaluate(entries, refresh_limit) if entries else {}
+        t2 = time.perf_counter()
+
+        now = datetime.now().isoformat()
+        updated = []
+        for entry in entries:
+            state = states[entry["syndic"]]
+            changes = diff_states(entry, state)
+            if changes:
+                report["changes"][entry["syndic"]] = changes
+                updated.append(_encode(dict(_apply_state(entry, state, now), changes=changes, changed_at=now)))
+            elif (
+                (not entry.get("pappers_fp") and state["pappers_fp"]) or (not entry.get("contacts_fp") and state["contacts_fp"])
+                or state["pappers_checked_at"] != entry.get("pappers_checked_at")
+            ):
+                # Data enriched or looked up since the follow: new baseline, no change to report
+                updated.append(_encode(_apply_state(entry, state, now)))
+        if updated:
+            cache.put_many(updated)
+        t3 = time.perf_counter()
+
+        report["changed"] = len(report["changes"])
+        report["timings_ms"] = {
+            "list": round((t1 - t0) * 1000, 1),
+            "evaluate": round((t2 - t1) * 1000, 1),
+            "write": round((t3 - t2) * 1000, 1),
+        }
+        s.set(watched=report["watched"], changed=report["changed"])
+    return report
+
+
+def diff_feed(limit=FEED_LIMIT, cache=None):
+    """Returns: list of {syndic, siret, changed_at, changes}, latest change first."""
+    entries = [e for e in list_watched(cache) if e.get("changes") and e.get("changed_at")]
+    entries.sort(key=lambda e: str(e["changed_at"]), reverse=True)
+    return [{k: e.get(k) for k in ("syndic", "siret", "changed_at", "changes")} for e in entries[:limit]]
+
+
+def describe_changes(changes):
+    """One short line per changed part, for the feed."""
+    lines = []
+    copros = changes.get("copros")
+    if copros:
+        (c0, c1), (l0, l1) = copros["nb_copros"], copros["nb_lots"]
+        lines.append(f"Immeubles {c0} → {c1} ({l1 - l0:+d} lots)" if c0 != c1 or l0 != l1 else "Immeubles modifiés")
+    if changes.get("pappers"):
+        lines.append("Pappers : " + ", ".join(changes["pappers"]))
+    contacts = changes.get("contacts")
+    if contacts:
+        lines.append(f"Contacts : +{len(contacts['added'])} / -{len(contacts['removed'])}")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Syndic watchlist: scheduled change detection and diff feed.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    check = sub.add_parser("check", help="Re-evaluate every followed syndic (run from cron)")
+    check.add_argument("--refresh-limit", type=int, default=WATCH_PAPPERS_REFRESH_LIMIT, help="Max stale Pappers rows re-fetched (0: cache only)")
+    feed = sub.add_parser("feed", help="Print the latest changes")
+    feed.add_argument("--limit", type=int, default=FEED_LIMIT)
+    sub.add_parser("list", help="Print the followed syndics")
+    args = parser.parse_args(argv)
+
+    init_watchlist_table()
+    if args.command == "check":
+        report = check_watchlist(args.refresh_limit)
+        print(f"watched: {report['watched']}  changed: {report['changed']}  " + "  ".join(f"{k}: {v} ms" for k, v in report["timings_ms"].items()))
+        for syndic, changes in report["changes"].items():
+            print(f"{syndic}: " + " | ".join(describe_changes(changes)))
+    elif args.command == "feed":
+        for item in diff_feed(args.limit):
+            print(f"{item['changed_at']}  {item['syndic']}: " + " | ".join(describe_changes(item["changes"])))
+    else:
+        for e in list_watched():
+            print(f"{e['syndic']} ({e.get('siret') or '-'})  {e.get('nb_copros')} immeubles, {e.get('nb_lots')} lots")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,26 @@
 import streamlit as st
-import pandas as pd
-import pydeck as pdk
-from core.data_manager import fetch_aggregated_syndics, fetch_data_by_syndic
+import os
+import time
+import tempfile
+from core.lazy import lazy_import
+from core.data_manager import fetch_data_by_syndic
+from core.refinement import fetch_syndics_refined
+from core.pappers_connector import get_syndic_info
+from core.enrichment_manager import EnrichmentManager, contacts_of, TARGET_TITLES
+from core.prefetch import Prefetcher, PREFETCH_TOP_N
+from core.geo_tiling import ZOOM_LEVELS, SITE_ONLY_ZOOM, bin_copros, fetch_map_cells_capped, cell_size_m
+from core.spatial_index import search_syndics_near, within_radius_mask
+from core.export_pack import export_packs, build_icebreaker, EXPORT_FORMATS
+from core.result_store import get_result_store, query_key, SessionRef
+from core.job_queue import submit_enrichment, get_job, latest_job_for, ACTIVE_STATUSES, ENRICH_STAGES, JOB_POLL_SECONDS
+from core.delta_sync import refresh_if_synced
+from core.watchlist import init_watchlist_table, watch_filters, follow, unfollow, is_watched, check_watchlist, diff_feed, describe_changes
 import base64
 
+# pandas/pydeck (and BigQuery, DuckDuckGo... inside core) load on first use, not on the login screen
+pd = lazy_import("pandas")
+pdk = lazy_import("pydeck")
+
 # Page Configuration
 st.set_page_config(
     page_title="CEE Hunter v1 - Prospecting Dashboard",
@@ -51,6 +68,207 @@ def check_password():
 if not check_password():
     st.stop()  # Do not run the rest of the app
 
+# --- DATA ACCESS (CACHED ACROSS RERUNS AND SESSIONS) ---
+@st.cache_resource(show_spinner=False)
+def get_enricher():
+    """One EnrichmentManager (BigQuery client + Apollo key) shared by every session."""
+    return EnrichmentManager()
+
+# Search results and syndic details live once per server in the shared result store
+# (core/result_store.py): sessions keep the query key and a reference, not a copy.
+def syndics_query(filters):
+    """Returns: (key, loader) of the step-1 syndic search."""
+    zones, (min_lots, max_lots) = filters.get('zones', ['H1']), filters.get('lots', (0, 1000))
+    periods, exclude_big, qpv, site = filters.get('periods'), filters.get('exclude_big', True), filters.get('qpv', False), filters.get('site')
+    if site:
+        lat, lon, radius_km = site
+        return query_key("syndics_near", site, zones, min_lots, max_lots, periods, exclude_big, qpv), lambda: search_syndics_near(
+            lat, lon, radius_km, zones, min_lots, max_lots,
+            periods=periods, exclude_big_syndics=exclude_big, qpv_only=qpv
+        )
+    return query_key("aggregated_syndics", zones, min_lots, max_lots, periods, exclude_big, qpv), lambda: fetch_syndics_refined(
+        climate_zones=zones, min_lots=min_lots, max_lots=max_lots,
+        periods=periods, exclude_big_syndics=exclude_big, qpv_only=qpv, raise_errors=True
+    )
+
+def syndic_details_query(syndic_name, filters):
+    """Returns: (key, loader) of the copro rows of one syndic (restricted to the site radius if any)."""
+    zones, (min_lots, max_lots) = filters.get('zones', ['H1']), filters.get('lots', (0, 1000))
+    periods, exclude_big, qpv, site = filters.get('periods'), filters.get('exclude_big', True), filters.get('qpv', False), filters.get('site')
+    def loader():
+        df = fetch_data_by_syndic(
+            syndic_name, zones, min_lots, max_lots,
+            periods=periods, exclude_big_syndics=exclude_big, qpv_only=qpv, raise_errors=True
+        )
+        if site and not df.empty:
+            df = df[within_radius_mask(df, *site)]
+        return df
+    return query_key("syndic_details", syndic_name, zones, min_lots, max_lots, periods, exclude_big, qpv, site), loader
+
+def session_result(slot, key, loader):
+    """
+    Loads a shared result and references it from this session's `slot`.
+    Returns None on a failed load (shown here, never stored: the next run retries).
+    """
+    if 'store_ref' not in st.session_state:
+        st.session_state['store_ref'] = SessionRef(get_result_store())
+    store = get_result_store()
+    try:
+        value = store.get_or_load(key, loader)
+    except Exception as e:
+        st.error(f"❌ Erreur de chargement : {e}")
+        return None
+    store.hold(st.session_state['store_ref'].id, slot, key)
+    st.session_state[f"{slot}_key"] = key
+    return value
+
+def session_slot(slot):
+    """The shared result referenced by this session's `slot` (empty DataFrame if none)."""
+    key = st.session_state.get(f"{slot}_key")
+    value = get_result_store().get(key) if key is not None else None
+    return value if value is not None else pd.DataFrame()
+
+def clear_session_slot(slot):
+    st.session_state.pop(f"{slot}_key", None)
+    if 'store_ref' in st.session_state:
+        get_result_store().release(st.session_state['store_ref'].id, slot)
+
+@st.cache_resource(show_spinner=False)
+def init_watchlist():
+    """Creates the watchlist table once per server (a failure raises, so it is retried, not cached)."""
+    if not init_watchlist_table():
+        raise RuntimeError("watchlist table unavailable")
+    return True
+
+def watchlist_call(fn, *args, error_msg="Suivi des syndics indisponible"):
+    """
+    Runs a watchlist operation. The feature is optional: on error (missing table,
+    transient BigQuery failure) a warning is shown and None returned instead of
+    breaking the page.
+    """
+    try:
+        init_watchlist()
+        return fn(*args)
+    except Exception as e:
+        st.warning(f"⚠️ {error_msg} ({e})")
+        return None
+
+def current_watch_filters():
+    """Step-1 filters as stored with a followed syndic (the site radius is not kept)."""
+    f = st.session_state.get('filters', {})
+    min_lots, max_lots = f.get('lots', (0, 1000))
+    return watch_filters(
+        f.get('zones', ['H1']), min_lots, max_lots,
+        periods=f.get('periods'), exclude_big_syndics=f.get('exclude_big', True), qpv_only=f.get('qpv', False)
+    )
+
+@st.cache_data(ttl=24 * 3600, show_spinner=False)
+def load_syndic_info(siret):
+    """Legal data per SIRET. Failed lookups (None) are not cached so they can be retried."""
+    info = get_syndic_info(siret)
+    if info is None:
+        raise LookupError(siret)
+    return info
+
+@st.cache_data(ttl=600, show_spinner=False)
+def load_cached_enrichment(siret):
+    return get_enricher().get_cached_data(siret)
+
+@st.cache_data(ttl=600, show_spinner=False)
+def load_contacts(sirets, titles, require_email):
+    """Enriched contacts of the listed syndics (one set-based query)."""
+    return get_enricher().find_contacts(sirets=list(sirets), titles=list(titles), require_email=require_email)
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def load_map_cells(zoom, zones, min_lots, max_lots, periods, exclude_big, qpv, site):
+    """Returns: (cells, zoom used): a coarser level when the area has too many cells."""
+    return fetch_map_cells_capped(
+        zoom, zones, min_lots, max_lots,
+        periods=periods, exclude_big_syndics=exclude_big, qpv_only=qpv, site=site
+    )
+
+def render_cell_map(cells, zoom):
+    """Draws aggregated grid cells (never raw points) as extruded columns."""
+    if cells.empty:
+        st.caption("Aucune coordonnée disponible.")
+        return
+    radius = float(cell_size_m(cells['lat'].median(), zoom)) / 2
+    layer = pdk.Layer(
+        "ColumnLayer", data=cells,
+        get_position=["lon", "lat"], get_elevation="lots",
+        elevation_scale=radius / max(float(cells['lots'].max()), 1.0) * 20,
+        radius=radius, get_fill_color=[16, 185, 129, 170],
+        pickable=True, extruded=True,
+    )
+    view = pdk.ViewState(latitude=float(cells['lat'].mean()), longitude=float(cells['lon'].mean()), zoom=zoom - 3, pitch=40)
+    st.pydeck_chart(pdk.Deck(
+        layers=[layer], initial_view_state=view, map_style=None,
+        tooltip={"text": "{nb_copros} immeubles • {lots} lots\nDominante : {dominant_period}"}
+    ))
+
+def prefetch_syndics(df_agg, filters):
+    """Warms legal data, detail rows and cached enrichment for the top rows of the result table."""
+    if 'prefetcher' not in st.session_state:
+        st.session_state['prefetcher'] = Prefetcher()
+    prefetcher = st.session_state['prefetcher']
+    prefetcher.bind(repr(sorted(filters.items())))
+
+    store = get_result_store()
+    for _, row in df_agg.head(PREFETCH_TOP_N).iterrows():
+        name, siret = row['Syndic'], row['Siret']
+        prefetcher.submit(name, [
+            ("pappers", lambda siret=siret: load_syndic_info(siret)),
+            ("details", lambda name=name: store.get_or_load(*syndic_details_query(name, filters))),
+            ("enrichment", lambda siret=siret: load_cached_enrichment(siret)),
+        ])
+
+JOB_STAGE_LABELS = {
+    "cache_lookup": "Cache", "pappers_validation": "Site Pappers", "ddg_search": "Recherche web",
+    "apollo_people": "Contacts Apollo", "apollo_org": "Organisation Apollo",
+}
+
+@st.fragment(run_every=JOB_POLL_SECONDS * 2)
+def render_enrichment_job(job_id, enrich_key):
+    """Polls a background enrichment job; only this fragment reruns until the job ends."""
+    job = get_job(job_id)
+    if job is None or job['status'] not in ACTIVE_STATUSES:
+        if job and job['status'] == 'done':
+            load_cached_enrichment.clear()
+            st.session_state[enrich_key] = job['result']
+        st.rerun()
+    done = [s['stage'] for s in job['stages'] if s['stage'] in ENRICH_STAGES]
+    steps = " → ".join(JOB_STAGE_LABELS[s] for s in done) or "En file d'attente"
+    st.info(f"⏳ Enrichissement en cours ({steps})")
+
+def discard_export():
+    """Deletes this session's export file (once downloaded, or replaced by a new export)."""
+    export = st.session_state.pop('export_file', None)
+    if export and os.path.exists(export[0]):
+        try:
+            os.remove(export[0])
+        except OSError as e:
+            st.warning(f"⚠️ Fichier d'export non supprimé : {e}")
+
+SESSION_RETRY_SECONDS = 60  # Reruns within this delay of a None lookup reuse it (no network I/O)
+
+def session_memo(key, loader):
+    """
+    Runs `loader` once per session and key; later reruns (tabs, buttons) reuse the value.
+    None (not found yet, failed or refused lookup) is kept SESSION_RETRY_SECONDS only,
+    then the next rerun retries.
+    """
+    if st.session_state.get(key) is None:
+        failed_at = st.session_state.get(f"{key}_failed_at")
+        if failed_at is not None and time.time() - failed_at < SESSION_RETRY_SECONDS:
+            return None
+        value = loader()
+        if value is None:
+            st.session_state[f"{key}_failed_at"] = time.time()
+            return None
+        st.session_state.pop(f"{key}_failed_at", None)
+        st.session_state[key] = value
+    return st.session_state[key]
+
 # --- UTILITIES: SYNCHRONIZED FILTERS ---
 def synchronized_range_filter(label, key_prefix, min_val, max_val, default_val):
     """Creates a range filter with a slider synchronized with two numeric inputs."""
@@ -114,13 +332,13 @@ if 'theme_manually_set' not in st.session_state:
     st.session_state['theme_manually_set'] = False
 if 'current_step' not in st.session_state:
     st.session_state['current_step'] = 1
-if 'syndic_list' not in st.session_state:
-    st.session_state['syndic_list'] = pd.DataFrame()
-if 'selected_syndic_data' not in st.session_state:
-    st.session_state['selected_syndic_data'] = pd.DataFrame()
 if 'current_syndic_name' not in st.session_state:
     st.session_state['current_syndic_name'] = None
 
+# A copro sync run by the CLI/cron since the last run: drop the spatial index and expire
+# the cached searches of this server so they reload from the new data
+refresh_if_synced()
+
 # --- SYSTEM THEME DETECTION (One-time) ---
 if not st.session_state.get('theme_manually_set') and not st.session_state.get('system_theme_detected'):
     from streamlit.components.v1 import html
@@ -297,25 +515,28 @@ if st.session_state['current_step'] == 1:
             with c_opt2:
                 qpv_only = st.checkbox("📍 QPV Uniq.", value=False)
 
+    site = None
+    with st.container(border=True):
+        if st.toggle("📍 Autour d'un site", key="near_site"):
+            cs1, cs2, cs3 = st.columns(3)
+            site_lat = cs1.number_input("Latitude", value=48.8566, format="%.5f", key="site_lat")
+            site_lon = cs2.number_input("Longitude", value=2.3522, format="%.5f", key="site_lon")
+            site_radius = cs3.number_input("Rayon (km)", min_value=1, max_value=200, value=10, key="site_radius")
+            site = (site_lat, site_lon, float(site_radius))
+
     if st.button("🚀 TROUVER LES SYNDICS", type="primary", use_container_width=True):
         with st.spinner("Analyse du gisement en cours..."):
-            st.session_state['syndic_list'] = fetch_aggregated_syndics(
-                climate_zones=selected_zones,
-                min_lots=selected_lots[0],
-                max_lots=selected_lots[1],
-                periods=selected_periods,
-                exclude_big_syndics=exclude_big,
-                qpv_only=qpv_only
-            )
             # Store filters for reuse in step 2
             st.session_state['filters'] = {
                 'zones': selected_zones,
                 'lots': selected_lots,
                 'periods': selected_periods,
                 'exclude_big': exclude_big,
-                'qpv': qpv_only
+                'qpv': qpv_only,
+                'site': site
             }
-            go_to_step(2)
+            if session_result('syndic_list', *syndics_query(st.session_state['filters'])) is not None:
+                go_to_step(2)
 # --- STEP 2: RESULTS TABLE ---
 elif st.session_state['current_step'] == 2:
     col_back, col_kpis = st.columns([1, 4])
@@ -323,7 +544,7 @@ elif st.session_state['current_step'] == 2:
         if st.button("⬅️ Critères", key="back_to_1"):
             go_to_step(1)
     
-    df_agg = st.session_state['syndic_list']
+    df_agg = session_slot('syndic_list')
     
     if df_agg.empty:
         st.warning("Aucun résultat.")
@@ -334,8 +555,8 @@ elif st.session_state['current_step'] == 2:
             k2.metric("Immeubles", f"{int(df_agg['nb_copros'].sum())}")
             k3.metric("Lots", f"{int(df_agg['total_lots'].sum())}")
         
-        df_display = df_agg[["Syndic", "Siret", "nb_copros", "total_lots"]].rename(columns={
-            "nb_copros": "Immeubles", "total_lots": "Lots"
+        df_display = df_agg[["Syndic", "Siret", "score", "nb_copros", "total_lots"]].rename(columns={
+            "score": "Score", "nb_copros": "Immeubles", "total_lots": "Lots"
         })
 
         event = st.dataframe(
@@ -343,11 +564,82 @@ elif st.session_state['current_step'] == 2:
             column_config={
                 "Syndic": st.column_config.TextColumn("Nom du Syndic", width="large"),
                 "Siret": st.column_config.TextColumn("SIRET", width="small"),
+                "Score": st.column_config.NumberColumn("⚡ Potentiel CEE", format="%.0f", help="Lots × période × zone climatique, bonus QPV"),
                 "Immeubles": st.column_config.NumberColumn("🏢", format="%d"),
                 "Lots": st.column_config.ProgressColumn("🏠 Total", format="%d", min_value=0, max_value=int(df_agg['total_lots'].max())),
             },
             selection_mode="single-row", on_select="rerun", hide_index=True, height=400
         )
+        prefetch_syndics(df_agg, st.session_state.get('filters', {}))
+
+        if st.toggle("🗺️ Carte du gisement", key="show_zone_map"):
+            f = st.session_state.get('filters', {})
+            # Fine cells only around a site: over a whole climate zone they grow with the buildings
+            levels = [name for name, z in ZOOM_LEVELS.items() if f.get('site') or z < SITE_ONLY_ZOOM]
+            if st.session_state.get('zone_map_level') not in levels:
+                st.session_state.pop('zone_map_level', None)
+            level = st.select_slider("Maille", options=levels, value="France", key="zone_map_level")
+            cells, zoom = load_map_cells(
+                ZOOM_LEVELS[level], f.get('zones', ['H1']), f.get('lots', (0, 1000))[0], f.get('lots', (0, 1000))[1],
+                f.get('periods'), f.get('exclude_big', True), f.get('qpv', False), f.get('site')
+            )
+            if zoom != ZOOM_LEVELS[level]:
+                shown = next(name for name, z in ZOOM_LEVELS.items() if z == zoom)
+                st.caption(f"Trop de mailles pour ce niveau : affichage en maille « {shown} ».")
+            render_cell_map(cells, zoom)
+
+        if st.toggle("📦 Export des packs", key="show_export"):
+            c_fmt, c_go = st.columns([1, 2])
+            fmt = c_fmt.selectbox("Format", EXPORT_FORMATS, key="export_format", label_visibility="collapsed")
+            if c_go.button(f"Générer les packs ({len(df_agg)} syndics)", use_container_width=True):
+                bar = st.progress(0.0, text="Préparation des packs...")
+                discard_export()
+                # One private file per export, so concurrent sessions never share a path
+                fd, path = tempfile.mkstemp(prefix="cee_packs_", suffix=f".{fmt}")
+                os.close(fd)
+                written = export_packs(
+                    df_agg, path, fmt, enricher=get_enricher(),
+                    progress=lambda done, total: bar.progress(done / total, text=f"{done}/{total} syndics")
+                )
+                st.session_state['export_file'] = (path, fmt, written)
+            if st.session_state.get('export_file'):
+                path, fmt_done, written = st.session_state['export_file']
+                if os.path.exists(path):
+                    with open(path, "rb") as f:
+                        st.download_button(
+                            f"⬇️ Télécharger ({written} lignes)", f, file_name=f"packs_cee.{fmt_done}",
+                            use_container_width=True, on_click=discard_export
+                        )
+
+        if st.toggle("👥 Contacts enrichis", key="show_contacts"):
+            c_titles, c_email = st.columns([3, 1])
+            titles = c_titles.multiselect("Fonctions", TARGET_TITLES, default=["Gestionnaire"], key="contacts_titles", label_visibility="collapsed")
+            require_email = c_email.checkbox("Avec email", value=True, key="contacts_email")
+            df_contacts = load_contacts(tuple(sorted(df_agg['Siret'].dropna())), tuple(titles), require_email)
+            st.caption(f"{len(df_contacts)} contacts chez {df_contacts['siret'].nunique()} syndics déjà enrichis")
+            st.dataframe(df_contacts, use_container_width=True, hide_index=True, height=250)
+
+        if st.toggle("🔔 Syndics suivis", key="show_watchlist"):
+            feed = watchlist_call(diff_feed)
+            if feed is not None:
+                if st.button("🔄 Vérifier les changements", key="watch_check"):
+                    with st.spinner("Comparaison avec le dernier passage..."):
+                        report = watchlist_call(check_watchlist, error_msg="Vérification impossible")
+                    if report:
+                        st.caption(f"{report['watched']} syndics suivis • {report['changed']} modifiés")
+                        feed = watchlist_call(diff_feed) or []
+                if not feed:
+                    st.caption("Aucun changement détecté sur les syndics suivis.")
+            for item in feed or []:
+                st.markdown(f"**{item['syndic']}** · {str(item['changed_at'])[:16].replace('T', ' ')} — " + " • ".join(describe_changes(item['changes'])))
+
+        if st.toggle("🧠 Mémoire partagée", key="show_store_report"):
+            report = get_result_store().memory_report()
+            st.caption(
+                f"{report['entries']} résultats • {report['mb']} / {report['budget_mb']} MB • "
+                f"{report['sessions']} sessions (max {report['max_session_mb']} MB) • {report['loads']} chargements • {report['evictions']} évictions"
+            )
+            st.dataframe(pd.DataFrame(report['rows']), use_container_width=True, hide_index=True)
         
         if len(event.selection['rows']) > 0:
             selected_index = event.selection['rows'][0]
@@ -362,24 +654,43 @@ elif st.session_state['current_step'] == 3:
         
     syndic_name, syndic_siret = syndic_row['Syndic'], syndic_row['Siret']
     
-    col_back, col_title = st.columns([1, 6])
+    col_back, col_title, col_follow = st.columns([1, 5, 1])
     with col_back:
         if st.button("⬅️ Liste", key="back_to_2"): go_to_step(2)
     with col_title:
         st.markdown(f"#### {syndic_name}")
-
-    from core.pappers_connector import get_syndic_info
-    pappers_info = get_syndic_info(syndic_siret)
+    with col_follow:
+        watch_key = f"watched_{syndic_name}"
+        watched = session_memo(watch_key, lambda: watchlist_call(is_watched, syndic_name))
+        if watched is None:
+            st.button("🔔 Suivre", key="follow", disabled=True, help="Suivi des syndics indisponible")
+        elif watched:
+            if st.button("🔕 Ne plus suivre", key="unfollow"):
+                if watchlist_call(lambda: unfollow(syndic_name) or True, error_msg="Impossible de ne plus suivre ce syndic"):
+                    st.session_state[watch_key] = False
+                    st.rerun()
+        elif st.button("🔔 Suivre", key="follow"):
+            if watchlist_call(follow, syndic_name, syndic_siret, current_watch_filters(), error_msg="Impossible de suivre ce syndic"):
+                st.session_state[watch_key] = True
+                st.toast("Syndic suivi : ses changements apparaîtront dans 🔔 Syndics suivis")
+                st.rerun()
+
+    def _pappers_loader():
+        try:
+            return load_syndic_info(syndic_siret)
+        except LookupError:
+            return None
+    pappers_info = session_memo(f"pappers_info_{syndic_siret}", _pappers_loader) or {}
 
     filters = st.session_state.get('filters', {})
     if st.session_state['current_syndic_name'] != syndic_name:
-        st.session_state['selected_syndic_data'] = fetch_data_by_syndic(
-            syndic_name, filters.get('zones', ['H1']), filters.get('lots', (0, 1000))[0], filters.get('lots', (0, 1000))[1],
-            periods=filters.get('periods'), exclude_big_syndics=filters.get('exclude_big', True), qpv_only=filters.get('qpv', False)
-        )
-        st.session_state['current_syndic_name'] = syndic_name
+        if session_result('selected_syndic_data', *syndic_details_query(syndic_name, filters)) is not None:
+            st.session_state['current_syndic_name'] = syndic_name
+        else:
+            clear_session_slot('selected_syndic_data')
+    df_parc = session_slot('selected_syndic_data')
         
-    tab_intel, tab_parc = st.tabs(["🕵️ Intelligence", "🏢 Parc Immobilier"])
+    tab_intel, tab_parc, tab_map = st.tabs(["🕵️ Intelligence", "🏢 Parc Immobilier", "🗺️ Carte"])
     
     with tab_intel:
         c1, c2 = st.columns(2)
@@ -393,26 +704,25 @@ elif st.session_state['current_step'] == 3:
             """, unsafe_allow_html=True)
 
         with c2:
-            from core.enrichment_manager import EnrichmentManager
-            import json
-            enricher = EnrichmentManager()
             enrich_key = f"enrich_data_{syndic_siret}"
-            if enrich_key not in st.session_state:
-                cached = enricher.get_cached_data(syndic_siret)
-                if cached: st.session_state[enrich_key] = cached
-            
-            data_enrich = st.session_state.get(enrich_key)
+            data_enrich = session_memo(enrich_key, lambda: load_cached_enrichment(syndic_siret))
+            # Enrichment runs as a background job (core/job_queue.py): the page polls it and
+            # picks up results started from any session
+            job = latest_job_for(syndic_siret) if not data_enrich else None
+            if job and job['status'] == 'done' and job['result']:
+                st.session_state[enrich_key] = data_enrich = job['result']
             if not data_enrich:
-                if st.button("🚀 Lancer l'IA", type="primary", use_container_width=True):
-                    with st.spinner("..."):
-                        city = st.session_state['selected_syndic_data'].iloc[0]['commune'] if not st.session_state['selected_syndic_data'].empty else ""
-                        fresh = enricher.enrich_syndic(syndic_siret, syndic_name, city, pappers_data=pappers_info)
-                        if fresh: st.session_state[enrich_key] = fresh; st.rerun()
+                if job and job['status'] in ACTIVE_STATUSES:
+                    render_enrichment_job(job['id'], enrich_key)
+                else:
+                    if job and job['status'] == 'failed':
+                        st.caption(f"Dernier essai échoué : {job['error']}")
+                    if st.button("🚀 Lancer l'IA", type="primary", use_container_width=True):
+                        city = df_parc.iloc[0]['commune'] if not df_parc.empty else ""
+                        submit_enrichment(syndic_siret, syndic_name, city, pappers_data=pappers_info or None)
+                        st.rerun()
             else:
-                contacts = data_enrich.get('contacts_json', [])
-                if isinstance(contacts, str):
-                    try: contacts = json.loads(contacts)
-                    except: contacts = []
+                contacts = contacts_of(data_enrich)
                 
                 for idx, ct in enumerate(contacts[:2]):
                     with st.container(border=True):
@@ -423,7 +733,14 @@ elif st.session_state['current_step'] == 3:
                             go_to_step(4)
 
     with tab_parc:
-        st.dataframe(st.session_state['selected_syndic_data'], use_container_width=True, hide_index=True, height=300)
+        st.dataframe(df_parc, use_container_width=True, hide_index=True, height=300)
+
+    with tab_map:
+        if df_parc.empty:
+            st.caption("Aucune coordonnée disponible.")
+        else:
+            level = st.select_slider("Maille", options=list(ZOOM_LEVELS.keys()), value="Département", key="syndic_map_level")
+            render_cell_map(bin_copros(df_parc, ZOOM_LEVELS[level]), ZOOM_LEVELS[level])
 
 # --- STEP 4: PROSPECTING PACK ---
 elif st.session_state['current_step'] == 4:
@@ -432,7 +749,7 @@ elif st.session_state['current_step'] == 4:
         if st.button("⬅️ Contacts"): go_to_step(3)
     with col_new:
         if st.button("🔄 Nouvelle recherche"):
-            st.session_state['syndic_list'] = pd.DataFrame()
+            clear_session_slot('syndic_list')
             go_to_step(1)
         
     contact, syndic_row = st.session_state.get('selected_contact', {}), st.session_state.get('selected_syndic_row', {})
@@ -441,8 +758,7 @@ elif st.session_state['current_step'] == 4:
     with c1:
         with st.container(border=True):
             st.markdown("#### ✉️ Email Icebreaker")
-            first_name = contact.get('first_name', 'Bonjour')
-            ice = f"Objet : {syndic_row.get('Syndic')}\n\nBonjour {first_name},\n\nJ'ai identifié {int(syndic_row.get('nb_copros', 0))} de vos immeubles à fort potentiel CEE..."
+            ice = build_icebreaker(syndic_row, contact)
             st.text_area("Template", value=ice, height=150, label_visibility="collapsed")
             if st.button("📋 Copier le Pack"): st.toast("Copié !")
 